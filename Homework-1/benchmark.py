@@ -0,0 +1,188 @@
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+import platform
+import tempfile
+import subprocess
+import multiprocessing
+
+from create_data import create_binary_file, parse_size
+
+CALC_DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "calc_data.py")
+ENGINES = ("sequential", "sequential-numpy", "parallel", "parallel-numpy")
+RESULT_KEYS = ("total", "min", "max", "count")
+CSV_FIELDS = ("size_bytes", "engine", "workers", "block_size_mib", "cache", "run",
+              "wall_s", "user_s", "sys_s", "cpu_s", "peak_rss_mib", "gb_per_s",
+              "total", "min", "max", "count")
+
+
+def parse_list(value, item_type=str):
+    return [item_type(item) for item in value.split(",") if item.strip()]
+
+
+def build_matrix(engines, workers_list, block_sizes):
+    # 顺序 python 引擎没有可调参数；其余引擎按 workers × block size 展开
+    configs = []
+    for engine in engines:
+        if engine == "sequential":
+            configs.append((engine, 1, None))
+        elif engine == "sequential-numpy":
+            configs.extend((engine, 1, block) for block in block_sizes)
+        else:
+            configs.extend((engine, workers, block)
+                           for workers in workers_list for block in block_sizes)
+    return configs
+
+
+def calc_command(file_path, engine, workers, block_size):
+    cmd = [sys.executable, CALC_DATA, file_path, "--json"]
+    if engine.endswith("-numpy"):
+        cmd += ["--engine", "numpy"]
+    if engine.startswith("parallel"):
+        cmd += ["--parallel", "--workers", str(workers), "--task-size", str(block_size)]
+    elif block_size is not None:
+        cmd += ["--block-size", str(block_size)]
+    return cmd
+
+
+def drop_page_cache(file_path):
+    # 只清除该文件在页缓存中的干净页，不需要 root 权限
+    fd = os.open(file_path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+
+
+def run_once(cmd):
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+    start = time.perf_counter()
+    output = proc.stdout.read()
+    # wait4 的 rusage 包含子进程已回收的工作进程：CPU 时间累加，maxrss 取最大者
+    _, status, usage = os.wait4(proc.pid, 0)
+    wall = time.perf_counter() - start
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    proc.stdout.close()
+    if proc.returncode != 0:
+        raise RuntimeError(f"{' '.join(cmd)} exited with code {proc.returncode}")
+
+    result = json.loads(output)
+    return {
+        "wall_s": wall,
+        "user_s": usage.ru_utime,
+        "sys_s": usage.ru_stime,
+        "cpu_s": usage.ru_utime + usage.ru_stime,
+        "peak_rss_mib": usage.ru_maxrss / 1024,
+        **{key: result.get(key) for key in RESULT_KEYS},
+    }
+
+
+def benchmark_file(file_path, configs, repeat):
+    size = os.path.getsize(file_path)
+    rows = []
+
+    for engine, workers, block_size in configs:
+        cmd = calc_command(file_path, engine, workers, block_size)
+        # 第一次为冷缓存，其余 repeat 次为热缓存
+        for run in range(repeat + 1):
+            cache = "cold" if run == 0 else "warm"
+            if cache == "cold":
+                drop_page_cache(file_path)
+            row = {"size_bytes": size, "engine": engine, "workers": workers,
+                   "block_size_mib": block_size, "cache": cache, "run": run,
+                   **run_once(cmd)}
+            row["gb_per_s"] = size / 1024 ** 3 / row["wall_s"] if row["wall_s"] else None
+            rows.append(row)
+            print(f"{size / 1024 ** 3:8.2f} GB  {engine:<17} workers={workers:<3} "
+                  f"block={block_size or '-':<4} {cache:<4}  {row['wall_s']:8.3f} s  "
+                  f"{row['gb_per_s'] or 0:7.3f} GB/s  rss={row['peak_rss_mib']:.0f} MiB")
+
+    return rows
+
+
+def check_consistency(rows):
+    # 同一文件上所有引擎必须给出完全相同的结果
+    mismatches = []
+    for size in sorted({row["size_bytes"] for row in rows}):
+        results = {(row["engine"], row["workers"], row["block_size_mib"]):
+                   tuple(row[key] for key in RESULT_KEYS)
+                   for row in rows if row["size_bytes"] == size}
+        if len(set(results.values())) > 1:
+            mismatches.append({"size_bytes": size,
+                               "results": {str(config): list(values)
+                                           for config, values in results.items()}})
+    return mismatches
+
+
+def write_csv(path, rows):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the calc_data.py scan modes")
+    parser.add_argument("--sizes", type=lambda v: parse_list(v, parse_size), default="256M",
+                        help="Comma-separated file sizes, e.g. 256M,1G,2 (default: 256M)")
+    parser.add_argument("--engines", type=parse_list, default=",".join(ENGINES),
+                        help=f"Comma-separated engines to run (default: {','.join(ENGINES)})")
+    parser.add_argument("--workers", type=lambda v: parse_list(v, int),
+                        default=str(multiprocessing.cpu_count()),
+                        help="Comma-separated worker counts for parallel engines (default: CPU count)")
+    parser.add_argument("--block-sizes", type=lambda v: parse_list(v, int), default="16,64",
+                        help="Comma-separated block/task sizes in MiB (default: 16,64)")
+    parser.add_argument("--repeat", type=int, default=2,
+                        help="Warm-cache runs after the cold-cache run (default: 2)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for generated data (default: 0)")
+    parser.add_argument("--data-dir", help="Directory for generated files (default: temporary)")
+    parser.add_argument("--keep", action="store_true", help="Keep generated files")
+    parser.add_argument("--json", dest="json_path", default="benchmark.json",
+                        help="JSON report path (default: benchmark.json)")
+    parser.add_argument("--csv", dest="csv_path", help="Optional CSV report path")
+    args = parser.parse_args()
+
+    unknown = set(args.engines) - set(ENGINES)
+    if unknown:
+        parser.error(f"unknown engines: {','.join(sorted(unknown))}")
+
+    configs = build_matrix(args.engines, args.workers, args.block_sizes)
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix="calc-bench-")
+    os.makedirs(data_dir, exist_ok=True)
+
+    rows = []
+    for size in args.sizes:
+        file_path = os.path.join(data_dir, f"bench-{size}-{args.seed}.bin")
+        if not os.path.exists(file_path) or os.path.getsize(file_path) != size:
+            create_binary_file(file_path, size, args.seed, workers=multiprocessing.cpu_count())
+        try:
+            rows.extend(benchmark_file(file_path, configs, args.repeat))
+        finally:
+            if not args.keep:
+                os.remove(file_path)
+    if not args.keep and not args.data_dir:
+        os.rmdir(data_dir)
+
+    mismatches = check_consistency(rows)
+    report = {
+        "machine": {"platform": platform.platform(), "python": platform.python_version(),
+                    "cpu_count": multiprocessing.cpu_count()},
+        "config": {"sizes": args.sizes, "engines": args.engines, "workers": args.workers,
+                   "block_sizes_mib": args.block_sizes, "repeat": args.repeat, "seed": args.seed},
+        "consistent": not mismatches,
+        "mismatches": mismatches,
+        "runs": rows,
+    }
+    with open(args.json_path, "w") as f:
+        json.dump(report, f, indent=2)
+    if args.csv_path:
+        write_csv(args.csv_path, rows)
+
+    print(f"Report written to {args.json_path}" + (f" and {args.csv_path}" if args.csv_path else ""))
+    if mismatches:
+        print("ERROR: engines returned different results", file=sys.stderr)
+        sys.exit(1)
@@ -1,101 +1,489 @@
+import os
+import json
 import struct
+import sys
 import time
 import argparse
 import mmap
 import multiprocessing
-from functools import partial
+from array import array
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
-def simple_calculation(file_path):
-    min_num = 2 ** 32
-    max_num = 0
-    total = 0
+BLOCK_SIZE = 64 * 1024 ** 2  # numpy 引擎每次读取的块大小（4 的倍数）
+TASK_SIZE = 64 * 1024 ** 2  # 并行模式下单个任务的默认大小
+
+STATS_CHOICES = ("sum", "min", "max", "mean", "var", "hist", "quantiles")
+DEFAULT_STATS = ("sum", "min", "max")
+SKETCH_BITS = 16  # 分位数草图的桶数为 2 ** SKETCH_BITS
+HIST_BINS = 16
+
+INDEX_BLOCK_SIZE = 4 * 1024 ** 2  # 索引中每个块的大小
+INDEX_STATS = ("sum", "min", "max", "mean")  # 可以直接由块索引得到的统计量
+INDEX_MAGIC = b"CDIDX001"
+INDEX_HEADER = struct.Struct('<8sQQqQ')  # magic, block_size, file_size, mtime_ns, num_blocks
 
-    with open(file_path, 'rb') as f:
-        while True:
-            data = f.read(4)
-            if not data:
-                break
-            num = struct.unpack('>I', data)[0]
 
+class ScanStats:
+    """可合并的部分统计状态：每个块/任务各自计算，父进程再合并。"""
+
+    def __init__(self, stats=DEFAULT_STATS):
+        self.stats = frozenset(stats)
+        self.count = 0
+        self.total = 0
+        self.min = 2 ** 32
+        self.max = 0
+        # Welford 矩：均值与偏差平方和，只在需要方差时维护
+        self.mean = 0.0
+        self.m2 = 0.0
+        # 分位数草图：按高 SKETCH_BITS 位计数，直方图也由它折叠得到
+        self.sketch = [0] * (1 << SKETCH_BITS) if self.stats & {"hist", "quantiles"} else None
+
+    def update_values(self, values):
+        count, total, min_num, max_num = self.count, self.total, self.min, self.max
+        mean, m2 = self.mean, self.m2
+        moments = "var" in self.stats
+        sketch = self.sketch
+        shift = 32 - SKETCH_BITS
+
+        for num in values:
+            count += 1
+            total += num
             if num < min_num:
                 min_num = num
             if num > max_num:
                 max_num = num
-            total += num
+            if moments:
+                delta = num - mean
+                mean += delta / count
+                m2 += delta * (num - mean)
+            if sketch is not None:
+                sketch[num >> shift] += 1
+
+        self.count, self.total, self.min, self.max = count, total, min_num, max_num
+        self.mean, self.m2 = mean, m2
+
+    def update_array(self, values):
+        if values.size == 0:
+            return
+
+        block = ScanStats(self.stats)
+        block.count = int(values.size)
+        # 求和用 uint64 累加避免溢出
+        block.total = int(values.sum(dtype=np.uint64))
+        block.min = int(values.min())
+        block.max = int(values.max())
+        if "var" in self.stats:
+            block.mean = block.total / block.count
+            block.m2 = float(np.square(values.astype(np.float64) - block.mean).sum())
+        if self.sketch is not None:
+            block.sketch = np.bincount(values >> (32 - SKETCH_BITS),
+                                       minlength=1 << SKETCH_BITS).tolist()
+        self.merge(block)
+
+    def merge(self, other):
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            # 只复制计数和矩，保留自己的 stats（对方可能是索引块，统计量集合不同）；
+            # 草图复制一份，避免与对方共用同一个列表
+            self.count, self.total, self.min, self.max = other.count, other.total, other.min, other.max
+            self.mean, self.m2 = other.mean, other.m2
+            if self.sketch is not None and other.sketch is not None:
+                self.sketch = list(other.sketch)
+            return self
+
+        # Chan 等人的并行合并公式
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+
+        self.count = count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        if self.sketch is not None:
+            self.sketch = [a + b for a, b in zip(self.sketch, other.sketch)]
+        return self
+
+    def average(self):
+        return self.total / self.count if self.count else 0.0
 
-    return total, min_num, max_num
+    def variance(self):
+        return self.m2 / self.count if self.count else 0.0
+
+    def histogram(self, bins=HIST_BINS):
+        # 等宽分桶，bins 必须是 2 的幂且不超过草图桶数
+        step = len(self.sketch) // bins
+        width = 2 ** 32 // bins
+        return [(i * width, (i + 1) * width - 1, sum(self.sketch[i * step:(i + 1) * step]))
+                for i in range(bins)]
+
+    def quantile(self, q):
+        # 在草图桶内线性插值，误差不超过一个桶宽 2 ** (32 - SKETCH_BITS)
+        if not self.count:
+            return 0
+        rank = q * (self.count - 1)
+        width = 1 << (32 - SKETCH_BITS)
+        seen = 0
+        for i, bucket in enumerate(self.sketch):
+            if bucket and seen + bucket > rank:
+                value = i * width + int((rank - seen + 0.5) / bucket * width)
+                return min(max(value, self.min), self.max)
+            seen += bucket
+        return self.max
+
+    def as_dict(self, bins=HIST_BINS):
+        result = {"count": self.count}
+        if "sum" in self.stats:
+            result["total"] = self.total
+        if "min" in self.stats:
+            result["min"] = self.min
+        if "max" in self.stats:
+            result["max"] = self.max
+        if "mean" in self.stats:
+            result["mean"] = self.average()
+        if "var" in self.stats:
+            result["variance"] = self.variance()
+        if "quantiles" in self.stats:
+            result["p50"] = self.quantile(0.5)
+            result["p99"] = self.quantile(0.99)
+        if "hist" in self.stats:
+            result["histogram"] = self.histogram(bins)
+        return result
+
+
+def merge_results(results, stats=DEFAULT_STATS):
+    merged = ScanStats(stats)
+    for result in results:
+        merged.merge(result)
+    return merged
+
+
+def simple_calculation(file_path, stats=DEFAULT_STATS):
+    result = ScanStats(stats)
+
+    with open(file_path, 'rb') as f:
+        result.update_values(struct.unpack('>I', data)[0]
+                             for data in iter(lambda: f.read(4), b''))
+
+    return result
+
+
+def reduce_block(data, stats=DEFAULT_STATS):
+    # 整块视为大端 uint32 数组做向量化归约
+    result = ScanStats(stats)
+    result.update_array(np.frombuffer(data, dtype='>u4', count=len(data) // 4))
+    return result
+
+
+def numpy_calculation(file_path, stats=DEFAULT_STATS, block_size=BLOCK_SIZE):
+    block_size &= ~3
+    buffer = bytearray(block_size)
+    view = memoryview(buffer)
+    result = ScanStats(stats)
+
+    with open(file_path, 'rb') as f:
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                break
+            result.merge(reduce_block(view[:n], stats))
 
+    return result
 
-def process_chunk(data_chunk):
-    min_num = 2 ** 32
-    max_num = 0
-    total = 0
 
-    for i in range(0, len(data_chunk), 4):
-        num = struct.unpack('>I', data_chunk[i:i + 4])[0]
+def process_chunk(data_chunk, stats=DEFAULT_STATS):
+    result = ScanStats(stats)
+    result.update_values(num for (num,) in struct.iter_unpack('>I', data_chunk))
+    return result
 
-        if num < min_num:
-            min_num = num
-        if num > max_num:
-            max_num = num
-        total += num
 
-    return total, min_num, max_num
+def process_chunk_numpy(data_chunk, stats=DEFAULT_STATS):
+    return merge_results((reduce_block(data_chunk[i:i + BLOCK_SIZE], stats)
+                          for i in range(0, len(data_chunk), BLOCK_SIZE)), stats)
 
 
-def parallel_calculation(file_path):
+def process_range(file_path, offset, length, engine="python", stats=DEFAULT_STATS):
+    # 子进程自行打开只读 mmap 窗口，父进程只传递 (path, offset, length)
+    if length <= 0:
+        return ScanStats(stats)
+    aligned = offset - offset % mmap.ALLOCATIONGRANULARITY
     with open(file_path, 'rb') as f:
-        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
-            file_size = len(mm)
-            num_processes = multiprocessing.cpu_count()
-            chunk_size = (file_size // num_processes) & ~3  # 确保是4的倍数
+        with mmap.mmap(f.fileno(), offset - aligned + length,
+                       access=mmap.ACCESS_READ, offset=aligned) as mm:
+            with memoryview(mm)[offset - aligned:] as view:
+                if engine == "numpy":
+                    return process_chunk_numpy(view, stats)
+                return process_chunk(view, stats)
+
+
+def process_task(task):
+    return process_range(*task)
+
+
+def split_tasks(file_size, task_size):
+    # 任务起点需对齐到 mmap 分配粒度（同时也是 4 的倍数）
+    granularity = mmap.ALLOCATIONGRANULARITY
+    task_size = max(granularity, task_size // granularity * granularity)
+    file_size &= ~3
+
+    return [(offset, min(task_size, file_size - offset))
+            for offset in range(0, file_size, task_size)]
+
+
+def parallel_calculation(file_path, engine="python", workers=None, task_size=TASK_SIZE,
+                         stats=DEFAULT_STATS):
+    workers = workers or multiprocessing.cpu_count()
+    tasks = [(file_path, offset, length, engine, stats)
+             for offset, length in split_tasks(os.path.getsize(file_path), task_size)]
+    if not tasks:
+        return ScanStats(stats)
+
+    # 小任务 + 动态调度，慢核心不会拖住整体结果
+    with multiprocessing.Pool(min(workers, len(tasks))) as pool:
+        return merge_results(pool.imap_unordered(process_task, tasks), stats)
+
+
+class BlockIndex:
+    """Sidecar 索引：文件中每个完整块的 sum/min/max/count，紧凑存储为定长数组。"""
+
+    def __init__(self, block_size=INDEX_BLOCK_SIZE):
+        self.block_size = block_size
+        self.file_size = 0
+        self.mtime_ns = 0
+        self.sums = array('Q')
+        self.mins = array('I')
+        self.maxs = array('I')
+        self.counts = array('I')
+
+    def __len__(self):
+        return len(self.sums)
+
+    def append(self, result):
+        self.sums.append(result.total)
+        self.mins.append(result.min)
+        self.maxs.append(result.max)
+        self.counts.append(result.count)
+
+    def block(self, i):
+        result = ScanStats(INDEX_STATS)
+        result.count = self.counts[i]
+        result.total = self.sums[i]
+        result.min = self.mins[i]
+        result.max = self.maxs[i]
+        return result
+
+    def is_fresh(self, st):
+        return self.file_size == st.st_size and self.mtime_ns == st.st_mtime_ns
+
+    def _arrays(self):
+        return self.sums, self.mins, self.maxs, self.counts
 
-            pool = multiprocessing.Pool(num_processes)
-            results = []
+    def save(self, path):
+        # 先写临时文件再替换，避免中断时留下损坏的索引
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(INDEX_HEADER.pack(INDEX_MAGIC, self.block_size, self.file_size,
+                                      self.mtime_ns, len(self)))
+            for values in self._arrays():
+                if sys.byteorder == "big":
+                    values = array(values.typecode, values)
+                    values.byteswap()
+                values.tofile(f)
+        os.replace(tmp_path, path)
 
-            for i in range(num_processes):
-                start = i * chunk_size
-                end = start + chunk_size if i != num_processes - 1 else file_size
-                results.append(pool.apply_async(process_chunk, (mm[start:end],)))
+    @classmethod
+    def load(cls, path):
+        try:
+            with open(path, 'rb') as f:
+                magic, block_size, file_size, mtime_ns, num_blocks = \
+                    INDEX_HEADER.unpack(f.read(INDEX_HEADER.size))
+                if magic != INDEX_MAGIC:
+                    return None
+                index = cls(block_size)
+                index.file_size = file_size
+                index.mtime_ns = mtime_ns
+                for values in index._arrays():
+                    values.fromfile(f, num_blocks)
+                    if sys.byteorder == "big":
+                        values.byteswap()
+        except (OSError, EOFError, struct.error):
+            return None
+        return index
 
-            pool.close()
-            pool.join()
 
-            # 合并结果
-            total = 0
-            min_num = 2 ** 32
-            max_num = 0
+def index_path(file_path):
+    return file_path + ".idx"
 
-            for res in results:
-                chunk_total, chunk_min, chunk_max = res.get()
-                total += chunk_total
-                if chunk_min < min_num:
-                    min_num = chunk_min
-                if chunk_max > max_num:
-                    max_num = chunk_max
 
-            return total, min_num, max_num
+def scan_blocks(file_path, first, last, block_size, engine="python", workers=1):
+    tasks = [(file_path, i * block_size, block_size, engine, INDEX_STATS)
+             for i in range(first, last)]
+    if workers > 1 and len(tasks) > 1:
+        with multiprocessing.Pool(min(workers, len(tasks))) as pool:
+            return pool.map(process_task, tasks)
+    return [process_task(task) for task in tasks]
+
+
+def update_index(file_path, engine="python", workers=1, block_size=INDEX_BLOCK_SIZE):
+    # 加载索引并只扫描尚未索引的块，返回 (index, 本次扫描的块数)
+    st = os.stat(file_path)
+    full_blocks = (st.st_size & ~3) // block_size
+    index = BlockIndex.load(index_path(file_path))
+
+    if index is not None and index.block_size == block_size and index.is_fresh(st):
+        return index, 0
+
+    first = 0
+    if (index is not None and index.block_size == block_size
+            and index.file_size < st.st_size and 0 < len(index) <= full_blocks):
+        # 文件只被追加：复查最后一个已索引块，确认前面的内容没有被改写
+        last = len(index) - 1
+        check = scan_blocks(file_path, last, last + 1, block_size, engine)[0]
+        if (check.total, check.min, check.max) == (index.sums[last], index.mins[last],
+                                                   index.maxs[last]):
+            first = len(index)
+    if first == 0:
+        index = BlockIndex(block_size)
+
+    for result in scan_blocks(file_path, first, full_blocks, block_size, engine, workers):
+        index.append(result)
+    index.file_size = st.st_size
+    index.mtime_ns = st.st_mtime_ns
+    index.save(index_path(file_path))
+    return index, full_blocks - first
+
+
+def indexed_calculation(file_path, engine="python", workers=1, byte_range=None,
+                        stats=INDEX_STATS):
+    index, scanned = update_index(file_path, engine, workers)
+    block_size = index.block_size
+    file_size = index.file_size & ~3
+    start, end = byte_range or (0, file_size)
+    end = min(end, file_size)
+    start = min(start, end)
+
+    # 区间 = 头部不完整块 + 索引中的完整块 + 尾部不完整块
+    first = min(-(-start // block_size), len(index))
+    last = max(min(end // block_size, len(index)), first)
+    if first == last:
+        return process_range(file_path, start, end - start, engine, stats), index, scanned
+
+    result = process_range(file_path, start, first * block_size - start, engine, stats)
+    for i in range(first, last):
+        result.merge(index.block(i))
+    result.merge(process_range(file_path, last * block_size, end - last * block_size,
+                               engine, stats))
+    return result, index, scanned
+
+
+def parse_range(value):
+    try:
+        start, end = value.split(":")
+        start = int(start) if start else 0
+        end = int(end) if end else 2 ** 63
+    except ValueError:
+        raise argparse.ArgumentTypeError("expected START:END in bytes")
+    if start < 0 or start > end or start % 4 or (end != 2 ** 63 and end % 4):
+        raise argparse.ArgumentTypeError("START and END must be non-negative multiples of 4 "
+                                         "with START <= END")
+    return start, end
+
+
+def parse_stats(value):
+    stats = tuple(name.strip() for name in value.split(",") if name.strip())
+    unknown = set(stats) - set(STATS_CHOICES)
+    if not stats or unknown:
+        raise argparse.ArgumentTypeError(
+            f"expected a comma-separated subset of {','.join(STATS_CHOICES)}")
+    return stats
+
+
+def print_stats(result, bins=HIST_BINS):
+    stats = result.stats
+    if "sum" in stats:
+        print(f"Total: {result.total}")
+    if "min" in stats:
+        print(f"Min: {result.min}")
+    if "max" in stats:
+        print(f"Max: {result.max}")
+    if "mean" in stats:
+        print(f"Mean: {result.average():.4f}")
+    if "var" in stats:
+        print(f"Variance: {result.variance():.4f}")
+    if "quantiles" in stats:
+        print(f"P50 (approx): {result.quantile(0.5)}")
+        print(f"P99 (approx): {result.quantile(0.99)}")
+    if "hist" in stats:
+        print("Histogram:")
+        for low, high, count in result.histogram(bins):
+            print(f"  [{low:>10}, {high:>10}]: {count}")
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("file_path", help="Input file path")
     parser.add_argument("--parallel", action="store_true", help="Use parallel processing")
+    parser.add_argument("--engine", choices=["python", "numpy"], default="python",
+                        help="Per-chunk reduction engine (default: python)")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count(),
+                        help="Number of worker processes for --parallel (default: CPU count)")
+    parser.add_argument("--task-size", type=int, default=TASK_SIZE // 1024 ** 2,
+                        help="Size of one parallel task in MiB (default: 64)")
+    parser.add_argument("--block-size", type=int, default=BLOCK_SIZE // 1024 ** 2,
+                        help="Read block size in MiB for the sequential numpy engine (default: 64)")
+    parser.add_argument("--stats", type=parse_stats, default=DEFAULT_STATS,
+                        help="Comma-separated statistics to compute: "
+                             f"{','.join(STATS_CHOICES)} (default: sum,min,max)")
+    parser.add_argument("--bins", type=int, default=HIST_BINS,
+                        help=f"Number of histogram buckets, a power of two (default: {HIST_BINS})")
+    parser.add_argument("--index", action="store_true",
+                        help="Use the sidecar block index (<file>.idx), scanning only new blocks")
+    parser.add_argument("--range", type=parse_range, metavar="START:END",
+                        help="Only aggregate the byte range [START, END); implies --index")
+    parser.add_argument("--json", action="store_true",
+                        help="Print the result as a single JSON object")
     args = parser.parse_args()
 
+    if args.engine == "numpy" and np is None:
+        parser.error("--engine numpy requires numpy to be installed")
+    if args.workers < 1 or args.task_size < 1 or args.block_size < 1:
+        parser.error("--workers, --task-size and --block-size must be positive")
+    if not 0 < args.bins <= 1 << SKETCH_BITS or args.bins & (args.bins - 1):
+        parser.error(f"--bins must be a power of two not greater than {1 << SKETCH_BITS}")
+    if (args.index or args.range) and not set(args.stats) <= set(INDEX_STATS):
+        parser.error(f"--index/--range only support --stats {','.join(INDEX_STATS)}")
+
     start_time = time.time()
 
-    if args.parallel:
-        total, min_num, max_num = parallel_calculation(args.file_path)
-        print("Using parallel processing with memory-mapped files")
+    if args.index or args.range:
+        result, index, scanned = indexed_calculation(
+            args.file_path, args.engine, args.workers if args.parallel else 1,
+            args.range, args.stats)
+        mode = (f"Using block index {index_path(args.file_path)} "
+                f"({len(index) - scanned} blocks reused, {scanned} scanned, {args.engine} engine)")
+    elif args.parallel:
+        result = parallel_calculation(args.file_path, args.engine, args.workers,
+                                      args.task_size * 1024 ** 2, args.stats)
+        mode = (f"Using parallel processing with memory-mapped files "
+                f"({args.engine} engine, {args.workers} workers)")
+    elif args.engine == "numpy":
+        result = numpy_calculation(args.file_path, args.stats, args.block_size * 1024 ** 2)
+        mode = "Using block-wise sequential reading (numpy engine)"
     else:
-        total, min_num, max_num = simple_calculation(args.file_path)
-        print("Using simple sequential reading")
+        result = simple_calculation(args.file_path, args.stats)
+        mode = "Using simple sequential reading"
 
     elapsed = time.time() - start_time
 
-    print(f"Total: {total}")
-    print(f"Min: {min_num}")
-    print(f"Max: {max_num}")
-    print(f"Time elapsed: {elapsed:.2f} seconds")
\ No newline at end of file
+    if args.json:
+        print(json.dumps({"mode": mode, "elapsed": elapsed, **result.as_dict(args.bins)}))
+    else:
+        print(mode)
+        print_stats(result, args.bins)
+        print(f"Time elapsed: {elapsed:.2f} seconds")
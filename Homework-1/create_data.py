@@ -1,27 +1,96 @@
 import os
-import struct
-import random
+import re
 import argparse
+import multiprocessing
 
+import numpy as np
 
-def create_binary_file(file_path, target_size_gb):
-    target_size = target_size_gb * 1024 ** 3
-    num_ints = target_size // 4
+CHUNK_SIZE = 16 * 1024 ** 2  # 每个生成块的字节数；块内容只由 seed 和块号决定
+DISTRIBUTIONS = ("uniform", "narrow", "sorted", "equal")
+NARROW_LOW = 2 ** 31 - 1024  # narrow 分布：取值范围 [NARROW_LOW, NARROW_LOW + NARROW_WIDTH)
+NARROW_WIDTH = 2048
+EQUAL_VALUE = 2 ** 32 - 1  # equal 分布：全部为最大值，最考验求和溢出
+SIZE_UNITS = {"": 1024 ** 3, "b": 1, "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}
+
+
+def parse_size(value):
+    # 不带单位时按 GB 解析（兼容旧用法），支持小数和 B/K/M/G 后缀
+    match = re.fullmatch(r"\s*(\d+(?:\.\d*)?|\.\d+)\s*([bkmg]?)b?\s*", value.lower())
+    if not match:
+        raise argparse.ArgumentTypeError(f"invalid size: {value!r}")
+    number, unit = match.groups()
+    return int(float(number) * SIZE_UNITS[unit]) & ~3  # 向下取整到 4 字节的倍数
+
+
+def generate_chunk(seed, index, count, distribution="uniform", num_chunks=1):
+    rng = np.random.default_rng([seed, index])
+
+    if distribution == "uniform":
+        values = rng.integers(0, 2 ** 32, size=count, dtype=np.uint32)
+    elif distribution == "narrow":
+        values = rng.integers(NARROW_LOW, NARROW_LOW + NARROW_WIDTH, size=count, dtype=np.uint32)
+    elif distribution == "sorted":
+        # 每个块占据值域中的一段，块内排序，整个文件即单调不减
+        span = 2 ** 32 // num_chunks
+        low = index * span
+        values = np.sort(rng.integers(low, low + span, size=count, dtype=np.uint32))
+    elif distribution == "equal":
+        values = np.full(count, EQUAL_VALUE, dtype=np.uint32)
+    else:
+        raise ValueError(f"Unknown distribution: {distribution}")
+
+    return values.astype('>u4').tobytes()
+
+
+def write_chunk(task):
+    file_path, seed, index, size, distribution = task
+    num_chunks = -(-size // CHUNK_SIZE)
+    offset = index * CHUNK_SIZE
+    data = generate_chunk(seed, index, min(CHUNK_SIZE, size - offset) // 4,
+                          distribution, num_chunks)
+
+    # 每个块写入文件中互不重叠的区域，可以由多个进程并行完成
+    fd = os.open(file_path, os.O_WRONLY)
+    try:
+        os.pwrite(fd, data, offset)
+    finally:
+        os.close(fd)
+    return len(data)
+
+
+def create_binary_file(file_path, size, seed=None, distribution="uniform", workers=1):
+    if seed is None:
+        seed = int(np.random.SeedSequence().entropy % 2 ** 63)
 
     with open(file_path, 'wb') as f:
-        for _ in range(num_ints):
-            # 生成随机无符号32位整数并使用大端序打包
-            num = random.getrandbits(32)
-            f.write(struct.pack('>I', num))
+        f.truncate(size)
+
+    tasks = [(file_path, seed, i, size, distribution) for i in range(-(-size // CHUNK_SIZE))]
+    if workers > 1 and len(tasks) > 1:
+        with multiprocessing.Pool(min(workers, len(tasks))) as pool:
+            for _ in pool.imap_unordered(write_chunk, tasks):
+                pass
+    else:
+        for task in tasks:
+            write_chunk(task)
 
     actual_size = os.path.getsize(file_path)
-    print(f"Created file {file_path} with size {actual_size / 1024 ** 3:.2f} GB")
+    print(f"Created file {file_path} with size {actual_size / 1024 ** 3:.2f} GB "
+          f"({actual_size} bytes, distribution={distribution}, seed={seed})")
+    return seed
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("file_path", help="Output file path")
-    parser.add_argument("--size", type=int, default=2, help="File size in GB (default: 2)")
+    parser.add_argument("--size", type=parse_size, default=parse_size("2"),
+                        help="File size in GB, fractional values and B/K/M/G suffixes are "
+                             "accepted, e.g. 0.5, 512M, 1000000B (default: 2)")
+    parser.add_argument("--seed", type=int, help="RNG seed for reproducible output")
+    parser.add_argument("--distribution", choices=DISTRIBUTIONS, default="uniform",
+                        help="Value distribution (default: uniform)")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count(),
+                        help="Number of writer processes (default: CPU count)")
     args = parser.parse_args()
 
-    create_binary_file(args.file_path, args.size)
\ No newline at end of file
+    create_binary_file(args.file_path, args.size, args.seed, args.distribution, args.workers)
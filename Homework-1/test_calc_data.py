@@ -0,0 +1,64 @@
+import os
+import json
+import struct
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from calc_data import INDEX_BLOCK_SIZE, ScanStats, index_path
+
+CALC_DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "calc_data.py")
+
+
+class IndexStatsTest(unittest.TestCase):
+    """--index 只输出请求的统计量（区间起点与块对齐时头部为空）"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.path = os.path.join(cls.tmp.name, "data.bin")
+        count = (INDEX_BLOCK_SIZE + 1024) // 4  # 一个完整块加一段尾部
+        cls.values = [(i * 2654435761) % 2 ** 32 for i in range(count)]
+        with open(cls.path, "wb") as f:
+            f.write(struct.pack(f">{count}I", *cls.values))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def run_calc(self, *args):
+        output = subprocess.run([sys.executable, CALC_DATA, self.path, "--json", *args],
+                                check=True, capture_output=True, text=True).stdout
+        result = json.loads(output)
+        return {key: value for key, value in result.items() if key not in ("mode", "elapsed")}
+
+    def test_index_sum_only(self):
+        for _ in range(2):  # 第一次建立索引，第二次复用索引
+            self.assertEqual(self.run_calc("--index", "--stats", "sum"),
+                             {"count": len(self.values), "total": sum(self.values)})
+        os.remove(index_path(self.path))
+
+    def test_index_default_stats(self):
+        self.assertEqual(self.run_calc("--index"),
+                         {"count": len(self.values), "total": sum(self.values),
+                          "min": min(self.values), "max": max(self.values)})
+        os.remove(index_path(self.path))
+
+
+class MergeTest(unittest.TestCase):
+    def test_merge_into_empty_keeps_stats_and_copies_sketch(self):
+        other = ScanStats(("sum", "hist"))
+        other.update_values([1, 2, 3])
+        merged = ScanStats(("sum", "hist")).merge(other)
+        self.assertEqual(merged.stats, frozenset(("sum", "hist")))
+        self.assertIsNot(merged.sketch, other.sketch)
+        merged.update_values([4])
+        self.assertEqual(sum(other.sketch), 3)
+
+        merged = ScanStats(("sum",)).merge(ScanStats(("sum", "min", "max", "mean")).merge(other))
+        self.assertEqual(merged.as_dict(), {"count": 3, "total": 6})
+
+
+if __name__ == "__main__":
+    unittest.main()
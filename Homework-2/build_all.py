@@ -0,0 +1,52 @@
+import argparse
+
+import polars as pl
+
+from build_candlesticks import RANDOM_KEY, candle_aggregates
+from build_discrete_trades import discrete_aggregates
+from storage_profile import COMPRESSIONS, DEFAULT_COMPRESSION, write_frames
+from trades_pipeline import interval_to_ms, parse_datetime_ms, scan_trades, with_open_time
+
+
+def parse_args():
+    """Парсинг аргументов командной строки"""
+    parser = argparse.ArgumentParser(
+        description="Построение свечей и дискретизированных сделок за одно чтение данных Binance")
+    parser.add_argument("--input", type=str, required=True, help="Входная папка или parquet-файл")
+    parser.add_argument("--interval", type=str, required=True,
+                        help="Интервал агрегации (например, 500ms, 1s, 1m, 1h)")
+    parser.add_argument("--candles-output", type=str, required=True,
+                        help="Путь для сохранения свечей (.parquet)")
+    parser.add_argument("--discrete-output", type=str, required=True,
+                        help="Путь для сохранения дискретизированных сделок (.parquet)")
+    parser.add_argument("--start", type=parse_datetime_ms,
+                        help="Начало диапазона (UTC, ГГГГ-ММ-ДД или ГГГГ-ММ-ДДTЧЧ:ММ[:СС]), включительно")
+    parser.add_argument("--end", type=parse_datetime_ms,
+                        help="Конец диапазона (UTC, тот же формат), не включительно")
+    parser.add_argument("--compression", choices=COMPRESSIONS, default=DEFAULT_COMPRESSION,
+                        help=f"Кодек сжатия выходных файлов (по умолчанию {DEFAULT_COMPRESSION})")
+    return parser.parse_args()
+
+
+def build_all(lf: pl.LazyFrame, interval_ms: int, candles_output, discrete_output,
+              compression=DEFAULT_COMPRESSION):
+    """
+    Свечи и дискретизированные сделки из одного плана: сканирование и колонка open_time
+    общие, оба результата записываются одним запуском collect_all, который выполняет
+    общую часть плана один раз
+    """
+    trades = with_open_time(lf, interval_ms)
+    write_frames([(candle_aggregates(trades).drop(RANDOM_KEY), candles_output, "candles"),
+                  (discrete_aggregates(trades), discrete_output, "discrete")], compression)
+
+
+def main():
+    """Основная функция выполнения скрипта"""
+    args = parse_args()
+    lf = scan_trades(args.input, args.start, args.end)  # Ленивое чтение входных данных
+    build_all(lf, interval_to_ms(args.interval), args.candles_output, args.discrete_output,
+              args.compression)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,74 +1,173 @@
 import argparse
+import shutil
+import tempfile
 import polars as pl
 import os
 
+from incremental import PART_COLUMN, update_incremental
+from storage_profile import COMPRESSIONS, DEFAULT_COMPRESSION, write_frame
+from trades_pipeline import interval_to_ms, parse_datetime_ms, scan_trades, trade_hash_expr, with_open_time
+
+RANDOM_KEY = "_random_key"  # Служебная колонка: минимальный хэш trade_id в свече
+
 
 def parse_args():
     """Парсинг аргументов командной строки"""
     parser = argparse.ArgumentParser(description="Построение свечных графиков из данных о сделках Binance.")
     parser.add_argument("--input", type=str, required=True, help="Входная папка или parquet-файл")
-    parser.add_argument("--output", type=str, required=True, help="Путь для сохранения выходного parquet-файла")
-    parser.add_argument("--interval", type=str, required=True,
-                        choices=["500ms", "1s", "1m"],
-                        help="Интервал свечей (500ms, 1s или 1m)")
+    parser.add_argument("--output", type=str, required=True,
+                        help="Путь для сохранения выходного parquet-файла; для --intervals - "
+                             "директория или шаблон с {interval}")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--interval", type=str,
+                       help="Интервал свечей (например, 500ms, 1s, 5s, 1m, 15m, 1h, 1d)")
+    group.add_argument("--intervals", type=lambda v: [i.strip() for i in v.split(",") if i.strip()],
+                       help="Список интервалов через запятую (например, 500ms,1s,5s,1m,15m,1h,1d): "
+                            "все разрешения строятся за один проход по сделкам")
+    parser.add_argument("--start", type=parse_datetime_ms,
+                        help="Начало диапазона (UTC, ГГГГ-ММ-ДД или ГГГГ-ММ-ДДTЧЧ:ММ[:СС]), включительно")
+    parser.add_argument("--end", type=parse_datetime_ms,
+                        help="Конец диапазона (UTC, тот же формат), не включительно")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Инкрементальный режим: --output - директория с дневными секциями, "
+                             "обрабатываются только новые сделки")
+    parser.add_argument("--compression", choices=COMPRESSIONS, default=DEFAULT_COMPRESSION,
+                        help=f"Кодек сжатия выходных файлов (по умолчанию {DEFAULT_COMPRESSION})")
     return parser.parse_args()
 
 
-def interval_to_ms(interval):
-    """Конвертация строкового интервала в миллисекунды"""
-    if interval == "500ms":
-        return 500
-    elif interval == "1s":
-        return 1000
-    elif interval == "1m":
-        return 60000  # 1 минута = 60,000 мс
-
-
-def read_parquet(input_path):
-    """Чтение parquet-файлов из указанного пути"""
-    if os.path.isdir(input_path):
-        # Если путь - директория, читаем все parquet-файлы в ней
-        files = [os.path.join(input_path, f)
-                 for f in os.listdir(input_path)
-                 if f.endswith(".parquet")]
-        if not files:
-            raise ValueError(f"В директории {input_path} не найдено parquet-файлов")
-        return pl.read_parquet(files)
-    elif os.path.isfile(input_path) and input_path.endswith(".parquet"):
-        # Если путь указывает на конкретный файл
-        return pl.read_parquet(input_path)
-    else:
-        raise ValueError("Входной путь должен быть директорией или parquet-файлом")
-
-
-def build_candlesticks(df: pl.DataFrame, interval_ms: int) -> pl.DataFrame:
-    """Построение свечного графика из данных о сделках"""
-    # Выравнивание временных меток по заданному интервалу
-    df = df.with_columns(
-        (pl.col("timestamp") // interval_ms * interval_ms).alias("open_time")
-    )
+def candle_aggregates(lf: pl.LazyFrame) -> pl.LazyFrame:
+    """Свечи из сделок с уже вычисленной колонкой open_time (со служебной колонкой RANDOM_KEY)"""
+    lf = lf.with_columns(trade_hash_expr().alias(RANDOM_KEY))
 
-    # Агрегация данных по интервалам
-    candles = df.group_by("open_time").agg([
-        pl.col("price").first().alias("open"),  # Цена открытия (первая сделка в интервале)
+    # Агрегация данных по интервалам. Порядок сделок внутри группы не гарантирован,
+    # поэтому открытие/закрытие определяются по минимальному/максимальному trade_id
+    # (идентификаторы сделок Binance монотонно растут во времени)
+    return lf.group_by("open_time").agg([
+        pl.col("price").get(pl.col("trade_id").arg_min()).alias("open"),  # Цена открытия (первая сделка в интервале)
         pl.col("price").max().alias("high"),  # Максимальная цена
         pl.col("price").min().alias("low"),  # Минимальная цена
-        pl.col("price").last().alias("close"),  # Цена закрытия (последняя сделка)
-        pl.col("price").sort_by("_random_sort").first().alias("random"),  # Случайная цена в интервале
+        pl.col("price").get(pl.col("trade_id").arg_max()).alias("close"),  # Цена закрытия (последняя сделка)
+        # Случайная цена в интервале: сделка с минимальным хэшем trade_id (детерминированно)
+        pl.col("price").get(pl.col(RANDOM_KEY).arg_min()).alias("random"),
         pl.col("quantity").sum().alias("volume"),  # Общий объем
-        pl.len().alias("num_trades")  # Количество сделок
+        pl.len().alias("num_trades"),  # Количество сделок
+        pl.col(RANDOM_KEY).min()
     ]).sort("open_time")  # Сортировка по времени
 
-    return candles
+
+def aggregate_trades(df, interval_ms: int) -> pl.LazyFrame:
+    """Свечи из сырых сделок со служебной колонкой RANDOM_KEY (для каскада)"""
+    # Выравнивание временных меток по заданному интервалу
+    return candle_aggregates(with_open_time(df, interval_ms))
+
+
+def rollup_candles(candles, interval_ms: int) -> pl.LazyFrame:
+    """Построение более крупных свечей из более мелких"""
+    lf = candles.lazy().rename({"open_time": "child_time"}).with_columns(
+        (pl.col("child_time") // interval_ms * interval_ms).alias("open_time")
+    )
+
+    # Так как "случайная" сделка - это сделка с минимальным хэшем, ее можно найти
+    # среди дочерних свечей, и результат совпадает с расчетом по сырым сделкам
+    return lf.group_by("open_time").agg([
+        pl.col("open").get(pl.col("child_time").arg_min()),  # Открытие первой дочерней свечи
+        pl.col("high").max(),
+        pl.col("low").min(),
+        pl.col("close").get(pl.col("child_time").arg_max()),  # Закрытие последней дочерней свечи
+        pl.col("random").get(pl.col(RANDOM_KEY).arg_min()),
+        pl.col("volume").sum(),
+        pl.col("num_trades").sum(),
+        pl.col(RANDOM_KEY).min()
+    ]).sort("open_time")
+
+
+def merge_candles(candles) -> pl.LazyFrame:
+    """Объединение частей одной свечи (PART_COLUMN задает порядок частей во времени)"""
+    return candles.lazy().group_by("open_time").agg([
+        pl.col("open").get(pl.col(PART_COLUMN).arg_min()),  # Открытие самой ранней части
+        pl.col("high").max(),
+        pl.col("low").min(),
+        pl.col("close").get(pl.col(PART_COLUMN).arg_max()),  # Закрытие самой поздней части
+        pl.col("random").get(pl.col(RANDOM_KEY).arg_min()),
+        pl.col("volume").sum(),
+        pl.col("num_trades").sum(),
+        pl.col(RANDOM_KEY).min()
+    ]).sort("open_time")
+
+
+def build_candlesticks(df, interval_ms: int) -> pl.LazyFrame:
+    """Построение свечного графика из данных о сделках (DataFrame или LazyFrame)"""
+    return aggregate_trades(df, interval_ms).drop(RANDOM_KEY)
+
+
+def output_path(output, interval):
+    """Путь результата для интервала: шаблон с {interval} или файл в директории"""
+    if "{interval}" in output:
+        return output.format(interval=interval)
+    return os.path.join(output, f"candles-{interval}.parquet")
+
+
+def build_cascade(lf: pl.LazyFrame, intervals, output, compression=DEFAULT_COMPRESSION):
+    """
+    Построение нескольких интервалов: каждый интервал строится из наибольшего уже
+    построенного интервала, на который он делится, а интервал, который не делится
+    ни на один из них (самый мелкий, или 3s рядом с 2s), - по сырым сделкам
+    """
+    # Интервалы с одинаковой длительностью (например, 60s и 1m) строятся один раз,
+    # а результат записывается под каждым запрошенным именем
+    names = {}
+    for interval in dict.fromkeys(intervals):
+        names.setdefault(interval_to_ms(interval), []).append(interval)
+    for same in names.values():
+        if len(same) > 1:
+            print(f"Предупреждение: интервалы {', '.join(same)} совпадают и строятся один раз")
+    levels = sorted((interval_ms, same[0]) for interval_ms, same in names.items())
+
+    # Промежуточные уровни (со служебной колонкой) хранятся на диске,
+    # поэтому каждый уровень читает только предыдущий, а не всю историю
+    tmp_dir = tempfile.mkdtemp(prefix="candles-")
+    try:
+        built = []
+        for interval_ms, interval in levels:
+            source = max((ms for ms, _ in built if interval_ms % ms == 0), default=None)
+            if source is None:
+                candles = aggregate_trades(lf, interval_ms)
+            else:
+                candles = rollup_candles(pl.scan_parquet(dict(built)[source]), interval_ms)
+
+            level_path = os.path.join(tmp_dir, f"{interval_ms}.parquet")
+            candles.sink_parquet(level_path)
+            built.append((interval_ms, level_path))
+
+            for name in names[interval_ms]:
+                write_frame(pl.scan_parquet(level_path).drop(RANDOM_KEY), output_path(output, name),
+                            "candles", compression)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
 
 
 def main():
     """Основная функция выполнения скрипта"""
     args = parse_args()  # Получение аргументов
-    df = read_parquet(args.input)  # Чтение входных данных
+    if args.incremental:
+        # Инкрементальный режим: только новые сделки и затронутые дневные секции
+        if args.intervals or args.start or args.end:
+            raise ValueError("--incremental совместим только с --interval")
+        interval_ms = interval_to_ms(args.interval)
+        update_incremental(lambda start_ms: scan_trades(args.input, start_ms),
+                           args.output, interval_ms,
+                           lambda lf: aggregate_trades(lf, interval_ms), merge_candles, "open_time",
+                           args.compression)
+        return
+    lf = scan_trades(args.input, args.start, args.end)  # Ленивое чтение входных данных
+    if args.intervals:
+        # Каскад: кратные интервалы строятся из уже построенных, без повторного чтения сделок
+        build_cascade(lf, args.intervals, args.output, args.compression)
+        return
     interval_ms = interval_to_ms(args.interval)  # Конвертация интервала
-    candles = build_candlesticks(df, interval_ms)  # Построение свечей
-    candles.write_parquet(args.output)  # Сохранение результата
+    candles = build_candlesticks(lf, interval_ms)  # Построение плана свечей
+    write_frame(candles, args.output, "candles", args.compression)  # Выполнение и сохранение в профиле хранения
 
 
 if __name__ == "__main__":
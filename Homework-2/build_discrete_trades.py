@@ -1,6 +1,9 @@
 import argparse
 import polars as pl
-import os
+
+from incremental import update_incremental
+from storage_profile import COMPRESSIONS, DEFAULT_COMPRESSION, write_frame
+from trades_pipeline import interval_to_ms, scan_trades, with_open_time
 
 
 def parse_args():
@@ -14,52 +17,26 @@ def parse_args():
                         help="Путь для сохранения выходного файла .parquet")
     # Доступные интервалы агрегации
     parser.add_argument("--interval", type=str, required=True,
-                        choices=["250ms", "500ms", "1s", "1h"],
-                        help="Интервал агрегации сделок")
+                        help="Интервал агрегации сделок (например, 250ms, 500ms, 1s, 1h)")
+    # Инкрементальный режим
+    parser.add_argument("--incremental", action="store_true",
+                        help="Инкрементальный режим: --output - директория с дневными секциями, "
+                             "обрабатываются только новые сделки")
+    # Кодек сжатия
+    parser.add_argument("--compression", choices=COMPRESSIONS, default=DEFAULT_COMPRESSION,
+                        help=f"Кодек сжатия выходных файлов (по умолчанию {DEFAULT_COMPRESSION})")
     return parser.parse_args()
 
 
-def interval_to_ms(interval):
-    """Конвертация строкового интервала в миллисекунды"""
-    if interval == "250ms":
-        return 250  # 250 миллисекунд
-    elif interval == "500ms":
-        return 500  # 500 миллисекунд
-    elif interval == "1s":
-        return 1000  # 1 секунда (1000 мс)
-    elif interval == "1h":
-        return 3600 * 1000  # 1 час (3,600,000 мс)
-
-
-def read_parquet(input_path):
-    """Чтение входных данных из parquet-файла(ов)"""
-    if os.path.isdir(input_path):
-        # Если путь ведет к папке - находим все parquet-файлы
-        files = [os.path.join(input_path, f)
-                 for f in os.listdir(input_path)
-                 if f.endswith(".parquet")]
-        if not files:
-            raise ValueError(f"В директории {input_path} не найдено parquet-файлов")
-        return pl.read_parquet(files)  # Чтение всех файлов
-    elif os.path.isfile(input_path) and input_path.endswith(".parquet"):
-        # Если путь ведет к конкретному файлу
-        return pl.read_parquet(input_path)
-    else:
-        raise ValueError("Входные данные должны быть файлом .parquet или папкой с такими файлами")
-
-
-def build_discrete_trades(df: pl.DataFrame, interval_ms: int) -> pl.DataFrame:
-    """Построение дискретизированных сделок"""
-    # Добавляем колонки:
-    # 1. Время начала интервала (выровненное)
-    # 2. Направление сделки (покупка/продажа)
-    df = df.with_columns([
-        (pl.col("timestamp") // interval_ms * interval_ms).alias("open_time"),
-        pl.when(pl.col("is_buyer_maker")).then("sell").otherwise("buy").alias("side")
-    ])
+def discrete_aggregates(lf: pl.LazyFrame) -> pl.LazyFrame:
+    """Дискретизированные сделки из сделок с уже вычисленной колонкой open_time"""
+    # Направление сделки (покупка/продажа)
+    lf = lf.with_columns(
+        pl.when(pl.col("is_buyer_maker")).then(pl.lit("sell")).otherwise(pl.lit("buy")).alias("side")
+    )
 
     # Группировка по времени и направлению сделки
-    trades = df.group_by(["open_time", "side"]).agg([
+    trades = lf.group_by(["open_time", "side"]).agg([
         # Средневзвешенная цена (VWAP)
         (pl.col("price") * pl.col("quantity")).sum() / pl.col("quantity").sum(),
         # Суммарный объем в базовой валюте
@@ -79,22 +56,48 @@ def build_discrete_trades(df: pl.DataFrame, interval_ms: int) -> pl.DataFrame:
     return trades
 
 
+def build_discrete_trades(df, interval_ms: int) -> pl.LazyFrame:
+    """Построение дискретизированных сделок (DataFrame или LazyFrame)"""
+    # Время начала интервала (выровненное)
+    return discrete_aggregates(with_open_time(df, interval_ms))
+
+
+def merge_discrete_trades(trades) -> pl.LazyFrame:
+    """Объединение частей одного интервала: VWAP пересчитывается с весами по объему"""
+    return trades.lazy().group_by(["open_time", "side"]).agg([
+        ((pl.col("vwap_price") * pl.col("total_quantity")).sum()
+         / pl.col("total_quantity").sum()).alias("vwap_price"),
+        pl.col("total_quantity").sum(),
+        pl.col("total_quote_qty").sum(),
+        pl.col("num_trades").sum()
+    ]).sort(["open_time", "side"])
+
+
 def main():
     """Основная функция выполнения скрипта"""
     # 1. Получаем параметры командной строки
     args = parse_args()
 
-    # 2. Загружаем входные данные
-    df = read_parquet(args.input)
+    if args.incremental:
+        # Инкрементальный режим: только новые сделки и затронутые дневные секции
+        interval_ms = interval_to_ms(args.interval)
+        update_incremental(lambda start_ms: scan_trades(args.input, start_ms),
+                           args.output, interval_ms,
+                           lambda lf: build_discrete_trades(lf, interval_ms),
+                           merge_discrete_trades, ["open_time", "side"], args.compression)
+        return
+
+    # 2. Лениво читаем входные данные
+    lf = scan_trades(args.input)
 
     # 3. Конвертируем интервал в миллисекунды
     interval_ms = interval_to_ms(args.interval)
 
     # 4. Строим дискретизированные сделки
-    discrete_trades = build_discrete_trades(df, interval_ms)
+    discrete_trades = build_discrete_trades(lf, interval_ms)
 
-    # 5. Сохраняем результат
-    discrete_trades.write_parquet(args.output)
+    # 5. Выполнение и сохранение результата в профиле хранения
+    write_frame(discrete_trades, args.output, "discrete", args.compression)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,345 @@
+"""
+Каталог метаданных parquet-файлов сделок, свечей и дискретных сделок.
+
+Для каждого файла хранятся символ (из секции symbol=...), тип данных, интервал
+агрегации, число строк, минимальное/максимальное время и границы групп строк
+(время и число строк каждой группы). Запрос за диапазон времени открывает только
+пересекающиеся файлы и читает только пересекающиеся группы строк, поэтому время
+ответа зависит от размера окна, а не от объема данных.
+"""
+import argparse
+import json
+import os
+import re
+import time
+from collections import Counter
+
+import polars as pl
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from build_candlesticks import build_candlesticks
+from build_discrete_trades import build_discrete_trades
+from storage_profile import PROFILES, detect_kind, normalize_arrow, to_epoch_ms
+from trades_pipeline import interval_to_ms, list_parquet_files, parse_datetime_ms
+
+CATALOG_NAME = "_catalog.json"
+CATALOG_VERSION = 1
+KINDS = ("trades", "candles", "discrete")
+INTERVAL_PATH_RE = re.compile(r"-(\d+(?:ms|s|m|h|d))(?:\.parquet|[/\\])")
+SYMBOL_KEY = "_symbol"  # Служебная колонка: символ файла при удалении дублей
+
+
+def catalog_path(root):
+    return os.path.join(root, CATALOG_NAME)
+
+
+def load_catalog(root):
+    """Чтение каталога (пустой каталог, если его еще нет)"""
+    path = catalog_path(root)
+    if not os.path.exists(path):
+        return {"version": CATALOG_VERSION, "files": {}}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def save_catalog(root, catalog):
+    """Атомарная запись каталога через временный файл"""
+    path = catalog_path(root)
+    with open(path + ".tmp", "w") as f:
+        json.dump(catalog, f, indent=1, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def path_symbol(path):
+    """Символ из секции symbol=... в пути (None, если секции нет)"""
+    match = re.search(r"symbol=([^/\\]+)", path)
+    return match.group(1).upper() if match else None
+
+
+def path_interval(path):
+    """Интервал из имени файла или директории (candles-1m.parquet, discrete-1s/...)"""
+    match = INTERVAL_PATH_RE.search(path)
+    return interval_to_ms(match.group(1)) if match else None
+
+
+def path_source(path):
+    """Написание интервала в пути: candles-1m и candles-60s - разные выходы одного интервала"""
+    match = INTERVAL_PATH_RE.search(path)
+    return match.group(1) if match else ""
+
+
+def time_bounds(column_chunk, read_column, unit=None):
+    """
+    Минимум и максимум времени группы строк в миллисекундах: по статистике или чтением
+    колонки. unit - единица колонки timestamp (для целого времени - по величине значений)
+    """
+    stats = column_chunk.statistics
+    if stats is not None and stats.has_min_max:
+        # Физическое значение INT64 - время в единице колонки
+        return to_epoch_ms(int(stats.min_raw), unit), to_epoch_ms(int(stats.max_raw), unit)
+    values = normalize_arrow(pa.table({"time": read_column()})).column(0)
+    return pc.min(values).as_py(), pc.max(values).as_py()
+
+
+def describe_file(path):
+    """Запись каталога для одного файла"""
+    parquet = pq.ParquetFile(path)
+    schema = parquet.schema_arrow
+    kind = detect_kind(schema.names)
+    column = PROFILES[kind]["time"][0]
+    index = schema.names.index(column)
+    column_type = schema.field(column).type
+    unit = column_type.unit if pa.types.is_timestamp(column_type) else None
+    if unit == "s":
+        raise ValueError(f"{path}: время в секундах не поддерживается")
+
+    row_groups = []
+    for i in range(parquet.metadata.num_row_groups):
+        group = parquet.metadata.row_group(i)
+        if not group.num_rows:
+            continue
+        low, high = time_bounds(group.column(index),
+                                lambda: parquet.read_row_group(i, columns=[column]).column(0), unit)
+        row_groups.append({"index": i, "min": low, "max": high, "rows": group.num_rows})
+
+    interval_ms = None
+    if kind != "trades":
+        interval_ms = path_interval(path)
+        if interval_ms is None and parquet.metadata.num_rows > 1:
+            # Интервал по данным: минимальный шаг между соседними временами открытия
+            times = normalize_arrow(parquet.read(columns=[column])).column(0).to_numpy()
+            steps = times[1:] - times[:-1]
+            steps = steps[steps > 0]
+            interval_ms = int(steps.min()) if len(steps) else None
+
+    stat = os.stat(path)
+    return {
+        "symbol": path_symbol(path),
+        "kind": kind,
+        "interval_ms": interval_ms,
+        "time_column": column,
+        "rows": parquet.metadata.num_rows,
+        "min": min((g["min"] for g in row_groups), default=None),
+        "max": max((g["max"] for g in row_groups), default=None),
+        "row_groups": row_groups,
+        "bytes": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+    }
+
+
+def build_catalog(root, force=False):
+    """
+    Построение или обновление каталога: заново описываются только новые и измененные
+    (по размеру и времени изменения) файлы, записи удаленных файлов убираются.
+    С force описываются все файлы. Каталог записывается, только если он изменился
+    """
+    catalog = load_catalog(root)
+    old_files = {} if force else catalog["files"]
+    files = {}
+    described = 0
+    for path in list_parquet_files(root):
+        relpath = os.path.relpath(path, root)
+        stat = os.stat(path)
+        entry = old_files.get(relpath)
+        if entry is None or entry["bytes"] != stat.st_size or entry["mtime_ns"] != stat.st_mtime_ns:
+            entry = describe_file(path)
+            described += 1
+        files[relpath] = entry
+    changed = described or files.keys() != catalog["files"].keys() or not os.path.exists(catalog_path(root))
+    catalog = {"version": CATALOG_VERSION, "files": files}
+    if changed:
+        save_catalog(root, catalog)
+    return catalog, described
+
+
+def overlaps(low, high, start_ms, end_ms):
+    """Пересекается ли отрезок [low, high] с полуинтервалом [start_ms, end_ms)"""
+    return (low is not None and (start_ms is None or high >= start_ms)
+            and (end_ms is None or low < end_ms))
+
+
+def one_source(candidates):
+    """
+    Один выход на (символ, интервал): если интервал записан под разными именами
+    (candles-1m и candles-60s), берется имя с наибольшим числом строк - иначе строки задвоятся
+    """
+    rows = Counter()
+    for relpath, entry in candidates:
+        rows[entry["symbol"], entry["interval_ms"], path_source(relpath)] += entry["rows"]
+    best = {}
+    for (symbol, interval_ms, source), _ in sorted(rows.items(), key=lambda item: (-item[1], item[0][2])):
+        best.setdefault((symbol, interval_ms), source)
+    return [(relpath, entry) for relpath, entry in candidates
+            if best[entry["symbol"], entry["interval_ms"]] == path_source(relpath)]
+
+
+def select_row_groups(catalog, kind, start_ms=None, end_ms=None, symbol=None, interval_ms=None):
+    """
+    Список (относительный путь, индексы групп строк), пересекающихся с диапазоном.
+    Файлы без символа в пути подходят под любой symbol, если файлов с этим символом нет
+    """
+    candidates = []
+    for relpath, entry in sorted(catalog["files"].items(), key=lambda item: (item[1]["min"] or 0, item[0])):
+        if entry["kind"] != kind:
+            continue
+        if symbol is not None and entry["symbol"] not in (symbol.upper(), None):
+            continue
+        if interval_ms is not None and entry["interval_ms"] != interval_ms:
+            continue
+        candidates.append((relpath, entry))
+    if symbol is not None and any(entry["symbol"] is not None for _, entry in candidates):
+        candidates = [(relpath, entry) for relpath, entry in candidates if entry["symbol"] is not None]
+    if kind != "trades":
+        candidates = one_source(candidates)
+
+    selected = []
+    for relpath, entry in candidates:
+        if not overlaps(entry["min"], entry["max"], start_ms, end_ms):
+            continue
+        groups = [g["index"] for g in entry["row_groups"] if overlaps(g["min"], g["max"], start_ms, end_ms)]
+        if groups:
+            selected.append((relpath, groups))
+    return selected
+
+
+def read_selected(root, selected, kind, start_ms=None, end_ms=None, columns=None):
+    """
+    Чтение выбранных групп строк с точной фильтрацией по времени. Для свечей и
+    дискретных сделок перекрывающиеся файлы одного символа не задваивают строки:
+    остается первая строка с данным временем открытия (и стороной)
+    """
+    frames = []
+    for relpath, groups in selected:
+        table = normalize_arrow(pq.ParquetFile(os.path.join(root, relpath)).read_row_groups(groups, columns=columns))
+        frame = pl.from_arrow(table)
+        if kind != "trades":
+            frame = frame.with_columns(pl.lit(path_symbol(relpath), dtype=pl.String).alias(SYMBOL_KEY))
+        frames.append(frame)
+    if not frames:
+        return None
+    df = pl.concat(frames, how="vertical_relaxed")
+    if kind != "trades":
+        keys = [SYMBOL_KEY] + [key for key in PROFILES[kind]["sort"] if key in df.columns]
+        df = df.unique(subset=keys, keep="first", maintain_order=True).drop(SYMBOL_KEY)
+    time_column = PROFILES[kind]["time"][0]
+    if start_ms is not None:
+        df = df.filter(pl.col(time_column) >= start_ms)
+    if end_ms is not None:
+        df = df.filter(pl.col(time_column) < end_ms)
+    return df.sort([key for key in PROFILES[kind]["sort"] if key in df.columns])
+
+
+class Catalog:
+    """Запросы к данным за диапазон времени через каталог метаданных"""
+
+    def __init__(self, root, refresh=False):
+        # Каталог сверяется с файлами по размеру и времени изменения: новые и измененные
+        # файлы описываются заново, удаленные убираются; refresh заново описывает все файлы
+        self.root = root
+        self.catalog = build_catalog(root, force=refresh)[0]
+        self.last_stats = {}
+
+    def _read(self, kind, start_ms, end_ms, symbol=None, interval_ms=None, columns=None):
+        selected = select_row_groups(self.catalog, kind, start_ms, end_ms, symbol, interval_ms)
+        self.last_stats = {
+            "kind": kind,
+            "files": len(selected),
+            "row_groups": sum(len(groups) for _, groups in selected),
+            "catalog_files": len(self.catalog["files"]),
+            "unknown_symbol": symbol is not None and any(
+                self.catalog["files"][relpath]["symbol"] is None for relpath, _ in selected),
+        }
+        return read_selected(self.root, selected, kind, start_ms, end_ms, columns)
+
+    def trades(self, start_ms=None, end_ms=None, symbol=None, columns=None):
+        """Сделки за диапазон [start_ms, end_ms)"""
+        df = self._read("trades", start_ms, end_ms, symbol, columns=columns)
+        return df if df is not None else pl.DataFrame()
+
+    def _aggregates(self, kind, build, interval, start_ms, end_ms, symbol):
+        interval_ms = interval_to_ms(interval)
+        df = self._read(kind, start_ms, end_ms, symbol, interval_ms)
+        if df is not None:
+            return df
+        # Готового результата с таким интервалом нет: строим по сделкам интервалов,
+        # открывшихся в диапазоне (границы округляются вверх до начала интервала)
+        low = None if start_ms is None else -(-start_ms // interval_ms) * interval_ms
+        high = None if end_ms is None else -(-end_ms // interval_ms) * interval_ms
+        trades = self._read("trades", low, high, symbol)
+        self.last_stats["built_from_trades"] = True
+        if trades is None:
+            return pl.DataFrame()
+        return build(trades, interval_ms).collect()
+
+    def candles(self, interval, start_ms=None, end_ms=None, symbol=None):
+        """Свечи интервала interval, открывшиеся в диапазоне [start_ms, end_ms)"""
+        return self._aggregates("candles", build_candlesticks, interval, start_ms, end_ms, symbol)
+
+    def discrete(self, interval, start_ms=None, end_ms=None, symbol=None):
+        """Дискретизированные сделки интервала interval в диапазоне [start_ms, end_ms)"""
+        return self._aggregates("discrete", build_discrete_trades, interval, start_ms, end_ms, symbol)
+
+
+def parse_args():
+    """Парсинг аргументов командной строки"""
+    parser = argparse.ArgumentParser(description="Каталог метаданных и запросы за диапазон времени")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="Построить или обновить каталог")
+    build.add_argument("--root", type=str, required=True, help="Корневая директория данных")
+
+    query = commands.add_parser("query", help="Данные за диапазон времени")
+    query.add_argument("--root", type=str, required=True, help="Корневая директория данных")
+    query.add_argument("--kind", choices=KINDS, default="trades", help="Тип данных (по умолчанию trades)")
+    query.add_argument("--symbol", type=str, help="Торговая пара (например, BTCUSDT)")
+    query.add_argument("--interval", type=str, help="Интервал для candles/discrete (например, 1m)")
+    query.add_argument("--start", type=parse_datetime_ms, required=True,
+                       help="Начало диапазона (UTC, ГГГГ-ММ-ДД или ГГГГ-ММ-ДДTЧЧ:ММ[:СС]), включительно")
+    query.add_argument("--end", type=parse_datetime_ms, required=True,
+                       help="Конец диапазона (UTC, тот же формат), не включительно")
+    query.add_argument("--refresh", action="store_true", help="Заново описать все файлы каталога перед запросом "
+                       "(новые и измененные файлы обновляются и без этого флага)")
+    query.add_argument("--output", type=str, help="Сохранить результат (.parquet или .csv)")
+    return parser.parse_args()
+
+
+def main():
+    """Основная функция выполнения скрипта"""
+    args = parse_args()
+    if args.command == "build":
+        begin = time.perf_counter()
+        catalog, described = build_catalog(args.root)
+        print(f"Каталог {catalog_path(args.root)}: {len(catalog['files'])} файлов, "
+              f"обновлено {described}, {time.perf_counter() - begin:.2f} с")
+        return
+
+    if args.kind != "trades" and not args.interval:
+        raise ValueError("Для candles и discrete нужен --interval")
+    begin = time.perf_counter()
+    catalog = Catalog(args.root, args.refresh)
+    if args.kind == "trades":
+        df = catalog.trades(args.start, args.end, args.symbol)
+    elif args.kind == "candles":
+        df = catalog.candles(args.interval, args.start, args.end, args.symbol)
+    else:
+        df = catalog.discrete(args.interval, args.start, args.end, args.symbol)
+    elapsed = time.perf_counter() - begin
+
+    if args.output:
+        if args.output.endswith(".csv"):
+            df.write_csv(args.output)
+        else:
+            df.write_parquet(args.output)
+    else:
+        print(df)
+    stats = catalog.last_stats
+    print(f"{df.height} строк за {elapsed * 1000:.1f} мс: прочитано {stats['row_groups']} групп строк "
+          f"из {stats['files']} файлов (в каталоге {stats['catalog_files']} файлов)"
+          + (", построено по сделкам" if stats.get("built_from_trades") else "")
+          + (", файлы без символа в пути" if stats.get("unknown_symbol") else ""))
+
+
+if __name__ == "__main__":
+    main()
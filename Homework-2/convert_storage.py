@@ -0,0 +1,137 @@
+import argparse
+import json
+import os
+import shutil
+import time
+
+import pyarrow.parquet as pq
+
+from download_binance_trades import MANIFEST_NAME, load_manifest, save_manifest, sha256_file
+from storage_profile import (COMPRESSIONS, DEFAULT_COMPRESSION, PROFILES, ROW_GROUP_SIZE,
+                             compact_file, detect_kind, scan_file)
+from trades_pipeline import list_parquet_files
+
+
+def parse_args():
+    """Парсинг аргументов командной строки"""
+    parser = argparse.ArgumentParser(
+        description="Перевод существующих parquet-файлов в профиль хранения с отчетом о выигрыше")
+    parser.add_argument("--input", type=str, required=True,
+                        help="Входной parquet-файл или директория (обрабатывается рекурсивно)")
+    parser.add_argument("--output", type=str,
+                        help="Выходная директория (структура повторяет входную); "
+                             "без параметра файлы заменяются на месте")
+    parser.add_argument("--kind", choices=sorted(PROFILES),
+                        help="Тип данных (по умолчанию определяется по колонкам)")
+    parser.add_argument("--compression", choices=COMPRESSIONS, default=DEFAULT_COMPRESSION,
+                        help=f"Кодек сжатия (по умолчанию {DEFAULT_COMPRESSION})")
+    parser.add_argument("--row-group-size", type=int, default=ROW_GROUP_SIZE,
+                        help=f"Строк в группе (по умолчанию {ROW_GROUP_SIZE})")
+    parser.add_argument("--report", type=str, help="Сохранить отчет в JSON")
+    return parser.parse_args()
+
+
+def time_column(path):
+    """Колонка времени файла"""
+    names = pq.read_schema(path).names
+    return PROFILES[detect_kind(names)]["time"][0]
+
+
+def measure_scan(path):
+    """
+    Время полного чтения файла и выборки 1% диапазона времени (по медиане из трех
+    запусков); выборка показывает отсечение групп строк по статистике
+    """
+    column = time_column(path)
+    bounds = scan_file(path, time_column=column).select(column).collect()[column]
+    start_ms, end_ms = bounds.min(), bounds.max()
+    if start_ms is None:
+        return {"full_s": 0.0, "range_s": 0.0}
+    window = max((end_ms - start_ms) // 100, 1)
+
+    def median_of(run):
+        timings = []
+        for _ in range(3):
+            begin = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - begin)
+        return sorted(timings)[1]
+
+    return {
+        "full_s": median_of(lambda: scan_file(path, time_column=column).collect()),
+        "range_s": median_of(lambda: scan_file(path, start_ms, start_ms + window, column).collect()),
+    }
+
+
+def update_manifest(root, converted):
+    """Обновить размер и sha256 замененных файлов в манифесте загрузчика"""
+    manifest_path = os.path.join(root, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return
+    manifest = load_manifest(manifest_path)
+    for days in manifest["symbols"].values():
+        for entry in days.values():
+            path = os.path.join(root, entry["path"])
+            if path in converted:
+                entry["bytes"] = os.path.getsize(path)
+                entry["sha256"] = sha256_file(path)
+    save_manifest(manifest_path, manifest)
+
+
+def convert(input_path, output, kind=None, compression=DEFAULT_COMPRESSION, row_group_size=ROW_GROUP_SIZE):
+    """Перевод файлов в профиль хранения; возвращает строки отчета по файлам"""
+    root = input_path if os.path.isdir(input_path) else os.path.dirname(input_path)
+    rows = []
+    converted = set()
+    for src in list_parquet_files(input_path):
+        dst = src if output is None else os.path.join(output, os.path.relpath(src, root))
+        os.makedirs(os.path.dirname(dst) or ".", exist_ok=True)
+        before = {"bytes": os.path.getsize(src), **measure_scan(src)}
+
+        result = compact_file(src, dst, kind, compression, row_group_size)
+        converted.add(dst)
+
+        after = {"bytes": os.path.getsize(dst), **measure_scan(dst)}
+        rows.append({"path": os.path.relpath(src, root), **result, "before": before, "after": after})
+        print(f"{os.path.relpath(src, root)}: {before['bytes'] / 1024 ** 2:.2f} -> "
+              f"{after['bytes'] / 1024 ** 2:.2f} MiB, full scan {before['full_s'] * 1000:.1f} -> "
+              f"{after['full_s'] * 1000:.1f} ms, 1% range {before['range_s'] * 1000:.1f} -> "
+              f"{after['range_s'] * 1000:.1f} ms")
+
+    if os.path.isdir(input_path):
+        if output is None:
+            update_manifest(root, converted)
+        elif os.path.exists(os.path.join(root, MANIFEST_NAME)):
+            # Копия манифеста с размерами и хэшами новых файлов
+            shutil.copy(os.path.join(root, MANIFEST_NAME), os.path.join(output, MANIFEST_NAME))
+            update_manifest(output, converted)
+    return rows
+
+
+def summarize(rows):
+    """Суммарный выигрыш по всем файлам"""
+    total = {side: {key: sum(row[side][key] for row in rows) for key in ("bytes", "full_s", "range_s")}
+             for side in ("before", "after")}
+    ratio = lambda key: total["before"][key] / total["after"][key] if total["after"][key] else None
+    return {**total, "files": len(rows), "rows": sum(row["rows"] for row in rows),
+            "size_ratio": ratio("bytes"), "full_scan_speedup": ratio("full_s"),
+            "range_scan_speedup": ratio("range_s")}
+
+
+def main():
+    """Основная функция выполнения скрипта"""
+    args = parse_args()
+    rows = convert(args.input, args.output, args.kind, args.compression, args.row_group_size)
+    summary = summarize(rows)
+    print(f"Итого {summary['files']} файлов: размер {summary['before']['bytes'] / 1024 ** 2:.2f} -> "
+          f"{summary['after']['bytes'] / 1024 ** 2:.2f} MiB (x{summary['size_ratio'] or 0:.2f}), "
+          f"полное чтение x{summary['full_scan_speedup'] or 0:.2f}, "
+          f"выборка 1% x{summary['range_scan_speedup'] or 0:.2f}")
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump({"compression": args.compression, "row_group_size": args.row_group_size,
+                       "summary": summary, "files": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
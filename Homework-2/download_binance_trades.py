@@ -1,107 +1,341 @@
 import argparse
+import asyncio
+import hashlib
+import json
 import os
-import requests
+import random
 import zipfile
-import pandas as pd
-from concurrent.futures import ThreadPoolExecutor
+import aiohttp
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
 from datetime import datetime, timedelta
 from urllib.parse import urljoin
 
+from storage_profile import COMPRESSIONS, DEFAULT_COMPRESSION, compact_file
+
 BASE_URL = "https://data.binance.vision/data/spot/daily/trades/"
+MAX_RETRIES = 5
+BACKOFF_SECONDS = 1.0
+CHUNK_SIZE = 1 << 16
+RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+MANIFEST_NAME = "manifest.json"
+DOWNLOAD_DIR = "_downloads"  # 下载中的压缩包 / Архивы в процессе загрузки (вне секций)
+MANIFEST_VERSION = 1
+CSV_BLOCK_SIZE = 16 << 20  # размер пакета при потоковом чтении CSV
+
+TRADE_SCHEMA = pa.schema([
+    ("trade_id", pa.int64()),
+    ("price", pa.float64()),
+    ("quantity", pa.float64()),
+    ("quote_qty", pa.float64()),
+    ("timestamp", pa.int64()),
+    ("is_buyer_maker", pa.bool_()),
+    ("is_best_match", pa.bool_()),
+])
 
 
-def download_file(symbol, date, output_dir):
+class ChecksumError(Exception):
     """
-    下载指定日期和交易对的交易数据
-    Скачать торговые данные за указанную дату и торговую пару
+    下载的文件与 .CHECKSUM 不一致
+    Скачанный файл не совпадает с .CHECKSUM
     """
-    date_str = date.strftime("%Y-%m-%d")
-    filename = f"{symbol.upper()}-trades-{date_str}.zip"
-    url = urljoin(BASE_URL, f"{symbol.upper()}/{filename}")
 
-    try:
-        response = requests.get(url, stream=True)
+
+def sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+async def fetch_checksum(session, url):
+    """
+    读取 .CHECKSUM 文件（格式: "<sha256>  <filename>"）
+    Прочитать файл .CHECKSUM (формат: "<sha256>  <filename>")
+    """
+    async with session.get(url + ".CHECKSUM") as response:
         response.raise_for_status()
+        return (await response.text()).split()[0].lower()
+
+
+async def fetch_file(session, url, part_path):
+    """
+    下载到 .part 文件；如果已有部分内容，则用 HTTP Range 续传
+    Скачать в файл .part; если часть уже есть, докачать через HTTP Range
+    """
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
 
-        # 保存压缩文件
-        # Сохранить архивный файл
-        zip_path = os.path.join(output_dir, filename)
-        with open(zip_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
+    async with session.get(url, headers=headers) as response:
+        if response.status == 416:
+            # 文件已经完整下载
+            # Файл уже скачан полностью
+            return
+        response.raise_for_status()
+        # 服务器不支持 Range 时返回 200，需要从头开始
+        # Если сервер не поддерживает Range, он вернет 200 и качать нужно заново
+        mode = 'ab' if response.status == 206 else 'wb'
+        with open(part_path, mode) as f:
+            async for chunk in response.content.iter_chunked(CHUNK_SIZE):
                 f.write(chunk)
 
-        # 解压并读取CSV
-        # Распаковать и прочитать CSV
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            # 假设压缩包内只有一个CSV文件
-            # Предполагается, что в архиве только один CSV-файл
-            csv_filename = zip_ref.namelist()[0]
-            zip_ref.extractall(output_dir)
-            csv_path = os.path.join(output_dir, csv_filename)
-
-        # 转换为parquet
-        # Конвертировать в parquet
-        df = pd.read_csv(csv_path, header=None,
-                         names=['trade_id', 'price', 'quantity', 'quote_qty',
-                                'timestamp', 'is_buyer_maker', 'is_best_match'])
-
-        parquet_path = os.path.join(output_dir, f"{symbol}-trades-{date_str}.parquet")
-        df.to_parquet(parquet_path)
-
-        # 清理临时文件
-        # Очистить временные файлы
-        os.remove(zip_path)
-        os.remove(csv_path)
-
-        print(f"Successfully downloaded and processed {filename}")
-        # Успешно скачано и обработано {filename}
-        return True
-    except Exception as e:
-        print(f"Failed to download {filename}: {str(e)}")
-        # Не удалось скачать {filename}: {str(e)}
+
+async def download_archive(session, url, zip_path, retries=MAX_RETRIES):
+    """
+    带指数退避重试、续传和校验和验证的下载；返回压缩包的 sha256，
+    当天数据不存在时返回 None
+    Скачивание с повторами (экспоненциальная задержка), докачкой и проверкой
+    контрольной суммы; возвращает sha256 архива или None, если данных за день нет
+    """
+    part_path = zip_path + ".part"
+    expected = None
+
+    for attempt in range(retries + 1):
+        try:
+            expected = expected or await fetch_checksum(session, url)
+            await fetch_file(session, url, part_path)
+            actual = await asyncio.to_thread(sha256_file, part_path)
+            if actual != expected:
+                os.remove(part_path)
+                raise ChecksumError(f"checksum mismatch: expected {expected}, got {actual}")
+            os.replace(part_path, zip_path)
+            return actual
+        except aiohttp.ClientResponseError as e:
+            if e.status not in RETRY_STATUSES:
+                if e.status == 404:
+                    return None
+                raise
+            error = e
+        except (aiohttp.ClientError, asyncio.TimeoutError, ChecksumError) as e:
+            error = e
+
+        if attempt == retries:
+            raise error
+        delay = BACKOFF_SECONDS * 2 ** attempt * (1 + random.random())
+        print(f"Retrying {os.path.basename(zip_path)} in {delay:.1f}s: {error!r}")
+        # Повтор {filename} через {delay} с
+        await asyncio.sleep(delay)
+
+
+def convert_to_parquet(zip_path, parquet_path, compression=DEFAULT_COMPRESSION):
+    """
+    直接从压缩包中流式读取 CSV，按批次写入 parquet 行组，不在磁盘上解压 CSV，
+    然后按存储配置（storage_profile）重写为紧凑格式
+    Потоково читать CSV прямо из архива и записывать пакеты как группы строк parquet,
+    не распаковывая CSV на диск, затем переписать файл в профиле хранения (storage_profile)
+    """
+    tmp_path = parquet_path + ".raw.tmp"
+    rows = 0
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        # 假设压缩包内只有一个CSV文件
+        # Предполагается, что в архиве только один CSV-файл
+        with zip_ref.open(zip_ref.namelist()[0]) as stream:
+            reader = pa_csv.open_csv(
+                stream,
+                read_options=pa_csv.ReadOptions(column_names=TRADE_SCHEMA.names,
+                                                block_size=CSV_BLOCK_SIZE),
+                convert_options=pa_csv.ConvertOptions(column_types=TRADE_SCHEMA))
+            # 每个批次写成一个行组，内存占用与当天数据量无关
+            # Каждый пакет записывается отдельной группой строк, поэтому память
+            # не зависит от объема данных за день
+            with pq.ParquetWriter(tmp_path, TRADE_SCHEMA) as writer:
+                for batch in reader:
+                    writer.write_batch(batch)
+                    rows += batch.num_rows
+
+    # 第二遍按行组流式读取：选择无损的紧凑类型、时间类型、统计信息和压缩编码
+    # Второй проход по группам строк: компактные типы без потерь, тип времени,
+    # статистика и кодек сжатия
+    try:
+        compact_file(tmp_path, parquet_path, "trades", compression)
+    finally:
+        os.remove(tmp_path)
+    os.remove(zip_path)
+    return rows
+
+
+def partition_path(output_dir, symbol, date_str):
+    """
+    分区布局: <output_dir>/symbol=<SYMBOL>/date=<YYYY-MM-DD>/trades.parquet
+    Секционированная структура: <output_dir>/symbol=<SYMBOL>/date=<YYYY-MM-DD>/trades.parquet
+    """
+    return os.path.join(output_dir, f"symbol={symbol.upper()}", f"date={date_str}",
+                        "trades.parquet")
+
+
+def load_manifest(path):
+    if not os.path.exists(path):
+        return {"version": MANIFEST_VERSION, "symbols": {}}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def save_manifest(path, manifest):
+    # 先写临时文件再替换，中断时不会损坏清单
+    # Запись через временный файл, чтобы прерывание не повредило манифест
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def is_day_complete(manifest, output_dir, symbol, date_str, verify=False):
+    """
+    清单中有记录且文件存在、大小一致（verify 时还要校验 sha256）
+    Запись есть в манифесте, файл существует и совпадает по размеру
+    (при verify дополнительно сверяется sha256)
+    """
+    entry = manifest["symbols"].get(symbol.upper(), {}).get(date_str)
+    if entry is None:
         return False
+    path = os.path.join(output_dir, entry["path"])
+    if not os.path.exists(path) or os.path.getsize(path) != entry["bytes"]:
+        return False
+    return not verify or sha256_file(path) == entry["sha256"]
+
+
+async def download_file(session, semaphore, symbol, date, output_dir,
+                        base_url=BASE_URL, retries=MAX_RETRIES, compression=DEFAULT_COMPRESSION):
+    """
+    下载指定日期和交易对的交易数据，返回清单记录（失败时返回 None）
+    Скачать торговые данные за указанную дату и торговую пару;
+    возвращает запись манифеста (None при неудаче)
+    """
+    date_str = date.strftime("%Y-%m-%d")
+    filename = f"{symbol.upper()}-trades-{date_str}.zip"
+    url = urljoin(base_url, f"{symbol.upper()}/{filename}")
+    parquet_path = partition_path(output_dir, symbol, date_str)
+    # 压缩包放在分区之外：没有数据的日期不会留下空的分区目录
+    # Архив хранится вне секций: дни без данных не оставляют пустых директорий секций
+    zip_path = os.path.join(output_dir, DOWNLOAD_DIR, filename)
+    partition_dir = os.path.dirname(parquet_path)
+
+    # 信号量同时限制下载和转换的并发数，从而限制内存占用
+    # Семафор ограничивает одновременно и загрузки, и конвертацию (а значит, и память)
+    async with semaphore:
+        try:
+            os.makedirs(os.path.dirname(zip_path), exist_ok=True)
+            archive_sha256 = await download_archive(session, url, zip_path, retries)
+            if archive_sha256 is None:
+                print(f"No data for {filename}")
+                # Нет данных для {filename}
+                return None
+            # 分区目录只在下载成功后、写入 parquet 之前创建
+            # Директория секции создается только после успешной загрузки, перед записью parquet
+            os.makedirs(partition_dir, exist_ok=True)
+            rows = await asyncio.to_thread(convert_to_parquet, zip_path, parquet_path, compression)
+            parquet_sha256 = await asyncio.to_thread(sha256_file, parquet_path)
+        except Exception as e:
+            print(f"Failed to download {filename}: {str(e)}")
+            # Не удалось скачать {filename}: {str(e)}
+            if os.path.isdir(partition_dir) and not os.listdir(partition_dir):
+                os.rmdir(partition_dir)
+            return None
+
+    print(f"Successfully downloaded and processed {filename}")
+    # Успешно скачано и обработано {filename}
+    return {
+        "path": os.path.relpath(parquet_path, output_dir),
+        "rows": rows,
+        "bytes": os.path.getsize(parquet_path),
+        "sha256": parquet_sha256,
+        "archive_sha256": archive_sha256,
+        "completed_at": datetime.now().isoformat(timespec="seconds"),
+    }
+
+
+async def download_all(days, concurrency, output_dir, base_url, retries, manifest, manifest_path,
+                       compression=DEFAULT_COMPRESSION):
+    async def sync_day(symbol, date):
+        entry = await download_file(session, semaphore, symbol, date, output_dir, base_url, retries,
+                                    compression)
+        if entry is None:
+            return False
+        # 每完成一天就更新清单，中断后下次只补缺失的日期
+        # Манифест обновляется после каждого дня, поэтому после прерывания
+        # докачиваются только недостающие дни
+        manifest["symbols"].setdefault(symbol.upper(), {})[date.strftime("%Y-%m-%d")] = entry
+        save_manifest(manifest_path, manifest)
+        return True
+
+    # 共享连接池的 HTTP 客户端
+    # HTTP-клиент с общим пулом соединений
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=60)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        semaphore = asyncio.Semaphore(concurrency)
+        return await asyncio.gather(*(sync_day(symbol, date) for symbol, date in days))
 
 
-def download_trades(symbol, start_date, num_threads, output_dir="data"):
+def download_trades(symbols, start_date, concurrency, output_dir="data", base_url=BASE_URL,
+                    retries=MAX_RETRIES, end_date=None, verify=False, force=False,
+                    compression=DEFAULT_COMPRESSION):
     """
-    下载从指定日期开始的交易数据
-    Скачать торговые данные, начиная с указанной даты
+    同步从指定日期开始的交易数据：只下载清单中缺失或损坏的日期
+    Синхронизировать торговые данные, начиная с указанной даты:
+    скачиваются только отсутствующие в манифесте или поврежденные дни
     """
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
-    current_date = start_date
-    today = datetime.now().date()
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    manifest = load_manifest(manifest_path)
+    end_date = end_date or datetime.now().date()
+    dates = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
 
-    with ThreadPoolExecutor(max_workers=num_threads) as executor:
-        futures = []
-        while current_date <= today:
-            futures.append(executor.submit(download_file, symbol, current_date, output_dir))
-            current_date += timedelta(days=1)
+    days = [(symbol, date) for symbol in symbols for date in dates
+            if force or not is_day_complete(manifest, output_dir, symbol,
+                                            date.strftime("%Y-%m-%d"), verify)]
+    print(f"{len(days)} of {len(symbols) * len(dates)} symbol-days need to be downloaded")
+    # {len(days)} из {len(symbols) * len(dates)} дней требуют загрузки
 
-        # 等待所有任务完成
-        # Дождаться завершения всех задач
-        results = [f.result() for f in futures]
+    results = asyncio.run(download_all(days, concurrency, output_dir, base_url, retries,
+                                       manifest, manifest_path, compression))
 
-    print(f"Download completed for {symbol}. Success: {sum(results)}/{len(results)}")
-    # Загрузка завершена для {symbol}. Успешно: {sum(results)}/{len(results)}
+    print(f"Download completed for {', '.join(symbols)}. Success: {sum(results)}/{len(results)}")
+    # Загрузка завершена для {symbols}. Успешно: {sum(results)}/{len(results)}
 
 
 def main():
     parser = argparse.ArgumentParser(description="Download Binance trade data")
     # Загрузить торговые данные Binance
-    parser.add_argument("symbol", help="Trading pair symbol (e.g. btcusdt)")
-    # Символ торговой пары (например, btcusdt)
-    parser.add_argument("--threads", type=int, default=4, help="Number of download threads")
-    # Количество потоков загрузки
+    parser.add_argument("symbols", nargs="+", help="Trading pair symbols (e.g. btcusdt ethusdt)")
+    # Символы торговых пар (например, btcusdt ethusdt)
+    parser.add_argument("--concurrency", "--threads", dest="concurrency", type=int, default=4,
+                        help="Number of concurrent downloads")
+    # Количество одновременных загрузок
     parser.add_argument("--start-date", default="2025-01-01",
                         help="Start date in YYYY-MM-DD format")
     # Дата начала в формате ГГГГ-ММ-ДД
+    parser.add_argument("--end-date", help="End date in YYYY-MM-DD format (default: today)")
+    # Дата окончания в формате ГГГГ-ММ-ДД (по умолчанию: сегодня)
+    parser.add_argument("--verify", action="store_true",
+                        help="Re-hash existing files and re-download corrupt days")
+    # Пересчитать хэши существующих файлов и перекачать поврежденные дни
+    parser.add_argument("--force", action="store_true",
+                        help="Download all days even if they are in the manifest")
+    # Скачать все дни, даже если они есть в манифесте
+    parser.add_argument("--output-dir", default="data", help="Output directory")
+    # Выходная директория
+    parser.add_argument("--base-url", default=BASE_URL,
+                        help="Base URL of the data mirror (e.g. a local test server)")
+    # Базовый URL зеркала данных (например, локального тестового сервера)
+    parser.add_argument("--retries", type=int, default=MAX_RETRIES,
+                        help="Number of retries per file")
+    # Количество повторов для каждого файла
+    parser.add_argument("--compression", choices=COMPRESSIONS, default=DEFAULT_COMPRESSION,
+                        help=f"Parquet compression codec (default: {DEFAULT_COMPRESSION})")
+    # Кодек сжатия parquet
 
     args = parser.parse_args()
 
     start_date = datetime.strptime(args.start_date, "%Y-%m-%d").date()
-    download_trades(args.symbol, start_date, args.threads)
+    end_date = datetime.strptime(args.end_date, "%Y-%m-%d").date() if args.end_date else None
+    base_url = args.base_url if args.base_url.endswith("/") else args.base_url + "/"
+    download_trades(args.symbols, start_date, args.concurrency, args.output_dir,
+                    base_url, args.retries, end_date, args.verify, args.force, args.compression)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,234 @@
+"""
+Генератор синтетических сделок в формате Binance для тестов и бенчмарков без сети.
+
+Сделки за день:
+- моменты сделок - неоднородный пуассоновский поток: поминутная интенсивность
+  меняется как AR(1) в логарифме с суточной сезонностью, поверх нее - всплески
+  активности с экспоненциальным затуханием (много сделок в одну миллисекунду, как на бирже);
+- цена - случайное блуждание в логарифме с дневной волатильностью --volatility,
+  направление сделки сдвигает цену (покупки вверх, продажи вниз), цена округляется до шага --tick-size;
+- объем - логнормальный, округляется до шага --lot-size;
+- is_buyer_maker - продажа по рынку с вероятностью --maker-ratio, is_best_match всегда True.
+
+Форматы вывода:
+- zip - зеркало data.binance.vision: <dir>/<SYMBOL>/<SYMBOL>-trades-<дата>.zip с CSV без
+  заголовка и файлом .CHECKSUM рядом; его можно раздать локальным HTTP-сервером и скачать
+  download_binance_trades.py с --base-url;
+- parquet - то же, что выдает загрузчик: <dir>/symbol=<SYMBOL>/date=<дата>/trades.parquet
+  в профиле хранения (storage_profile).
+
+Детерминированность: при одинаковых аргументах командной строки (и одной версии numpy)
+файлы получаются байт в байт одинаковыми в обоих форматах; время записи в zip
+фиксировано началом дня. Случайные числа дня зависят только от (--seed, символ, дата),
+но цена закрытия и последний trade_id дня переходят на следующий день, поэтому тот же
+день с другой --start-date отличается ценами и trade_id, а параметры модели
+(--trades-per-day, --volatility и т. д.) меняют все сделки.
+"""
+import argparse
+import hashlib
+import io
+import os
+import zipfile
+import zlib
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+from download_binance_trades import TRADE_SCHEMA, partition_path
+from storage_profile import COMPRESSIONS, DEFAULT_COMPRESSION, compact_file
+
+FORMATS = ("zip", "parquet")
+DAY_SECONDS = 24 * 3600
+PRICE_TYPE = pa.decimal128(18, 8)  # В CSV Binance цены и объемы записаны с 8 знаками после запятой
+BURST_DECAY_SECONDS = 30  # Характерное время затухания всплеска активности
+BURST_KERNEL_SECONDS = 5 * BURST_DECAY_SECONDS
+
+
+def parse_args():
+    """Парсинг аргументов командной строки"""
+    parser = argparse.ArgumentParser(description="Генерация синтетических сделок в формате Binance")
+    parser.add_argument("symbols", nargs="+", help="Торговые пары (например, btcusdt ethusdt)")
+    parser.add_argument("--output-dir", type=str, required=True, help="Выходная директория")
+    parser.add_argument("--format", choices=FORMATS, default="zip",
+                        help="zip - зеркало Binance с .CHECKSUM, parquet - секции как у загрузчика "
+                             "(по умолчанию zip)")
+    parser.add_argument("--start-date", default="2025-01-01", help="Первый день (ГГГГ-ММ-ДД)")
+    parser.add_argument("--days", type=int, default=1, help="Число дней (по умолчанию 1)")
+    parser.add_argument("--trades-per-day", type=int, default=1_000_000,
+                        help="Среднее число сделок в день (по умолчанию 1000000)")
+    parser.add_argument("--seed", type=int, default=42, help="Зерно генератора (по умолчанию 42)")
+    parser.add_argument("--start-price", type=float, default=50000.0, help="Начальная цена")
+    parser.add_argument("--tick-size", type=float, default=0.01, help="Шаг цены (по умолчанию 0.01)")
+    parser.add_argument("--lot-size", type=float, default=0.00001, help="Шаг объема (по умолчанию 0.00001)")
+    parser.add_argument("--median-quantity", type=float, default=0.002,
+                        help="Медианный объем сделки (по умолчанию 0.002)")
+    parser.add_argument("--volatility", type=float, default=0.03,
+                        help="Дневная волатильность логарифма цены (по умолчанию 0.03)")
+    parser.add_argument("--maker-ratio", type=float, default=0.5,
+                        help="Доля сделок с is_buyer_maker=True (по умолчанию 0.5)")
+    parser.add_argument("--bursts-per-day", type=float, default=200,
+                        help="Среднее число всплесков активности в день (по умолчанию 200)")
+    parser.add_argument("--compression", choices=COMPRESSIONS, default=DEFAULT_COMPRESSION,
+                        help=f"Кодек сжатия parquet (по умолчанию {DEFAULT_COMPRESSION})")
+    return parser.parse_args()
+
+
+class TradeModel:
+    """Параметры модели сделок"""
+
+    def __init__(self, trades_per_day=1_000_000, tick_size=0.01, lot_size=0.00001, median_quantity=0.002,
+                 volatility=0.03, maker_ratio=0.5, bursts_per_day=200):
+        self.trades_per_day = trades_per_day
+        self.tick_size = tick_size
+        self.lot_size = lot_size
+        self.median_quantity = median_quantity
+        self.volatility = volatility
+        self.maker_ratio = maker_ratio
+        self.bursts_per_day = bursts_per_day
+
+
+def day_rng(seed, symbol, date):
+    """Генератор дня: зависит только от зерна, символа и даты"""
+    return np.random.default_rng([seed, zlib.crc32(symbol.upper().encode()), date.toordinal()])
+
+
+def intensity(rng, bursts_per_day):
+    """Относительная интенсивность сделок по секундам суток"""
+    # Поминутный логарифм интенсивности: AR(1) вокруг суточной сезонности
+    minutes = DAY_SECONDS // 60
+    noise = rng.normal(0.0, 0.15, minutes)
+    level = np.empty(minutes)
+    level[0] = noise[0]
+    for i in range(1, minutes):
+        level[i] = 0.98 * level[i - 1] + noise[i]
+    season = 0.5 * np.sin(2 * np.pi * (np.arange(minutes) / minutes - 0.375))  # максимум около 15:00 UTC
+    rate = np.repeat(np.exp(level + season), 60)
+
+    # Всплески: случайные моменты с логнормальной амплитудой, затухающие экспоненциально
+    spikes = np.zeros(DAY_SECONDS)
+    starts = rng.integers(0, DAY_SECONDS, rng.poisson(bursts_per_day))
+    np.add.at(spikes, starts, rng.lognormal(2.0, 1.0, len(starts)))
+    kernel = np.exp(-np.arange(BURST_KERNEL_SECONDS) / BURST_DECAY_SECONDS)
+    return rate + np.convolve(spikes, kernel)[:DAY_SECONDS]
+
+
+def generate_day(rng, date, model, first_id, open_price):
+    """
+    Сделки за день (таблица в схеме TRADE_SCHEMA, отсортирована по времени)
+    и цена закрытия для следующего дня
+    """
+    day_start_ms = int(datetime(date.year, date.month, date.day, tzinfo=timezone.utc).timestamp() * 1000)
+    count = rng.poisson(model.trades_per_day)
+
+    rate = intensity(rng, model.bursts_per_day)
+    per_second = rng.multinomial(count, rate / rate.sum())
+    # Внутри всплеска сделки теснее: миллисекунды сжимаются к началу секунды
+    millis = (rng.random(count) ** 2 * 1000).astype(np.int64)
+    timestamps = day_start_ms + np.repeat(np.arange(DAY_SECONDS, dtype=np.int64) * 1000, per_second)
+    timestamps = np.sort(timestamps + millis)
+
+    is_buyer_maker = rng.random(count) < model.maker_ratio
+    # Шаг цены: шум плюс сдвиг по направлению сделки (без общего дрейфа)
+    step = model.volatility / np.sqrt(max(count, 1))
+    pressure = np.where(is_buyer_maker, -1.0, 1.0) - (1 - 2 * model.maker_ratio)
+    log_price = np.log(open_price) + np.cumsum(step * (rng.standard_normal(count) + 0.3 * pressure))
+    price = np.maximum(np.round(np.exp(log_price) / model.tick_size), 1) * model.tick_size
+    quantity = np.maximum(np.round(rng.lognormal(np.log(model.median_quantity), 1.2, count) / model.lot_size),
+                          1) * model.lot_size
+
+    table = pa.table({
+        "trade_id": pa.array(np.arange(first_id, first_id + count, dtype=np.int64)),
+        "price": pa.array(np.round(price, 8)),
+        "quantity": pa.array(np.round(quantity, 8)),
+        "quote_qty": pa.array(np.round(price * quantity, 8)),
+        "timestamp": pa.array(timestamps),
+        "is_buyer_maker": pa.array(is_buyer_maker),
+        "is_best_match": pa.array(np.ones(count, dtype=bool)),
+    }, schema=TRADE_SCHEMA)
+    return table, float(price[-1]) if count else open_price
+
+
+def csv_bytes(table):
+    """CSV как у Binance: без заголовка, 8 знаков после запятой, True/False"""
+    columns = []
+    for name in TRADE_SCHEMA.names:
+        column = table.column(name)
+        if pa.types.is_floating(column.type):
+            column = pc.cast(column, PRICE_TYPE)
+        elif pa.types.is_boolean(column.type):
+            column = pc.if_else(column, "True", "False")
+        columns.append(column)
+    buffer = io.BytesIO()
+    pa_csv.write_csv(pa.table(columns, names=TRADE_SCHEMA.names), buffer,
+                     pa_csv.WriteOptions(include_header=False, quoting_style="none"))
+    return buffer.getvalue()
+
+
+def write_zip(table, output_dir, symbol, date_str):
+    """Архив дня и его .CHECKSUM в раскладке data.binance.vision"""
+    filename = f"{symbol.upper()}-trades-{date_str}"
+    directory = os.path.join(output_dir, symbol.upper())
+    os.makedirs(directory, exist_ok=True)
+    zip_path = os.path.join(directory, filename + ".zip")
+    # Время записи в архиве - начало дня, а не текущее: архив и .CHECKSUM воспроизводимы
+    entry = zipfile.ZipInfo(filename + ".csv", date_time=datetime.strptime(date_str, "%Y-%m-%d").timetuple()[:6])
+    entry.compress_type = zipfile.ZIP_DEFLATED
+    with zipfile.ZipFile(zip_path, "w") as archive:
+        archive.writestr(entry, csv_bytes(table))
+    with open(zip_path, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    with open(zip_path + ".CHECKSUM", "w") as f:
+        f.write(f"{digest}  {filename}.zip\n")
+    return zip_path
+
+
+def write_parquet(table, output_dir, symbol, date_str, compression=DEFAULT_COMPRESSION):
+    """Секция дня в профиле хранения, как после загрузчика"""
+    path = partition_path(output_dir, symbol, date_str)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".raw.tmp"
+    pq.write_table(table, tmp_path)
+    try:
+        compact_file(tmp_path, path, "trades", compression)
+    finally:
+        os.remove(tmp_path)
+    return path
+
+
+def generate_trades(symbols, start_date, days, output_dir, model, seed=42, start_price=50000.0,
+                    output_format="zip", compression=DEFAULT_COMPRESSION):
+    """Генерация сделок по символам и дням; возвращает число сделок"""
+    total = 0
+    for symbol in symbols:
+        trade_id, price = 1, start_price
+        for offset in range(days):
+            date = start_date + timedelta(days=offset)
+            date_str = date.strftime("%Y-%m-%d")
+            table, price = generate_day(day_rng(seed, symbol, date), date, model, trade_id, price)
+            trade_id += table.num_rows
+            total += table.num_rows
+            if output_format == "zip":
+                path = write_zip(table, output_dir, symbol, date_str)
+            else:
+                path = write_parquet(table, output_dir, symbol, date_str, compression)
+            print(f"{path}: {table.num_rows} сделок")
+    return total
+
+
+def main():
+    """Основная функция выполнения скрипта"""
+    args = parse_args()
+    model = TradeModel(args.trades_per_day, args.tick_size, args.lot_size, args.median_quantity,
+                       args.volatility, args.maker_ratio, args.bursts_per_day)
+    start_date = datetime.strptime(args.start_date, "%Y-%m-%d").date()
+    total = generate_trades(args.symbols, start_date, args.days, args.output_dir, model, args.seed,
+                            args.start_price, args.format, args.compression)
+    print(f"Всего сделок: {total}")
+
+
+if __name__ == "__main__":
+    main()
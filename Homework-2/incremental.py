@@ -0,0 +1,116 @@
+import json
+import os
+from datetime import datetime, timezone
+
+import polars as pl
+
+from storage_profile import DEFAULT_COMPRESSION, scan_file, write_frame
+
+STATE_FILE = "_state.json"  # Отметка "высокой воды" инкрементального режима
+PART_COLUMN = "_part"  # Служебная колонка: 0 - уже записанные строки, 1 - новые
+DAY_MS = 24 * 3600 * 1000
+
+
+def load_state(output_dir):
+    """Чтение состояния инкрементального режима (None, если результата еще нет)"""
+    path = os.path.join(output_dir, STATE_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def save_state(output_dir, state):
+    """Атомарная запись состояния через временный файл"""
+    path = os.path.join(output_dir, STATE_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def day_of(ms):
+    """Дата (UTC) для метки времени в миллисекундах"""
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc).strftime("%Y-%m-%d")
+
+
+def partition_file(output_dir, day):
+    """Путь дневной секции результата"""
+    return os.path.join(output_dir, f"date={day}.parquet")
+
+
+def write_partition(path, df, compression=DEFAULT_COMPRESSION):
+    """Атомарная перезапись одной секции в профиле хранения"""
+    write_frame(df, path, compression=compression)
+
+
+def update_incremental(scan, output_dir, interval_ms, aggregate, merge, sort_keys,
+                       compression=DEFAULT_COMPRESSION):
+    """
+    Инкрементальное обновление результата, секционированного по дням.
+
+    Обрабатываются только сделки с trade_id больше отметки из состояния. Строки
+    граничного интервала (последнего в уже записанных данных, вместе со служебными
+    колонками) хранятся в состоянии и объединяются с новыми строками функцией merge,
+    после чего перезаписываются только затронутые дневные секции.
+
+    scan(start_ms) лениво читает сделки начиная с start_ms (None - вся история),
+    aggregate(lf) строит строки результата из сделок, merge(lf) объединяет строки
+    с одинаковыми ключами (старые строки помечены PART_COLUMN = 0, новые - 1).
+    """
+    if DAY_MS % interval_ms:
+        raise ValueError("Для инкрементального режима интервал должен делить сутки без остатка")
+
+    os.makedirs(output_dir, exist_ok=True)
+    state = load_state(output_dir)
+    if state is None:
+        trades = scan(None)
+    elif state["interval_ms"] != interval_ms:
+        raise ValueError(f"Результат в {output_dir} построен для интервала {state['interval_ms']} мс")
+    else:
+        # Читаются только секции и группы строк начиная с граничного интервала
+        trades = scan(state["boundary_open_time"]).filter(
+            pl.col("trade_id") > state["last_trade_id"])
+
+    # Отметка "высокой воды" новых данных
+    marks = trades.select(pl.col("trade_id").max().alias("last_trade_id"),
+                          pl.col("timestamp").max().alias("last_timestamp")).collect()
+    if marks["last_trade_id"][0] is None:
+        print("Новых сделок нет")
+        return 0
+
+    new_rows = aggregate(trades).with_columns(pl.lit(1, pl.Int8).alias(PART_COLUMN))
+    schema = new_rows.collect_schema()
+    parts = [new_rows]
+
+    if state is not None:
+        # Граничный интервал берется из состояния, а не из секции: если прошлый запуск
+        # прервался после записи секций, повторный запуск даст тот же результат
+        old_rows = pl.LazyFrame(state["boundary_rows"],
+                                schema={name: schema[name] for name in state["boundary_rows"]})
+        parts.insert(0, old_rows.with_columns(pl.lit(0, pl.Int8).alias(PART_COLUMN)))
+
+    merged = (merge(pl.concat(parts, how="diagonal_relaxed"))
+              .with_columns((pl.col("open_time") // DAY_MS).alias("_day"))
+              .collect())
+
+    # Перезаписываются только дни, в которые попали новые строки;
+    # состояние сохраняется последним
+    internal = [c for c in merged.columns if c.startswith("_")]
+    for (day_index,), rows in merged.partition_by("_day", as_dict=True).items():
+        path = partition_file(output_dir, day_of(day_index * DAY_MS))
+        rows = rows.drop(internal)
+        if os.path.exists(path):
+            existing = scan_file(path).collect().filter(pl.col("open_time") < rows["open_time"].min())
+            rows = pl.concat([existing, rows], how="vertical_relaxed")
+        write_partition(path, rows.sort(sort_keys), compression)
+
+    last_open_time = merged["open_time"].max()
+    boundary_rows = merged.filter(pl.col("open_time") == last_open_time).drop(PART_COLUMN, "_day", strict=False)
+    save_state(output_dir, {
+        "interval_ms": interval_ms,
+        "last_trade_id": int(marks["last_trade_id"][0]),
+        "last_timestamp": int(marks["last_timestamp"][0]),
+        "boundary_open_time": int(last_open_time),
+        "boundary_rows": boundary_rows.to_dict(as_series=False),
+    })
+    return merged.height
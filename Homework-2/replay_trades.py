@@ -0,0 +1,137 @@
+import argparse
+import json
+import time
+
+import polars as pl
+import pyarrow.parquet as pq
+
+from trades_pipeline import list_parquet_files
+from storage_profile import normalize_arrow
+from stream_aggregator import StreamAggregator
+
+TRADE_COLUMNS = ["trade_id", "price", "quantity", "quote_qty", "timestamp", "is_buyer_maker"]
+READ_BATCH_ROWS = 64 * 1024  # строк в пакете чтения parquet (микропакеты нарезаются из него)
+# Схемы выходных файлов: заданы явно, чтобы и без закрытых баров записывался пустой файл
+CANDLE_SCHEMA = {"interval": pl.String, "open_time": pl.Int64, "open": pl.Float64, "high": pl.Float64,
+                 "low": pl.Float64, "close": pl.Float64, "random": pl.Float64, "volume": pl.Float64,
+                 "num_trades": pl.Int64}
+DISCRETE_SCHEMA = {"interval": pl.String, "open_time": pl.Int64, "side": pl.String, "vwap_price": pl.Float64,
+                   "total_quantity": pl.Float64, "total_quote_qty": pl.Float64, "num_trades": pl.Int64}
+
+
+def parse_args():
+    """Парсинг аргументов командной строки"""
+    parser = argparse.ArgumentParser(description="Воспроизведение сделок из parquet через потоковый агрегатор")
+    parser.add_argument("--input", type=str, required=True, help="Входная папка или parquet-файл")
+    parser.add_argument("--intervals", type=str, default="1s,1m",
+                        help="Интервалы через запятую (по умолчанию: 1s,1m)")
+    parser.add_argument("--speed", type=str, default="max",
+                        help="Скорость воспроизведения: max или множитель реального времени (1 - реальное время)")
+    parser.add_argument("--batch-size", type=int, default=1,
+                        help="Размер микропакета (1 - по одной сделке)")
+    parser.add_argument("--lateness-ms", type=int, default=0,
+                        help="Допустимое опоздание сделок в миллисекундах")
+    parser.add_argument("--limit", type=int, help="Обработать не более N сделок")
+    parser.add_argument("--output-candles", type=str, help="Сохранить закрытые свечи в parquet")
+    parser.add_argument("--output-discrete", type=str, help="Сохранить дискретные сделки в parquet")
+    return parser.parse_args()
+
+
+def iter_batches(input_path, batch_size):
+    """
+    Чтение сделок микропакетами в порядке файлов (секции по датам сортированы).
+    Parquet читается большими пакетами, которые приводятся к рабочим типам один раз
+    и нарезаются на микропакеты уже в виде списков Python
+    """
+    read_rows = max(batch_size, READ_BATCH_ROWS)
+    for path in list_parquet_files(input_path):
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=read_rows, columns=TRADE_COLUMNS):
+            # Файлы в профиле хранения приводятся к рабочим типам (float64, мс)
+            columns = normalize_arrow(batch).to_pydict()
+            for offset in range(0, len(columns["trade_id"]), batch_size):
+                yield {name: values[offset:offset + batch_size] for name, values in columns.items()}
+
+
+def percentile(sorted_values, q):
+    """Перцентиль по отсортированному списку"""
+    if not sorted_values:
+        return 0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def replay(input_path, intervals, speed="max", batch_size=1, lateness_ms=0, limit=None):
+    """
+    Воспроизведение сделок; возвращает (бары, метрики). Пропускная способность и
+    задержки считаются только по вызовам агрегатора, без чтения файлов и ожидания
+    """
+    aggregator = StreamAggregator(intervals, lateness_ms)
+    realtime = None if speed == "max" else float(speed)
+    latencies = []  # задержка обработки на одну сделку, нс
+    bars = []
+    processed = 0
+    first_event = None
+    aggregate_ns = 0  # время внутри агрегатора (add/add_batch/flush)
+    start = time.perf_counter()
+
+    for batch in iter_batches(input_path, batch_size):
+        if limit is not None and processed >= limit:
+            break
+        if limit is not None:
+            batch = {name: values[:limit - processed] for name, values in batch.items()}
+        size = len(batch["trade_id"])
+
+        if realtime:
+            # Ожидание момента, когда сделка "наступает" в масштабированном времени
+            event = batch["timestamp"][0]
+            first_event = event if first_event is None else first_event
+            delay = (event - first_event) / 1000 / realtime - (time.perf_counter() - start)
+            if delay > 0:
+                time.sleep(delay)
+
+        t0 = time.perf_counter_ns()
+        if size == 1:
+            bars.extend(aggregator.add(*(batch[name][0] for name in TRADE_COLUMNS)))
+        else:
+            bars.extend(aggregator.add_batch(batch))
+        spent = time.perf_counter_ns() - t0
+        aggregate_ns += spent
+        latencies.extend([spent / size] * size)
+        processed += size
+
+    t0 = time.perf_counter_ns()
+    bars.extend(aggregator.flush())
+    aggregate_ns += time.perf_counter_ns() - t0
+    elapsed = time.perf_counter() - start
+    aggregate_s = aggregate_ns / 1e9
+    latencies.sort()
+    metrics = {
+        "trades": processed,
+        "bars": len(bars),
+        "late_trades": aggregator.late_trades,
+        "elapsed_s": elapsed,  # полное время, включая чтение parquet и ожидание в режиме реального времени
+        "aggregate_s": aggregate_s,
+        "trades_per_s": processed / aggregate_s if aggregate_s else None,
+        "latency_ns": {"p50": percentile(latencies, 0.5), "p99": percentile(latencies, 0.99),
+                       "max": latencies[-1] if latencies else 0},
+    }
+    return bars, metrics
+
+
+def main():
+    """Основная функция выполнения скрипта"""
+    args = parse_args()
+    intervals = [i.strip() for i in args.intervals.split(",") if i.strip()]
+    bars, metrics = replay(args.input, intervals, args.speed, args.batch_size,
+                           args.lateness_ms, args.limit)
+
+    for path, kind, schema in ((args.output_candles, "candle", CANDLE_SCHEMA),
+                               (args.output_discrete, "discrete", DISCRETE_SCHEMA)):
+        if path:
+            rows = [{key: b[key] for key in schema} for b in bars if b["kind"] == kind]
+            pl.DataFrame(rows, schema=schema).write_parquet(path)
+
+    print(json.dumps(metrics, indent=2))
+
+
+if __name__ == "__main__":
+    main()
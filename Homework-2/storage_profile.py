@@ -0,0 +1,370 @@
+"""
+Профиль хранения parquet-файлов сделок, свечей и дискретных сделок.
+
+- десятичные колонки (цены, объемы) хранятся как parquet DECIMAL(p, k) - целые числа
+  INT32/INT64 с масштабом 10^k - или float32, если это не теряет ни одного значения;
+  иначе остаются float64;
+- время (timestamp, open_time) - тип timestamp[ms, UTC] или timestamp[us, UTC]: единица
+  сохраняется без потерь и для целого времени определяется по величине значений (сделки
+  Binance spot с 2025 года - в микросекундах, раньше - в миллисекундах);
+- сторона сделки дискретных сделок - словарная (категориальная) колонка,
+  is_buyer_maker/is_best_match - boolean;
+- строки отсортированы по времени, группы строк по ROW_GROUP_SIZE, статистика колонок
+  и индекс страниц включены, кодек сжатия настраивается;
+- целые, время и DECIMAL кодируются DELTA_BINARY_PACKED (соседние значения близки),
+  float - BYTE_STREAM_SPLIT там, где это уменьшает файл (цены сделок и свечей), словарь -
+  только для категориальных колонок.
+
+Функции чтения (scan_file, normalize_frame, normalize_arrow) приводят данные обратно
+к типам, с которыми работают построители: float64 и int64 миллисекунд (из любой единицы
+хранения), поэтому старые файлы без профиля и новые файлы читаются одинаково. Преобразование DECIMAL -> float64
+в polars точное (в отличие от деления на 10^k), поэтому приведение идет через polars.
+"""
+import json
+import os
+
+import numpy as np
+import polars as pl
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+PROFILE_KEY = b"storage_profile"
+PROFILE_VERSION = 1
+COMPRESSIONS = ("zstd", "snappy", "lz4", "gzip", "brotli", "none")
+DEFAULT_COMPRESSION = "zstd"
+ROW_GROUP_SIZE = 256 * 1024  # строк в группе: чем меньше, тем точнее отсечение по статистике
+MAX_SCALE = 8  # Binance публикует не более 8 знаков после запятой
+# Целое время Unix больше 10^14 - микросекунды, больше 10^17 - наносекунды
+# (в миллисекундах 10^14 - это 5138 год)
+US_THRESHOLD = 10 ** 14
+NS_THRESHOLD = 10 ** 17
+TIME_UNITS = ("s", "ms", "us", "ns")
+MS_FACTORS = {"ms": 1, "us": 1000, "ns": 1_000_000}  # Делитель до миллисекунд
+
+PROFILES = {
+    "trades": {
+        "sort": ["timestamp", "trade_id"],
+        "time": ["timestamp"],
+        "decimal": ["price", "quantity", "quote_qty"],
+        "category": [],
+        "byte_stream_split": True,
+    },
+    "candles": {
+        "sort": ["open_time"],
+        "time": ["open_time"],
+        "decimal": ["open", "high", "low", "close", "random", "volume"],
+        "category": [],
+        "byte_stream_split": True,
+    },
+    "discrete": {
+        "sort": ["open_time", "side"],
+        "time": ["open_time"],
+        "decimal": ["vwap_price", "total_quantity", "total_quote_qty"],
+        "category": ["side"],
+        "byte_stream_split": False,  # VWAP и суммы по сторонам сжимаются хуже
+    },
+}
+
+
+def detect_kind(names):
+    """Тип данных файла по набору колонок"""
+    if "trade_id" in names:
+        return "trades"
+    if "side" in names:
+        return "discrete"
+    if "open" in names:
+        return "candles"
+    raise ValueError(f"Неизвестный набор колонок: {', '.join(names)}")
+
+
+TIME_COLUMNS = {column for profile in PROFILES.values() for column in profile["time"]}
+
+
+def time_unit(value):
+    """Единица целого времени Unix по его величине"""
+    if value >= NS_THRESHOLD:
+        return "ns"
+    return "us" if value >= US_THRESHOLD else "ms"
+
+
+def to_epoch_ms(value, unit=None):
+    """Целое время в миллисекундах; unit - единица колонки timestamp, без нее - по величине значения"""
+    return value // MS_FACTORS[unit or time_unit(value)]
+
+
+def epoch_ms_expr(expr):
+    """Выражение polars: целое время в миллисекундах, единица каждого значения - по его величине"""
+    return pl.when(expr >= NS_THRESHOLD).then(expr // MS_FACTORS["ns"]) \
+        .when(expr >= US_THRESHOLD).then(expr // MS_FACTORS["us"]).otherwise(expr)
+
+
+def profile_metadata(schema):
+    """Метаданные профиля из схемы arrow ({} для файлов без профиля)"""
+    raw = (schema.metadata or {}).get(PROFILE_KEY)
+    return json.loads(raw) if raw else {}
+
+
+def scale_exact(values, scale):
+    """Все значения восстанавливаются из целых чисел с масштабом 10^scale без потерь"""
+    factor = 10.0 ** scale
+    scaled = np.round(values * factor)
+    return bool(np.all(np.abs(scaled) < 2 ** 53) and np.array_equal(scaled / factor, values))
+
+
+class DecimalEncoder:
+    """Выбор компактного типа десятичной колонки по всем пакетам файла"""
+
+    def __init__(self):
+        self.scale = 0  # минимальный масштаб, при котором все значения точны (None - такого нет)
+        self.float32 = True
+        self.max_abs = 0.0
+        self.rows = 0
+
+    def update(self, array):
+        values = pc.fill_null(array, 0.0).to_numpy(zero_copy_only=False).astype(np.float64)
+        if not len(values):
+            return
+        self.rows += len(values)
+        if self.float32 and not np.array_equal(values.astype(np.float32).astype(np.float64), values):
+            self.float32 = False
+        while self.scale is not None and not scale_exact(values, self.scale):
+            self.scale = self.scale + 1 if self.scale < MAX_SCALE else None
+        self.max_abs = max(self.max_abs, float(np.abs(values).max()))
+
+    def storage_type(self):
+        """Тип хранения: DECIMAL(9, k) (INT32) -> float32 -> DECIMAL(18, k) (INT64) -> float64"""
+        if not self.rows:
+            return pa.float64()
+        if self.scale is not None and self.max_abs * 10 ** self.scale < 10 ** 9:
+            return pa.decimal128(9, self.scale)
+        if self.float32:
+            return pa.float32()
+        if self.scale is not None:
+            return pa.decimal128(18, self.scale)
+        return pa.float64()
+
+
+class TimeEncoder:
+    """Единица хранения колонки времени: самая мелкая из встреченных, но не крупнее ms"""
+
+    def __init__(self):
+        self.unit = "ms"
+
+    def update(self, array):
+        if pa.types.is_timestamp(array.type):
+            unit = array.type.unit
+        else:
+            top = pc.max(array).as_py()
+            unit = time_unit(top) if top is not None else "ms"
+        self.unit = max(self.unit, unit, key=TIME_UNITS.index)
+
+    def storage_type(self):
+        return pa.timestamp(self.unit, tz="UTC")
+
+
+def to_timestamp(column, storage_type):
+    """Колонка времени в типе хранения; единица целых значений пакета - по их величине"""
+    if not pa.types.is_timestamp(column.type):
+        top = pc.max(column).as_py()
+        column = column.cast(pa.int64()).cast(pa.timestamp(time_unit(top) if top is not None else "ms", tz="UTC"))
+    return column.cast(storage_type)
+
+
+def to_decimal(column, storage_type):
+    """Массив DECIMAL из float64: целые значения с масштабом собираются напрямую в буфер"""
+    column = column.combine_chunks() if isinstance(column, pa.ChunkedArray) else column
+    values = pc.fill_null(column, 0.0).to_numpy(zero_copy_only=False)
+    unscaled = np.round(values * 10.0 ** storage_type.scale).astype(np.int64)
+    # decimal128 - 16 байт little-endian: младшее слово и расширение знака
+    words = np.empty((len(unscaled), 2), dtype=np.int64)
+    words[:, 0] = unscaled
+    words[:, 1] = unscaled >> 63
+    array = pa.Array.from_buffers(storage_type, len(unscaled), [None, pa.py_buffer(words.tobytes())])
+    if column.null_count:
+        array = pc.if_else(pc.is_valid(column), array, pa.scalar(None, storage_type))
+    return array
+
+
+def normalize_frame(lf, keep_time=False):
+    """
+    Приведение LazyFrame/DataFrame polars из профиля хранения к рабочим типам.
+    keep_time - не трогать колонки времени (при перезаписи файла единица сохраняется)
+    """
+    exprs = []
+    for name, dtype in lf.collect_schema().items():
+        if isinstance(dtype, pl.Decimal) or dtype == pl.Float32:
+            exprs.append(pl.col(name).cast(pl.Float64))
+        elif isinstance(dtype, pl.Datetime) and not keep_time:
+            exprs.append(pl.col(name).dt.epoch("ms"))
+        elif name in TIME_COLUMNS and dtype.is_integer() and not keep_time:
+            # Файлы без профиля: целое время может быть в микросекундах
+            exprs.append(epoch_ms_expr(pl.col(name)).alias(name))
+        elif isinstance(dtype, (pl.Categorical, pl.Enum)):
+            exprs.append(pl.col(name).cast(pl.String))
+    return lf.with_columns(exprs) if exprs else lf
+
+
+def normalize_arrow(data, keep_time=False) -> pa.Table:
+    """Приведение пакета/таблицы arrow из профиля хранения к рабочим типам"""
+    if not any(pa.types.is_decimal(f.type) or pa.types.is_float32(f.type) or pa.types.is_timestamp(f.type)
+               or pa.types.is_dictionary(f.type) or (f.name in TIME_COLUMNS and pa.types.is_integer(f.type))
+               for f in data.schema):
+        return data if isinstance(data, pa.Table) else pa.Table.from_batches([data])
+    return normalize_frame(pl.from_arrow(data), keep_time).to_arrow(compat_level=pl.CompatLevel.oldest())
+
+
+def scan_file(path, start_ms=None, end_ms=None, time_column="timestamp") -> pl.LazyFrame:
+    """
+    Ленивое чтение одного файла с приведением к рабочим типам. Фильтр по времени
+    накладывается до приведения, в типе хранения, чтобы он проталкивался в сканирование
+    и отсекал группы строк и страницы по статистике
+    """
+    lf = pl.scan_parquet(path, hive_partitioning=False)
+    if start_ms is not None or end_ms is not None:
+        dtype = lf.collect_schema()[time_column]
+        if isinstance(dtype, pl.Datetime):
+            column = pl.col(time_column)
+
+            def bound(ms):
+                return pl.lit(ms * MS_FACTORS[dtype.time_unit]).cast(dtype)
+        else:
+            # Целое время без профиля: единица неизвестна до чтения, сравнение в миллисекундах
+            column = epoch_ms_expr(pl.col(time_column))
+
+            def bound(ms):
+                return ms
+        if start_ms is not None:
+            lf = lf.filter(column >= bound(start_ms))
+        if end_ms is not None:
+            lf = lf.filter(column < bound(end_ms))
+    return normalize_frame(lf)
+
+
+def is_sorted_batch(batch, keys, previous):
+    """Отсортирован ли пакет по ключам и не меньше ли его первая строка предыдущей"""
+    indices = pc.sort_indices(batch, [(key, "ascending") for key in keys])
+    if not np.array_equal(indices.to_numpy(), np.arange(batch.num_rows)):
+        return False
+    first = tuple(batch.column(key)[0].as_py() for key in keys)
+    return previous is None or first >= previous
+
+
+def encode(table, kind, encoders):
+    """Приведение нормализованной таблицы к типам профиля хранения"""
+    profile = PROFILES[kind]
+    arrays = []
+    for name, column in zip(table.schema.names, table.columns):
+        if name in profile["time"]:
+            column = to_timestamp(column, encoders[name].storage_type())
+        elif name in encoders:
+            storage_type = encoders[name].storage_type()
+            column = to_decimal(column, storage_type) if pa.types.is_decimal(storage_type) \
+                else column.cast(storage_type)
+        elif name in profile["category"]:
+            column = pc.dictionary_encode(column)
+        arrays.append(column)
+    return pa.Table.from_arrays(arrays, names=table.schema.names)
+
+
+def column_encodings(schema, profile):
+    """Параметры кодирования колонок для ParquetWriter"""
+    delta = [f.name for f in schema
+             if pa.types.is_integer(f.type) or pa.types.is_timestamp(f.type) or pa.types.is_decimal(f.type)]
+    floats = [f.name for f in schema if pa.types.is_floating(f.type)]
+    return {
+        "use_dictionary": [name for name in profile["category"] if name in schema.names] or False,
+        "column_encoding": {name: "DELTA_BINARY_PACKED" for name in delta},
+        "use_byte_stream_split": (profile["byte_stream_split"] and floats) or False,
+    }
+
+
+def compact_file(src, dst, kind=None, compression=DEFAULT_COMPRESSION, row_group_size=ROW_GROUP_SIZE):
+    """
+    Перезапись parquet-файла в профиле хранения (src может совпадать с dst).
+
+    Первый проход по группам строк выбирает типы десятичных колонок и проверяет
+    сортировку, второй - пишет файл. Отсортированные данные (например, сделки Binance)
+    обрабатываются потоково; неотсортированные сортируются в памяти.
+    """
+    source = pq.ParquetFile(src)
+    kind = kind or detect_kind(source.schema_arrow.names)
+    profile = PROFILES[kind]
+
+    def batches():
+        for batch in source.iter_batches(batch_size=row_group_size):
+            yield normalize_arrow(batch, keep_time=True)
+
+    names = source.schema_arrow.names
+    encoders = {name: DecimalEncoder() for name in profile["decimal"] if name in names}
+    encoders.update({name: TimeEncoder() for name in profile["time"] if name in names})
+    is_sorted, previous = True, None
+    for table in batches():
+        for name, encoder in encoders.items():
+            encoder.update(table.column(name))
+        if is_sorted and table.num_rows:
+            is_sorted = is_sorted_batch(table, profile["sort"], previous)
+            previous = tuple(table.column(key)[-1].as_py() for key in profile["sort"])
+
+    if is_sorted:
+        tables = batches()
+    else:
+        table = normalize_arrow(source.read(), keep_time=True)
+        tables = [table.sort_by([(key, "ascending") for key in profile["sort"]])]
+
+    metadata = {PROFILE_KEY: json.dumps({"version": PROFILE_VERSION, "kind": kind})}
+    tmp_path = dst + ".tmp"
+    rows = 0
+    writer = None
+    try:
+        for table in tables:
+            table = encode(table, kind, encoders)
+            if writer is None:
+                schema = table.schema.with_metadata(metadata)
+                writer = pq.ParquetWriter(
+                    tmp_path, schema, compression=None if compression == "none" else compression,
+                    store_decimal_as_integer=True, write_statistics=True, write_page_index=True,
+                    **column_encodings(schema, profile))
+            writer.write_table(table.replace_schema_metadata(metadata), row_group_size=row_group_size)
+            rows += table.num_rows
+        if writer is None:
+            # Пустой файл: только схема
+            empty = encode(normalize_arrow(source.schema_arrow.empty_table(), keep_time=True), kind, encoders)
+            writer = pq.ParquetWriter(tmp_path, empty.schema.with_metadata(metadata))
+    finally:
+        if writer is not None:
+            writer.close()
+    os.replace(tmp_path, dst)
+    return {"kind": kind, "rows": rows, "sorted": is_sorted,
+            "types": {name: str(encoder.storage_type()) for name, encoder in encoders.items()}}
+
+
+def write_frames(outputs, compression=DEFAULT_COMPRESSION):
+    """
+    Запись результатов построителей в профиле хранения. outputs - список
+    (DataFrame или LazyFrame, путь, тип данных); ленивые планы выполняются одним
+    collect_all, поэтому их общая часть (например, сканирование сделок) считается один раз
+    """
+    plain_paths = [path + ".plain.tmp" for _, path, _ in outputs]
+    try:
+        sinks = []
+        for (frame, path, _), plain_path in zip(outputs, plain_paths):
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            if isinstance(frame, pl.LazyFrame):
+                sinks.append(frame.sink_parquet(plain_path, lazy=True))
+            else:
+                frame.write_parquet(plain_path)
+        if sinks:
+            pl.collect_all(sinks)
+        for (_, path, kind), plain_path in zip(outputs, plain_paths):
+            compact_file(plain_path, path, kind, compression)
+    finally:
+        for plain_path in plain_paths:
+            if os.path.exists(plain_path):
+                os.remove(plain_path)
+
+
+def write_frame(frame, path, kind=None, compression=DEFAULT_COMPRESSION):
+    """Запись одного результата построителя (DataFrame или LazyFrame) в профиле хранения"""
+    write_frames([(frame, path, kind)], compression)
@@ -0,0 +1,149 @@
+"""
+Потоковая агрегация сделок в свечи и дискретные сделки.
+
+Сделки подаются по одной (add) или микропакетами (add_batch); закрытые интервалы
+возвращаются сразу, как только водяной знак (максимальное время события минус
+допустимое опоздание) проходит конец интервала. Семантика совпадает с
+build_candlesticks/build_discrete_trades: открытие и закрытие - по минимальному
+и максимальному trade_id, VWAP - с весами по объему, сторона sell для is_buyer_maker,
+random - цена сделки с минимальным хэшем trade_id (тот же хэш trade_hash, что и в пакетном пути).
+"""
+import heapq
+
+from trades_pipeline import RANDOM_SEED, interval_to_ms, trade_hash
+
+
+class CandleState:
+    """Компактное состояние одной открытой свечи"""
+    __slots__ = ("open_id", "open", "high", "low", "close_id", "close",
+                 "random_key", "random", "volume", "num_trades")
+
+    def __init__(self, trade_id, price, quantity, key):
+        self.open_id = self.close_id = trade_id
+        self.open = self.high = self.low = self.close = self.random = price
+        self.random_key = key
+        self.volume = quantity
+        self.num_trades = 1
+
+    def update(self, trade_id, price, quantity, key):
+        if trade_id < self.open_id:
+            self.open_id, self.open = trade_id, price
+        if trade_id > self.close_id:
+            self.close_id, self.close = trade_id, price
+        if price > self.high:
+            self.high = price
+        if price < self.low:
+            self.low = price
+        if key < self.random_key:
+            self.random_key, self.random = key, price
+        self.volume += quantity
+        self.num_trades += 1
+
+
+class SideState:
+    """Компактное состояние одной стороны (buy/sell) открытого интервала"""
+    __slots__ = ("price_quantity", "quantity", "quote_qty", "num_trades")
+
+    def __init__(self):
+        self.price_quantity = 0.0
+        self.quantity = 0.0
+        self.quote_qty = 0.0
+        self.num_trades = 0
+
+
+class StreamAggregator:
+    """Агрегатор сделок для нескольких интервалов одновременно"""
+
+    def __init__(self, intervals, allowed_lateness_ms=0, seed=RANDOM_SEED):
+        self.intervals = [(interval, interval_to_ms(interval)) for interval in intervals]
+        self.allowed_lateness_ms = allowed_lateness_ms
+        self.seed = seed
+        self.watermark = None
+        self.late_trades = 0
+        self._candles = {interval: {} for interval, _ in self.intervals}
+        self._sides = {interval: {} for interval, _ in self.intervals}
+        # Куча времен открытия открытых интервалов и граница уже закрытых интервалов
+        self._open_times = {interval: [] for interval, _ in self.intervals}
+        self._closed_before = {interval: None for interval, _ in self.intervals}
+
+    def add(self, trade_id, price, quantity, quote_qty, timestamp, is_buyer_maker):
+        """Добавить одну сделку; возвращает список закрытых баров"""
+        key = trade_hash(trade_id, self.seed)
+        side = "sell" if is_buyer_maker else "buy"
+        late = False
+
+        for interval, interval_ms in self.intervals:
+            open_time = timestamp // interval_ms * interval_ms
+            closed_before = self._closed_before[interval]
+            if closed_before is not None and open_time < closed_before:
+                # Интервал уже закрыт: опоздавшая сделка отбрасывается
+                late = True
+                continue
+
+            candles = self._candles[interval]
+            candle = candles.get(open_time)
+            if candle is None:
+                candles[open_time] = CandleState(trade_id, price, quantity, key)
+                heapq.heappush(self._open_times[interval], open_time)
+            else:
+                candle.update(trade_id, price, quantity, key)
+
+            sides = self._sides[interval]
+            state = sides.get((open_time, side))
+            if state is None:
+                state = sides[(open_time, side)] = SideState()
+            state.price_quantity += price * quantity
+            state.quantity += quantity
+            state.quote_qty += quote_qty
+            state.num_trades += 1
+        if late:
+            # Сделка считается один раз, даже если опоздала для нескольких интервалов
+            self.late_trades += 1
+
+        watermark = timestamp - self.allowed_lateness_ms
+        if self.watermark is None or watermark > self.watermark:
+            self.watermark = watermark
+            return self._emit(watermark)
+        return []
+
+    def add_batch(self, batch):
+        """Добавить микропакет (pyarrow.RecordBatch/Table или dict колонок)"""
+        if not isinstance(batch, dict):
+            batch = batch.to_pydict()
+        emitted = []
+        for row in zip(batch["trade_id"], batch["price"], batch["quantity"], batch["quote_qty"],
+                       batch["timestamp"], batch["is_buyer_maker"]):
+            emitted.extend(self.add(*row))
+        return emitted
+
+    def flush(self):
+        """Закрыть все открытые интервалы (конец потока)"""
+        return self._emit(None)
+
+    def _emit(self, watermark):
+        emitted = []
+        for interval, interval_ms in self.intervals:
+            open_times = self._open_times[interval]
+            while open_times and (watermark is None or open_times[0] + interval_ms <= watermark):
+                open_time = heapq.heappop(open_times)
+                emitted.extend(self._close(interval, open_time))
+                self._closed_before[interval] = open_time + interval_ms
+        return emitted
+
+    def _close(self, interval, open_time):
+        candle = self._candles[interval].pop(open_time)
+        bars = [{
+            "kind": "candle", "interval": interval, "open_time": open_time,
+            "open": candle.open, "high": candle.high, "low": candle.low, "close": candle.close,
+            "random": candle.random, "volume": candle.volume, "num_trades": candle.num_trades,
+        }]
+        for side in ("buy", "sell"):
+            state = self._sides[interval].pop((open_time, side), None)
+            if state is not None:
+                bars.append({
+                    "kind": "discrete", "interval": interval, "open_time": open_time, "side": side,
+                    "vwap_price": state.price_quantity / state.quantity if state.quantity else None,
+                    "total_quantity": state.quantity, "total_quote_qty": state.quote_qty,
+                    "num_trades": state.num_trades,
+                })
+        return bars
@@ -0,0 +1,105 @@
+"""
+Общая часть построителей: разбор интервалов и диапазонов, поиск parquet-файлов
+сделок и ленивое сканирование с вычислением колонки open_time.
+"""
+import glob
+import os
+import re
+from datetime import datetime, timedelta, timezone
+
+import polars as pl
+
+from storage_profile import scan_file
+
+INTERVAL_UNITS = {"ms": 1, "s": 1000, "m": 60 * 1000, "h": 3600 * 1000, "d": 24 * 3600 * 1000}
+RANDOM_SEED = 42  # Зерно хэша для детерминированного выбора "случайной" сделки
+MASK64 = (1 << 64) - 1
+# Константы splitmix64
+SPLITMIX_GAMMA = 0x9E3779B97F4A7C15
+SPLITMIX_MUL1 = 0xBF58476D1CE4E5B9
+SPLITMIX_MUL2 = 0x94D049BB133111EB
+
+
+def trade_hash(trade_id, seed=RANDOM_SEED):
+    """Детерминированный 64-битный хэш trade_id (splitmix64) для выбора случайной сделки"""
+    z = (trade_id + seed * SPLITMIX_GAMMA) & MASK64
+    z = ((z ^ (z >> 30)) * SPLITMIX_MUL1) & MASK64
+    z = ((z ^ (z >> 27)) * SPLITMIX_MUL2) & MASK64
+    return z ^ (z >> 31)
+
+
+def trade_hash_expr(column="trade_id", seed=RANDOM_SEED):
+    """
+    Тот же хэш, что trade_hash, в виде выражения polars (арифметика UInt64 по модулю 2^64,
+    сдвиг вправо - целочисленное деление): пакетный и потоковый построители выбирают
+    одну и ту же случайную сделку
+    """
+    def u64(value):
+        return pl.lit(value, dtype=pl.UInt64)
+
+    z = pl.col(column).cast(pl.UInt64) + u64(seed * SPLITMIX_GAMMA & MASK64)
+    z = z.xor(z // u64(1 << 30)) * u64(SPLITMIX_MUL1)
+    z = z.xor(z // u64(1 << 27)) * u64(SPLITMIX_MUL2)
+    return z.xor(z // u64(1 << 31))
+
+
+def parse_datetime_ms(value):
+    """Конвертация даты/времени ISO (UTC) в миллисекунды Unix"""
+    dt = datetime.fromisoformat(value)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp() * 1000)
+
+
+def interval_to_ms(interval):
+    """Конвертация строкового интервала (число + ms/s/m/h/d) в миллисекунды"""
+    match = re.fullmatch(r"(\d+)(ms|s|m|h|d)", interval)
+    if not match or int(match.group(1)) == 0:
+        raise ValueError(f"Некорректный интервал: {interval}")
+    return int(match.group(1)) * INTERVAL_UNITS[match.group(2)]
+
+
+def file_overlaps(path, start_ms=None, end_ms=None):
+    """Проверка по секции date=ГГГГ-ММ-ДД в пути, пересекается ли файл с диапазоном"""
+    match = re.search(r"date=(\d{4}-\d{2}-\d{2})", path)
+    if not match:
+        return True
+    day_start = datetime.fromisoformat(match.group(1)).replace(tzinfo=timezone.utc)
+    day_start_ms = int(day_start.timestamp() * 1000)
+    day_end_ms = int((day_start + timedelta(days=1)).timestamp() * 1000)
+    return ((start_ms is None or day_end_ms > start_ms)
+            and (end_ms is None or day_start_ms < end_ms))
+
+
+def list_parquet_files(input_path, start_ms=None, end_ms=None):
+    """Список parquet-файлов по пути с отсечением дневных секций вне диапазона"""
+    if os.path.isdir(input_path):
+        # Если путь - директория, рекурсивно ищем все parquet-файлы в ней
+        # (включая секционированную структуру symbol=.../date=...)
+        files = sorted(glob.glob(os.path.join(input_path, "**", "*.parquet"), recursive=True))
+        if not files:
+            raise ValueError(f"В директории {input_path} не найдено parquet-файлов")
+        # Файлы дневных секций вне диапазона не открываются вовсе
+        files = [f for f in files if file_overlaps(f, start_ms, end_ms)]
+        if not files:
+            raise ValueError("Нет parquet-файлов, пересекающихся с заданным диапазоном")
+        return files
+    elif os.path.isfile(input_path) and input_path.endswith(".parquet"):
+        # Если путь указывает на конкретный файл
+        return [input_path]
+    else:
+        raise ValueError("Входной путь должен быть директорией или parquet-файлом")
+
+
+def scan_trades(input_path, start_ms=None, end_ms=None) -> pl.LazyFrame:
+    """Ленивое чтение parquet-файлов с отсечением по диапазону времени"""
+    files = list_parquet_files(input_path, start_ms, end_ms)
+    # Каждый файл приводится к рабочим типам отдельно (файлы в профиле хранения могут
+    # отличаться типами колонок); фильтры по времени проталкиваются в сканирование
+    # и отсекают группы строк по статистике
+    return pl.concat([scan_file(path, start_ms, end_ms) for path in files])
+
+
+def with_open_time(df, interval_ms: int) -> pl.LazyFrame:
+    """Добавление колонки open_time - начала интервала, в который попадает сделка"""
+    return df.lazy().with_columns((pl.col("timestamp") // interval_ms * interval_ms).alias("open_time"))
@@ -0,0 +1,108 @@
+# Сравнение бэкендов wiki_analyze.py: время запуска, пропускная способность и совпадение результатов
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+BACKENDS = ("local", "spark")
+
+
+def parse_args():
+    """Парсинг аргументов командной строки"""
+    parser = argparse.ArgumentParser(description="Сравнение бэкендов local и spark на одном файле")
+    parser.add_argument("--input", type=str, default="wiki.txt", help="Файл со статьями (по умолчанию wiki.txt)")
+    parser.add_argument("--backends", type=str, default=",".join(BACKENDS),
+                        help="Бэкенды через запятую (по умолчанию local,spark)")
+    parser.add_argument("--workers", type=int, help="Число процессов бэкенда local (по умолчанию число ядер)")
+    parser.add_argument("--shuffle-partitions", type=int, default=200,
+                        help="spark.sql.shuffle.partitions (по умолчанию 200)")
+    parser.add_argument("--executor-memory", type=str, default="4g", help="spark.executor.memory (по умолчанию 4g)")
+    parser.add_argument("--report", type=str, help="Сохранить отчет в JSON")
+    return parser.parse_args()
+
+
+def bench_local(path, workers):
+    """
+    Запуск бэкенда local: время запуска - прогон на пустом файле (старт и остановка
+    процессов), затем полный прогон
+    """
+    from wiki_local import analyze
+
+    with tempfile.NamedTemporaryFile("w", suffix=".txt") as empty:
+        begin = time.perf_counter()
+        analyze(empty.name, workers)
+        startup = time.perf_counter() - begin
+
+    begin = time.perf_counter()
+    results = analyze(path, workers)
+    return [{"backend": "local", "startup_s": startup, "run_s": time.perf_counter() - begin}], results
+
+
+def bench_spark(path, shuffle_partitions, executor_memory):
+    """
+    Запуск бэкенда spark: время запуска - импорт pyspark и создание сессии; затем
+    прогон с разбором текста и повторный прогон по parquet-кэшу разобранных статей
+    """
+    begin = time.perf_counter()
+    from wiki_spark import analyze, create_session
+    spark = create_session(shuffle_partitions, executor_memory)
+    startup = time.perf_counter() - begin
+
+    parsed_dir = tempfile.mkdtemp(prefix="wiki_parsed_")
+    parsed_path = os.path.join(parsed_dir, "wiki_parsed.parquet")
+    rows = []
+    try:
+        for name in ("spark", "spark (parquet cache)"):
+            begin = time.perf_counter()
+            results = analyze(spark, path, parsed_path)
+            rows.append({"backend": name, "startup_s": startup, "run_s": time.perf_counter() - begin})
+    finally:
+        spark.stop()
+        shutil.rmtree(parsed_dir, ignore_errors=True)
+    return rows, results
+
+
+def main():
+    """Основная функция выполнения скрипта"""
+    args = parse_args()
+    size = os.path.getsize(args.input)
+    rows = []
+    results = {}
+    for backend in args.backends.split(","):
+        if backend == "local":
+            backend_rows, results[backend] = bench_local(args.input, args.workers)
+        elif backend == "spark":
+            try:
+                backend_rows, results[backend] = bench_spark(args.input, args.shuffle_partitions,
+                                                             args.executor_memory)
+            except ImportError as e:
+                print(f"spark: пропущен ({e})")
+                continue
+        else:
+            raise ValueError(f"Неизвестный бэкенд: {backend}")
+        for row in backend_rows:
+            row["mb_per_s"] = size / 1024 ** 2 / row["run_s"] if row["run_s"] else None
+            row["articles_per_s"] = results[backend]["articles"] / row["run_s"] if row["run_s"] else None
+        rows.extend(backend_rows)
+
+    print(f"{args.input}: {size / 1024 ** 2:.1f} MiB")
+    print(f"{'backend':<24}{'startup, s':>12}{'run, s':>10}{'MiB/s':>10}{'articles/s':>12}")
+    for row in rows:
+        print(f"{row['backend']:<24}{row['startup_s']:>12.2f}{row['run_s']:>10.2f}"
+              f"{row['mb_per_s'] or 0:>10.1f}{row['articles_per_s'] or 0:>12.0f}")
+
+    identical = None
+    if len(results) > 1:
+        first, *others = results.values()
+        identical = all(other == first for other in others)
+        print("Результаты совпадают" if identical else "Результаты различаются!")
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump({"input": args.input, "bytes": size, "rows": rows, "identical": identical,
+                       "results": results}, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+# Генератор синтетического корпуса в формате wiki.txt для тестов и бенчмарков без дампа Википедии
+import argparse
+import re
+from urllib.parse import quote
+
+import numpy as np
+
+from wiki_text import FIRST_NAMES_PATH, SURNAMES_PATH, load_dictionary
+
+SIZE_UNITS = {"": 1, "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}
+URL_PREFIX = "https://ru.wikipedia.org/wiki/"
+
+# Слоги псевдорусских слов и служебные слова (самые частые в любом тексте)
+CONSONANTS = "бвгджзклмнпрстфхцчшщ"
+VOWELS = "аеёиоуыэюя"
+FUNCTION_WORDS = ("и", "в", "на", "не", "что", "с", "по", "из", "для", "как", "а", "к", "от", "его",
+                  "был", "это", "о", "году", "также", "при", "до", "за", "после", "или", "он", "она")
+LATIN_WORDS = ("the", "of", "and", "in", "to", "New", "York", "USA", "BBC", "NASA", "University",
+               "Press", "John", "London", "World", "Records", "International", "Football", "Club", "II")
+ABBREVIATIONS = ("др.", "пр.", "т.", "д.", "г.", "гг.", "им.", "см.", "ул.", "р.", "т.е.", "т.к.")
+
+# Доли особых токенов среди всех токенов текста
+SHARES = {"names": 0.015, "pairs": 0.003, "proper": 0.03, "latin": 0.01, "abbrev": 0.006, "years": 0.006}
+PROPER_SHARE = 0.05  # Доля имен собственных (всегда с заглавной буквы) в словаре
+ZIPF_EXPONENT = 1.07  # Частоты слов: закон Ципфа-Мандельброта 1 / (ранг + 2.7)^s
+SENTENCE_WORDS = 14  # Средняя длина предложения в токенах
+COMMA_PROB = 0.08
+
+
+def parse_size(value):
+    """Размер с необязательным суффиксом K, M или G (например, 200M)"""
+    match = re.fullmatch(r"\s*(\d+(?:\.\d*)?)\s*([kmg]?)b?\s*", value.lower())
+    if not match:
+        raise argparse.ArgumentTypeError(f"Некорректный размер: {value}")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2)])
+
+
+def parse_args():
+    """Парсинг аргументов командной строки"""
+    parser = argparse.ArgumentParser(description="Генерация синтетического корпуса в формате wiki.txt")
+    parser.add_argument("--output", type=str, default="wiki.txt", help="Выходной файл (по умолчанию wiki.txt)")
+    parser.add_argument("--size", type=parse_size, default=parse_size("100M"),
+                        help="Размер корпуса в байтах, допускаются суффиксы K, M, G (по умолчанию 100M)")
+    parser.add_argument("--seed", type=int, default=42, help="Зерно генератора (по умолчанию 42)")
+    parser.add_argument("--vocabulary", type=int, default=200_000,
+                        help="Число различных русских слов (по умолчанию 200000)")
+    parser.add_argument("--article-words", type=int, default=400,
+                        help="Средняя длина статьи в токенах (по умолчанию 400)")
+    return parser.parse_args()
+
+
+def make_words(rng, count):
+    """
+    Словарь различных псевдорусских слов из слогов СГ/СГС по убыванию частоты:
+    частые слова короче, некоторые редкие - составные через дефис (как "северо-западный")
+    """
+    syllables = [c + v + coda for c in CONSONANTS for v in VOWELS for coda in ("",) + tuple(CONSONANTS)]
+    words = dict.fromkeys(FUNCTION_WORDS)
+    while len(words) < count:
+        batch = count - len(words) + 1000
+        ranks = len(words) + np.arange(batch)
+        lengths = 1 + np.minimum(rng.poisson(np.log2(ranks + 2) / 5), 6)
+        # Слог: согласная, гласная и с вероятностью 0.3 - согласная в конце
+        onsets = rng.integers(len(CONSONANTS) * len(VOWELS), size=lengths.sum())
+        codas = np.where(rng.random(len(onsets)) < 0.3, rng.integers(1, len(CONSONANTS) + 1, len(onsets)), 0)
+        parts = np.array(syllables, dtype=object)[onsets * (len(CONSONANTS) + 1) + codas].tolist()
+        ends = np.cumsum(lengths).tolist()
+        batch_words = ["".join(parts[end - length:end]) for end, length in zip(ends, lengths.tolist())]
+        compound = (ranks > 1000) & (rng.random(batch) < 0.01)
+        for i in np.flatnonzero(compound):
+            batch_words[i] += "-" + batch_words[(i + 1) % batch]
+        words.update(dict.fromkeys(batch_words))
+    return list(words)[:count]
+
+
+def zipf_weights(count):
+    return 1.0 / (np.arange(count) + 2.7) ** ZIPF_EXPONENT
+
+
+class Vocabulary:
+    """
+    Токены корпуса с вероятностями и формами: каждая форма - токен с заглавной буквы
+    или без, с запятой, точкой или в кавычках. Особые токены (имена, латиница, сокращения,
+    годы) пишутся одинаково во всех формах, кроме точки и запятой
+    """
+
+    SUFFIXES = ("", ",", ".", "»")  # "»" - токен в кавычках «...»
+
+    def __init__(self, rng, size):
+        words = make_words(rng, size)
+        proper = rng.random(len(words)) < PROPER_SHARE
+        proper[:len(FUNCTION_WORDS)] = False
+        proper_words = [word.capitalize() for word, flag in zip(words, proper) if flag]
+        common_words = [word for word, flag in zip(words, proper) if not flag]
+
+        first_names = sorted(load_dictionary(FIRST_NAMES_PATH))
+        surnames = sorted(load_dictionary(SURNAMES_PATH))
+        pair_count = min(2000, len(first_names) * len(surnames))
+        pairs = [f"{first_names[i]} {surnames[j]}" for i, j in zip(
+            rng.integers(len(first_names), size=pair_count), rng.integers(len(surnames), size=pair_count))]
+        groups = {
+            "names": first_names + surnames,
+            "pairs": pairs,
+            "proper": proper_words,
+            "latin": list(LATIN_WORDS),
+            "abbrev": list(ABBREVIATIONS),
+            "years": [str(year) for year in range(1800, 2025)],
+        }
+
+        tokens, weights, fixed = list(common_words), [zipf_weights(len(common_words))], [False] * len(common_words)
+        weights[0] *= (1.0 - sum(SHARES.values())) / weights[0].sum()
+        for name, group in groups.items():
+            group_weights = zipf_weights(len(group))
+            rng.shuffle(group_weights)
+            weights.append(group_weights * SHARES[name] / group_weights.sum())
+            tokens.extend(group)
+            fixed.extend([name != "proper"] * len(group))
+        self.cdf = np.cumsum(np.concatenate(weights))
+
+        # Формы: индекс = токен * 8 + (с заглавной) * 4 + суффикс
+        forms = []
+        for token, is_fixed in zip(tokens, fixed):
+            for capital in (False, True):
+                base = token.capitalize() if capital and not is_fixed else token
+                for suffix in self.SUFFIXES:
+                    if suffix == "»":
+                        forms.append(base if is_fixed else f"«{base}»")
+                    elif is_fixed and token.endswith("."):
+                        forms.append(base)  # Сокращение уже заканчивается точкой
+                    else:
+                        forms.append(base + suffix)
+        self.forms = np.array(forms, dtype=object)
+
+    def sample(self, rng, count):
+        """Текст из count токенов: предложения с заглавной буквы, запятые и кавычки"""
+        ids = np.searchsorted(self.cdf, rng.random(count) * self.cdf[-1])
+        # После служебных слов не бывает ни точки, ни запятой
+        punctuated = ids >= len(FUNCTION_WORDS)
+        end = (rng.random(count) < 1.0 / SENTENCE_WORDS) & punctuated
+        end[-1] = True
+        start = np.roll(end, 1)
+        suffix = np.where(end, 2, np.where((rng.random(count) < COMMA_PROB) & punctuated, 1, 0))
+        suffix[(suffix == 0) & (rng.random(count) < 0.005)] = 3
+        return self.forms[ids * 8 + start * 4 + suffix]
+
+
+def article(rng, vocabulary, number, article_words):
+    """Статья: строка-заголовок URL<TAB>заголовок<TAB>первый абзац и строки остальных абзацев"""
+    title_words = vocabulary.sample(rng, 1 + int(rng.integers(3)))
+    title = " ".join(word.strip(",.«»").capitalize() for word in title_words)
+    words = max(int(rng.lognormal(np.log(article_words), 0.8)), 1)
+    paragraphs = np.array_split(vocabulary.sample(rng, words), 1 + int(rng.poisson(words / 120)))
+    lines = [" ".join(paragraph) for paragraph in paragraphs if len(paragraph)]
+    url = URL_PREFIX + quote(f"{title.replace(' ', '_')}_{number}")
+    return f"{url}\t{title}\t" + "\n".join(lines) + "\n"
+
+
+def generate_wiki(path, size, seed=42, vocabulary_size=200_000, article_words=400):
+    """Запись статей в path, пока размер файла не достигнет size байт; возвращает число статей"""
+    rng = np.random.default_rng(seed)
+    vocabulary = Vocabulary(rng, vocabulary_size)
+    written = articles = 0
+    with open(path, "wb") as f:
+        while written < size:
+            data = article(rng, vocabulary, articles, article_words).encode("utf-8")
+            f.write(data)
+            written += len(data)
+            articles += 1
+    return articles
+
+
+def main():
+    """Основная функция выполнения скрипта"""
+    args = parse_args()
+    articles = generate_wiki(args.output, args.size, args.seed, args.vocabulary, args.article_words)
+    print(f"{args.output}: {articles} статей")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+# Мергируемые скетчи для приближенного режима: Count-Min, Space-Saving и HyperLogLog.
+# Скетчи строятся независимо по разделам (или процессам) и объединяются через merge(),
+# поэтому вместо словаря всех слов передаются структуры фиксированного размера
+import hashlib
+import heapq
+import math
+import operator
+from array import array
+
+from wiki_text import ABBREV_MIN_COUNT, NAME_MIN_COUNT, TOP_N, UPPERCASE_MIN_COUNT
+
+TOPK_CAPACITY = 1000  # Счетчиков в Space-Saving
+CMS_WIDTH = 1 << 15  # Ширина Count-Min: ошибка не больше e / ширина * N
+CMS_DEPTH = 5  # Число строк Count-Min: вероятность превысить ошибку e^-глубина
+HLL_PRECISION = 14  # 2^14 регистров HyperLogLog: относительная ошибка около 0.8%
+
+
+def hash64(key):
+    """Стабильный 64-битный хэш строки (одинаковый во всех процессах, в отличие от hash())"""
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class SpaceSaving:
+    """
+    Space-Saving: не больше capacity счетчиков. Новый ключ при заполненной сводке
+    вытесняет ключ с минимальным счетчиком и получает его значение как ошибку.
+    Для любого ключа count - error <= истинное число <= count; для ключа вне сводки
+    истинное число не больше минимального счетчика
+    """
+
+    def __init__(self, capacity=TOPK_CAPACITY):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self.heap = []  # (счетчик на момент добавления в кучу, ключ) - по одной записи на ключ
+        self.total = 0
+
+    def add(self, key, count=1):
+        self.total += count
+        counts = self.counts
+        if key in counts:
+            counts[key] += count
+        elif len(counts) < self.capacity:
+            counts[key] = count
+            self.errors[key] = 0
+            heapq.heappush(self.heap, (count, key))
+        else:
+            minimum, victim = self._pop_min()
+            del counts[victim], self.errors[victim]
+            counts[key] = minimum + count
+            self.errors[key] = minimum
+            heapq.heappush(self.heap, (minimum + count, key))
+
+    def _pop_min(self):
+        """
+        Ключ с минимальным счетчиком. Записи кучи не обновляются при увеличении
+        счетчика; устаревшая запись возвращается в кучу с актуальным значением
+        """
+        heap = self.heap
+        while True:
+            value, key = heap[0]
+            current = self.counts[key]
+            if current == value:
+                heapq.heappop(heap)
+                return value, key
+            heapq.heapreplace(heap, (current, key))
+
+    def min_count(self):
+        """Минимальный счетчик заполненной сводки (0, пока сводка не заполнена)"""
+        if len(self.counts) < self.capacity:
+            return 0
+        value, key = self._pop_min()
+        heapq.heappush(self.heap, (value, key))
+        return value
+
+    def merge(self, other):
+        """
+        Объединение сводок: ключ, которого нет в заполненной сводке, мог встретиться в
+        ее потоке не больше минимального счетчика раз - это значение добавляется и к
+        счетчику, и к ошибке. Остаются capacity наибольших счетчиков
+        """
+        self_min, other_min = self.min_count(), other.min_count()
+        merged = []
+        for key in self.counts.keys() | other.counts.keys():
+            count = self.counts.get(key, self_min) + other.counts.get(key, other_min)
+            error = self.errors.get(key, self_min) + other.errors.get(key, other_min)
+            merged.append((count, key, error))
+        merged = heapq.nlargest(self.capacity, merged)
+        self.counts = {key: count for count, key, _ in merged}
+        self.errors = {key: error for _, key, error in merged}
+        self.heap = [(count, key) for count, key, _ in merged]
+        heapq.heapify(self.heap)
+        self.total += other.total
+        return self
+
+    def top(self, n=None):
+        """Ключи по убыванию счетчика (при равенстве - по алфавиту): (ключ, count, error)"""
+        rows = sorted(self.counts.items(), key=lambda item: (-item[1], item[0]))
+        return [(key, count, self.errors[key]) for key, count in rows[:n]]
+
+
+class CountMinSketch:
+    """
+    Count-Min: depth строк по width счетчиков. Оценка не меньше истинного числа и
+    с вероятностью 1 - e^-depth превышает его не больше чем на e / width * N
+    """
+
+    def __init__(self, width=CMS_WIDTH, depth=CMS_DEPTH):
+        self.width = width
+        self.depth = depth
+        self.table = array("q", bytes(8 * width * depth))  # Строки подряд
+        self.total = 0
+
+    def _cells(self, hashed):
+        # Двойное хэширование: индексы строк из двух половин 64-битного хэша
+        low, high = hashed & 0xFFFFFFFF, (hashed >> 32) | 1
+        return [row * self.width + (low + row * high) % self.width for row in range(self.depth)]
+
+    def add_hash(self, hashed, count=1):
+        self.total += count
+        table = self.table
+        for cell in self._cells(hashed):
+            table[cell] += count
+
+    def add(self, key, count=1):
+        self.add_hash(hash64(key), count)
+
+    def estimate(self, key):
+        return min(self.table[cell] for cell in self._cells(hash64(key)))
+
+    def merge(self, other):
+        if (self.width, self.depth) != (other.width, other.depth):
+            raise ValueError("Нельзя объединить Count-Min разного размера")
+        self.table = array("q", map(operator.add, self.table, other.table))
+        self.total += other.total
+        return self
+
+    @property
+    def epsilon(self):
+        return math.e / self.width
+
+    @property
+    def delta(self):
+        return math.exp(-self.depth)
+
+
+class HyperLogLog:
+    """HyperLogLog: оценка числа различных ключей по 2^precision регистрам"""
+
+    def __init__(self, precision=HLL_PRECISION):
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def add_hash(self, hashed):
+        bits = 64 - self.precision
+        index = hashed >> bits
+        # Позиция старшей единицы в оставшихся битах (bits + 1, если они нулевые)
+        rank = bits - (hashed & ((1 << bits) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def add(self, key):
+        self.add_hash(hash64(key))
+
+    def merge(self, other):
+        if self.precision != other.precision:
+            raise ValueError("Нельзя объединить HyperLogLog разной точности")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Малые значения: линейный подсчет по пустым регистрам
+            estimate = m * math.log(m / zeros)
+        return estimate
+
+    @property
+    def relative_error(self):
+        """Стандартная относительная ошибка оценки"""
+        return 1.04 / math.sqrt(len(self.registers))
+
+
+class TokenSketches:
+    """
+    Приближенные агрегаты задач 3-5 и 7 с тем же интерфейсом, что и точные счетчики
+    локального бэкенда: Space-Saving для частых слов, сокращений и имен, Count-Min для
+    числа вхождений с заглавной буквы, HyperLogLog для числа различных слов
+    """
+
+    def __init__(self, capacity=TOPK_CAPACITY):
+        self.latin_top = SpaceSaving(capacity)
+        self.russian_top = SpaceSaving(capacity)  # Русские слова в нижнем регистре
+        self.uppercase = CountMinSketch()  # ... из них написанные с заглавной буквы
+        self.abbrev_top = SpaceSaving(capacity)
+        self.names_top = SpaceSaving(capacity)
+        self.latin_distinct = HyperLogLog()
+        self.russian_distinct = HyperLogLog()
+
+    # count - число вхождений ключа (больше 1, если токены уже агрегированы, как в Spark)
+    def add_latin(self, word, count=1):
+        self.latin_top.add(word, count)
+        self.latin_distinct.add(word)
+
+    def add_russian(self, word, capitalized, count=1):
+        """capitalized - сколько из count вхождений написано с заглавной буквы (для одного - bool)"""
+        hashed = hash64(word)
+        self.russian_top.add(word, count)
+        self.russian_distinct.add_hash(hashed)
+        if capitalized:
+            self.uppercase.add_hash(hashed, int(capitalized))
+
+    def add_abbrev(self, abbrev, count=1):
+        self.abbrev_top.add(abbrev, count)
+
+    def add_name(self, name, count=1):
+        self.names_top.add(name, count)
+
+    def merge(self, other):
+        for name in ("latin_top", "russian_top", "uppercase", "abbrev_top", "names_top",
+                     "latin_distinct", "russian_distinct"):
+            getattr(self, name).merge(getattr(other, name))
+        return self
+
+    def distinct(self):
+        """Оценка числа различных русских и латинских слов"""
+        return {"russian": round(self.russian_distinct.estimate()),
+                "latin": round(self.latin_distinct.estimate())}
+
+    def results(self):
+        """
+        Результаты задач в том же виде, что и точные, с полем error у каждой строки:
+        истинное значение счетчика лежит в [count - error, count]. В задаче 4 error
+        относится к total_count (Space-Saving), а для uppercase_count (Count-Min)
+        отдельное поле uppercase_error, граница выполняется с вероятностью 1 - delta
+        """
+        latin = self.latin_top.top(1)
+        # Счетчики целые, поэтому переоценку e / ширина * N можно округлить вниз
+        uppercase_error = int(self.uppercase.epsilon * self.uppercase.total)
+        uppercase = []
+        for word, total, error in self.russian_top.top():
+            upper = min(self.uppercase.estimate(word), total)
+            if upper > UPPERCASE_MIN_COUNT and upper / total > 0.5:
+                uppercase.append({"word": word, "uppercase_count": upper, "total_count": total, "error": error,
+                                  "uppercase_error": uppercase_error})
+        uppercase.sort(key=lambda row: (-row["total_count"], row["word"]))
+
+        def top_rows(summary, min_count, key):
+            return [{key: value, "count": count, "error": error}
+                    for value, count, error in summary.top() if count > min_count][:TOP_N]
+
+        return {
+            "top_latin": {"word": latin[0][0], "count": latin[0][1], "error": latin[0][2]} if latin else None,
+            "uppercase": uppercase[:TOP_N],
+            "abbreviations": top_rows(self.abbrev_top, ABBREV_MIN_COUNT, "abbrev"),
+            "names": top_rows(self.names_top, NAME_MIN_COUNT, "name"),
+            "distinct_words": self.distinct(),
+            "error_bounds": self.error_bounds(),
+        }
+
+    def error_bounds(self):
+        """Гарантии точности: для Space-Saving - максимальная переоценка любого ключа"""
+        return {
+            "space_saving": {
+                "capacity": self.latin_top.capacity,
+                "max_overcount": {name: summary.min_count() for name, summary in (
+                    ("top_latin", self.latin_top), ("uppercase", self.russian_top),
+                    ("abbreviations", self.abbrev_top), ("names", self.names_top))},
+            },
+            "count_min": {
+                "epsilon": self.uppercase.epsilon,
+                "delta": self.uppercase.delta,
+                "max_overcount": self.uppercase.epsilon * self.uppercase.total,
+            },
+            "hyperloglog": {"relative_std_error": self.russian_distinct.relative_error},
+        }
+
+
+def compare_with_exact(exact, approx, exact_distinct):
+    """
+    Сравнение приближенных результатов с точными на одной выборке: доля найденных
+    элементов точного топа, максимальная ошибка счетчиков и попадание в границы
+    """
+    report = {"top_latin": {
+        "exact": exact["top_latin"],
+        "approx": approx["top_latin"],
+        "match": (exact["top_latin"] or {}).get("word") == (approx["top_latin"] or {}).get("word"),
+    }}
+    # Задача -> (ключ строки, [(счетчик, поле его ошибки, префикс полей отчета)])
+    columns = {
+        "uppercase": ("word", [("total_count", "error", ""), ("uppercase_count", "uppercase_error", "uppercase_")]),
+        "abbreviations": ("abbrev", [("count", "error", "")]),
+        "names": ("name", [("count", "error", "")]),
+    }
+    for task, (key, counts) in columns.items():
+        exact_rows = {row[key]: row for row in exact[task]}
+        approx_rows = {row[key]: row for row in approx[task]}
+        common = exact_rows.keys() & approx_rows.keys()
+        report[task] = {"recall": len(common) / len(exact_rows) if exact_rows else None}
+        for count_key, error_key, prefix in counts:
+            report[task][prefix + "max_abs_error"] = max(
+                (approx_rows[k][count_key] - exact_rows[k][count_key] for k in common), default=0)
+            report[task][prefix + "within_bounds"] = all(
+                approx_rows[k][count_key] - approx_rows[k][error_key] <= exact_rows[k][count_key]
+                <= approx_rows[k][count_key] for k in common)
+    report["distinct_words"] = {
+        kind: {"exact": exact_distinct[kind], "approx": approx["distinct_words"][kind],
+               "relative_error": abs(approx["distinct_words"][kind] - exact_distinct[kind]) / exact_distinct[kind]
+               if exact_distinct[kind] else None}
+        for kind in ("russian", "latin")
+    }
+    return report
@@ -1,169 +1,220 @@
-# Импорт необходимых библиотек
-from pyspark.sql import SparkSession
-from pyspark.sql.functions import *
-from pyspark.sql.window import Window
-import re
-
-# Инициализация Spark
-spark = SparkSession.builder \
-    .appName("RussianWikiAnalysis") \
-    .config("spark.sql.shuffle.partitions", "200") \
-    .config("spark.executor.memory", "4g") \
-    .config("spark.sql.adaptive.enabled", "true") \
-    .getOrCreate()
-
-# Определение регулярных выражений
-RU_WORD_PATTERN = r"\b[а-яёА-ЯЁ][а-яёА-ЯЁ\-]*[а-яёА-ЯЁ]\b"  # Строгое соответствие русским словам
-LATIN_PATTERN = r"\b[A-Za-z]+\b"  # Строгое соответствие словам с латинскими буквами (без дефисов)
-ABBREV1_PATTERN = r"\b[а-яё]{1,3}\."  # Сокращения вида "пр.", "др."
-NAME_PATTERN = r"\b[А-ЯЁ][а-яё]{1,20}(?:\s+[А-ЯЁ][а-яё]{1,20})?\b"  # Имена: одно имя или имя + фамилия
-
-# Списки русских имен и фамилий (пример)
-RUSSIAN_NAMES = [
-    "Александр", "Алексей", "Андрей", "Анна", "Виктор", "Владимир", "Дмитрий", "Екатерина",
-    "Елена", "Иван", "Мария", "Михаил", "Наталья", "Ольга", "Павел", "Петр", "Сергей",
-    "Татьяна", "Юлия", "Игорь", "Николай", "Светлана"
-]
-RUSSIAN_SURNAMES = [
-    "Иванов", "Петров", "Сидоров", "Смирнов", "Кузнецов", "Попов", "Васильев", "Соколов",
-    "Михайлов", "Новиков", "Федоров", "Морозов", "Волков", "Алексеев", "Лебедев", "Семенов"
-]
-RUSSIAN_NAME_LIST = RUSSIAN_NAMES + RUSSIAN_SURNAMES
-
-# Список распространенных несобственных имен
-NON_NAME_WORDS = [
-    "России", "Россия", "После", "Однако", "При", "Это", "Для", "Также", "Так",
-    "Российской", "Кроме", "Согласно", "Германии", "Украины", "Как", "Если", "Его",
-    "Федерации", "Франции", "Например", "Республики", "Совета", "Северной", "Москвы",
-    "Москва", "Петербург", "СССР", "США", "Европы"
-]
-
-# 1. Загрузка и парсинг данных
-def load_wiki_data(path):
-    """Чтение файла wiki.txt и преобразование в структурированные данные"""
-    raw = spark.read.text(path).withColumn("row_id", monotonically_increasing_id())
-
-    # Извлечение статей (URL, заголовок, начало содержимого)
-    articles = raw.filter(col("value").rlike(r"^https?://[^\s]+\t[^\t]+\t")) \
-        .withColumn("article_id", monotonically_increasing_id()) \
-        .withColumn("url", regexp_extract(col("value"), r"^(https?://[^\t]+)\t", 1)) \
-        .withColumn("title", regexp_extract(col("value"), r"^https?://[^\t]+\t([^\t]+)\t", 1)) \
-        .withColumn("content_start", regexp_extract(col("value"), r"^https?://[^\t]+\t[^\t]+\t(.*)", 1))
-
-    # Назначение article_id для всех строк
-    raw_with_article_id = raw.withColumn(
-        "article_id",
-        last(
-            when(col("value").rlike(r"^https?://[^\s]+\t[^\t]+\t"), monotonically_increasing_id()),
-            ignorenulls=True
-        ).over(Window.orderBy("row_id"))
-    )
-
-    # Объединение оставшегося содержимого статей
-    content = raw_with_article_id.filter(~col("value").rlike(r"^https?://[^\s]+\t[^\t]+\t")) \
-        .filter(col("article_id").isNotNull()) \
-        .groupBy("article_id") \
-        .agg(concat_ws("\n", collect_list(col("value"))).alias("content_rest"))
-
-    # Объединение данных и возврат результата
-    return articles.join(content, "article_id", "left") \
-        .withColumn("content", concat_ws("\n", col("content_start"), col("content_rest"))) \
-        .select("url", "title", "content").cache()
-
-# Загрузка данных
-wiki_df = load_wiki_data("wiki.txt")
-print(f"Загружено {wiki_df.count()} статей")
-
-# 2. Обработка слов (общая для задач 1-4)
-words_df = wiki_df.select(
-    explode(
-        split(
-            regexp_replace(col("content"), r"[^а-яёА-ЯЁA-Za-z\s]", ""),  # Удаление всех символов, кроме букв и пробелов
-            r"\s+"
-        )
-    ).alias("raw_word")
-).filter(
-    length(col("raw_word")) > 1  # Длина слова > 1
-).withColumn(
-    "word", regexp_replace(lower(col("raw_word")), "ё", "е")  # Нормализация: замена "ё" на "е"
-).withColumn(
-    "is_russian", col("raw_word").rlike(RU_WORD_PATTERN)
-).withColumn(
-    "is_latin", col("raw_word").rlike(LATIN_PATTERN)
-).cache()
-
-# Задача 1: Самое длинное русское слово
-longest = words_df.filter(col("is_russian")) \
-    .filter(~col("raw_word").contains(".")) \
-    .orderBy(length(col("raw_word")).desc(), col("raw_word")) \
-    .select("raw_word").first()
-print(f"\n1. Самое длинное русское слово: {longest['raw_word'] if longest else 'нет'} (длина: {len(longest['raw_word']) if longest else 0})")
-
-# Задача 2: Средняя длина слова
-avg_len = words_df.filter(col("is_russian")) \
-    .agg(avg(length(col("raw_word"))).alias("avg_length")) \
-    .first()["avg_length"]
-print(f"2. Средняя длина слова: {avg_len:.2f} символов")
-
-# Задача 3: Самое частое латинское слово
-top_latin = words_df.filter(col("is_latin")) \
-    .groupBy("word").count() \
-    .orderBy(col("count").desc(), col("word")) \
-    .first()
-print(f"3. Самое частое латинское слово: '{top_latin['word'] if top_latin else 'нет'}' (встречается {top_latin['count'] if top_latin else 0} раз)")
-
-# Задача 4: Слова с частым использованием заглавных букв (более чем в половине случаев, встречаются > 10 раз)
-uppercase_stats = words_df.filter(col("is_russian")) \
-    .filter(~col("raw_word").rlike(r"\.")) \
-    .groupBy(lower(col("raw_word")).alias("word")) \
-    .agg(
-        sum(when(col("raw_word").rlike("^[А-ЯЁ]"), 1).otherwise(0)).alias("uppercase_count"),
-        count("*").alias("total_count")
-    ) \
-    .filter((col("uppercase_count") > 10) & (col("uppercase_count") / col("total_count") > 0.5)) \
-    .orderBy(col("total_count").desc())
-
-print("\n4. Слова с частым использованием заглавных букв (>10 раз, более чем в половине случаев):")
-uppercase_stats.show(20, truncate=False)
-
-# Задача 5: Сокращения вида "пр.", "др."
-abbrev1_df = wiki_df.select(
-    explode(
-        split(
-            regexp_replace(col("content"), r"[^\sа-яёА-ЯЁ.]", ""),  # Сохранение только русских букв и точек
-            r"\s+"
-        )
-    ).alias("abbrev")
-).filter(
-    col("abbrev").rlike(ABBREV1_PATTERN) & (length(col("abbrev")) <= 4)
-).groupBy("abbrev").count() \
-    .filter(col("count") > 10) \
-    .orderBy(col("count").desc())
-
-print("\n5. Частые сокращения вида 'пр.', 'др.' (>10 раз):")
-abbrev1_df.show(20, truncate=False)
-
-# Задача 7: Извлечение имен
-names_df = wiki_df.select(
-    explode(
-        split(
-            regexp_replace(col("content"), r"[^а-яёА-ЯЁ\s]", ""),  # Сохранение только русских букв и пробелов
-            r"\s+"
-        )
-    ).alias("name")
-).filter(
-    col("name").rlike(NAME_PATTERN) &
-    (length(col("name")) > 2) &
-    (~col("name").isin(NON_NAME_WORDS)) &
-    (col("name").isin(RUSSIAN_NAME_LIST) | col("name").rlike(r"\b[А-ЯЁ][а-яё]+\s+[А-ЯЁ][а-яё]+\b"))
-).groupBy("name").count() \
-    .filter(col("count") > 5) \
-    .orderBy(col("count").desc())
-
-print("\n7. Частые имена (>5 раз):")
-names_df.show(20, truncate=False)
-
-# Очистка кэша и завершение работы Spark
-wiki_df.unpersist()
-words_df.unpersist()
-spark.stop()
+# Анализ русскоязычных статей Википедии: бэкенд PySpark или локальный пул процессов
+import argparse
+import json
+import os
+import time
+
+from wiki_text import (FIRST_NAMES_PATH, STOPWORDS_PATH, SURNAMES_PATH, TASK_NAMES, TASK_NUMBERS,
+                       NameDictionaries)
+
+# pyspark импортируется только для бэкенда spark, чтобы локальный запуск не требовал JVM
+BACKENDS = ("spark", "local")
+
+
+def parse_conf(value):
+    """Параметр Spark в виде КЛЮЧ=ЗНАЧЕНИЕ"""
+    key, sep, conf_value = value.partition("=")
+    if not sep or not key:
+        raise argparse.ArgumentTypeError(f"Ожидается КЛЮЧ=ЗНАЧЕНИЕ: {value}")
+    return key, conf_value
+
+
+def parse_tasks(value):
+    """Задачи через запятую: номера из условия (1-5, 7) или имена"""
+    tasks = []
+    for item in value.split(","):
+        name = TASK_NUMBERS.get(item.strip(), item.strip())
+        if name not in TASK_NAMES:
+            raise argparse.ArgumentTypeError(
+                f"Неизвестная задача: {item} (номера {', '.join(TASK_NUMBERS)} или {', '.join(TASK_NAMES)})")
+        if name not in tasks:
+            tasks.append(name)
+    return tasks
+
+
+def parse_args():
+    """Парсинг аргументов командной строки"""
+    parser = argparse.ArgumentParser(description="Анализ русскоязычных статей Википедии")
+    parser.add_argument("--input", type=str, default="wiki.txt", help="Файл со статьями (по умолчанию wiki.txt)")
+    parser.add_argument("--backend", choices=BACKENDS, default="spark",
+                        help="spark - PySpark, local - потоковое чтение и пул процессов без JVM "
+                             "(по умолчанию spark)")
+    parser.add_argument("--tasks", type=parse_tasks, default=list(TASK_NAMES),
+                        help="Задачи через запятую: номера (1,2,3,4,5,7) или имена "
+                             "(longest_word, avg_length, top_latin, uppercase, abbreviations, names); "
+                             "по умолчанию все")
+    parser.add_argument("--output", type=str,
+                        help="Сохранить отчет в JSON: параметры запуска, метрики задач и результаты")
+
+    parser.add_argument("--approx", action="store_true",
+                        help="Приближенный режим: задачи 3-5 и 7 по скетчам Space-Saving/Count-Min, "
+                             "число различных слов по HyperLogLog")
+    parser.add_argument("--sketch-capacity", type=int, default=1000,
+                        help="Счетчиков Space-Saving в приближенном режиме (по умолчанию 1000)")
+    parser.add_argument("--check-sample", type=float,
+                        help="Доля статей (например, 0.01), на которой приближенные результаты "
+                             "сравниваются с точными")
+    parser.add_argument("--first-names", type=str, default=FIRST_NAMES_PATH,
+                        help="Словарь имен, по одному в строке (по умолчанию dictionaries/first_names.txt)")
+    parser.add_argument("--surnames", type=str, default=SURNAMES_PATH,
+                        help="Словарь фамилий (по умолчанию dictionaries/surnames.txt)")
+    parser.add_argument("--stopwords", type=str, default=STOPWORDS_PATH,
+                        help="Слова с заглавной буквы, которые не считаются именами "
+                             "(по умолчанию dictionaries/stopwords.txt)")
+
+    local = parser.add_argument_group("Бэкенд local")
+    local.add_argument("--workers", type=int, help="Число процессов (по умолчанию число ядер)")
+    local.add_argument("--batch-chars", type=int,
+                       help="Символов текста в порции статей для процесса (по умолчанию 4 Мб)")
+
+    spark = parser.add_argument_group("Бэкенд spark")
+    spark.add_argument("--parsed-path", type=str, default="wiki_parsed.parquet",
+                       help="Кэш разобранных статей (по умолчанию wiki_parsed.parquet)")
+    spark.add_argument("--shuffle-partitions", type=int, default=200,
+                       help="spark.sql.shuffle.partitions (по умолчанию 200)")
+    spark.add_argument("--executor-memory", type=str, default="4g",
+                       help="spark.executor.memory (по умолчанию 4g)")
+    spark.add_argument("--conf", type=parse_conf, action="append", default=[],
+                       help="Дополнительный параметр Spark КЛЮЧ=ЗНАЧЕНИЕ (можно указать несколько раз)")
+    return parser.parse_args()
+
+
+def run_backend(args):
+    """Запуск выбранных задач на бэкенде; возвращает результаты и метрики для отчета"""
+    dictionaries = NameDictionaries.load(args.first_names, args.surnames, args.stopwords)
+    if args.backend == "local":
+        from wiki_local import BATCH_CHARS, analyze
+        metrics = {}
+        results = analyze(args.input, args.workers, args.batch_chars or BATCH_CHARS, args.approx,
+                          args.sketch_capacity, args.check_sample, dictionaries, args.tasks, metrics)
+        return results, {"steps": metrics}
+
+    from wiki_spark import SparkMetrics, analyze, create_session
+    spark = create_session(args.shuffle_partitions, args.executor_memory, args.conf)
+    try:
+        metrics = SparkMetrics(spark)
+        results = analyze(spark, args.input, args.parsed_path, args.approx, args.sketch_capacity,
+                          args.check_sample, dictionaries, args.tasks, metrics)
+        return results, {"spark": metrics.application(), "steps": metrics.tasks}
+    finally:
+        spark.stop()
+
+
+def build_report(args, results, metrics, wall):
+    """Отчет запуска в виде словаря для JSON"""
+    config = {key: value for key, value in vars(args).items() if key not in ("input", "output", "tasks")}
+    config["conf"] = dict(args.conf)
+    return {
+        "backend": args.backend,
+        "input": os.path.abspath(args.input),
+        "input_bytes": os.path.getsize(args.input),
+        "tasks": args.tasks,
+        "config": config,
+        "wall_s": wall,
+        **metrics,
+        "results": results,
+    }
+
+
+def print_table(rows, columns):
+    """Вывод строк в виде таблицы (как DataFrame.show)"""
+    widths = [max([len(column)] + [len(str(row[column])) for row in rows]) for column in columns]
+    border = "+" + "+".join("-" * width for width in widths) + "+"
+    print(border)
+    print("|" + "|".join(column.ljust(width) for column, width in zip(columns, widths)) + "|")
+    print(border)
+    for row in rows:
+        print("|" + "|".join(str(row[column]).ljust(width) for column, width in zip(columns, widths)) + "|")
+    print(border)
+
+
+def print_results(results):
+    """Вывод результатов выбранных задач"""
+    print(f"Загружено {results['articles']} статей")
+
+    if "longest_word" in results:
+        longest = results["longest_word"]
+        print(f"\n1. Самое длинное русское слово: {longest['word'] if longest else 'нет'} "
+              f"(длина: {longest['length'] if longest else 0})")
+    if "avg_length" in results:
+        print(f"2. Средняя длина слова: {results['avg_length'] or 0:.2f} символов")
+    if "top_latin" in results:
+        top_latin = results["top_latin"]
+        print(f"3. Самое частое латинское слово: '{top_latin['word'] if top_latin else 'нет'}' "
+              f"(встречается {top_latin['count'] if top_latin else 0} раз)")
+
+    # В приближенном режиме у строк есть error: истинное значение в [count - error, count];
+    # в задаче 4 error относится к total_count, uppercase_error - к uppercase_count
+    error = ["error"] if "error_bounds" in results else []
+    if "uppercase" in results:
+        print("\n4. Слова с частым использованием заглавных букв (>10 раз, более чем в половине случаев):")
+        print_table(results["uppercase"], ["word", "uppercase_count", "total_count"] + error
+                    + ["uppercase_error"] * bool(error))
+    if "abbreviations" in results:
+        print("\n5. Частые сокращения вида 'пр.', 'др.' (>10 раз):")
+        print_table(results["abbreviations"], ["abbrev", "count"] + error)
+    if "names" in results:
+        print("\n7. Частые имена и пары \"Имя Фамилия\" (>5 раз):")
+        print_table(results["names"], ["name", "count"] + error)
+
+    if "error_bounds" in results:
+        bounds = results["error_bounds"]
+        distinct = results["distinct_words"]
+        hll_error = bounds["hyperloglog"]["relative_std_error"]
+        print(f"\nРазличных слов (HyperLogLog, ±{hll_error:.1%}): русских {distinct['russian']}, "
+              f"латинских {distinct['latin']}")
+        print(f"Space-Saving ({bounds['space_saving']['capacity']} счетчиков), максимальная переоценка: "
+              + ", ".join(f"{task} {value}" for task, value in bounds["space_saving"]["max_overcount"].items()
+                          if task in results))
+        count_min = bounds["count_min"]
+        print(f"Count-Min: переоценка не больше {count_min['max_overcount']:.1f} "
+              f"с вероятностью {1 - count_min['delta']:.3f}")
+    if "approx_check" in results:
+        check = results["approx_check"]
+        print(f"\nСравнение с точными результатами на выборке {check['sample']:.1%} ({check['articles']} статей):")
+        print(f"  top_latin: {'совпадает' if check['top_latin']['match'] else 'не совпадает'}")
+        for task in ("uppercase", "abbreviations", "names"):
+            row = check[task]
+            recall = "-" if row["recall"] is None else f"{row['recall']:.0%}"
+            print(f"  {task}: найдено {recall} точного топа, максимальная ошибка {row['max_abs_error']}, "
+                  f"{'в пределах границ' if row['within_bounds'] else 'ВНЕ границ'}")
+            if "uppercase_max_abs_error" in row:
+                print(f"  {task} (uppercase_count): максимальная ошибка {row['uppercase_max_abs_error']}, "
+                      f"{'в пределах границ' if row['uppercase_within_bounds'] else 'ВНЕ границ'}")
+        for kind, row in check["distinct_words"].items():
+            relative = "-" if row["relative_error"] is None else f"{row['relative_error']:.2%}"
+            print(f"  различных слов ({kind}): точно {row['exact']}, оценка {row['approx']}, ошибка {relative}")
+
+
+def print_metrics(metrics):
+    """Время и объемы данных по шагам запуска"""
+    print("\nВремя выполнения:")
+    for name, entry in metrics["steps"].items():
+        line = f"  {name}: {entry['wall_s']:.2f} с"
+        if "shuffle_read_bytes" in entry:
+            line += (f", этапов {len(entry['stages'])}, shuffle чтение/запись "
+                     f"{entry['shuffle_read_bytes']}/{entry['shuffle_write_bytes']} байт, "
+                     f"spill {entry['memory_spilled_bytes'] + entry['disk_spilled_bytes']} байт")
+        if entry.get("cache"):
+            line += ", кэш токенов: " + ("да" if entry["cache"]["hit"] else "нет")
+        if "parsed_cache_hit" in entry:
+            line += ", parquet-кэш: " + ("да" if entry["parsed_cache_hit"] else "нет")
+        print(line)
+
+
+def main():
+    """Основная функция выполнения скрипта"""
+    args = parse_args()
+    begin = time.perf_counter()
+    results, metrics = run_backend(args)
+    wall = time.perf_counter() - begin
+    print_results(results)
+    print_metrics(metrics)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(build_report(args, results, metrics, wall), f, ensure_ascii=False, indent=2)
+        print(f"Отчет сохранен в {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+# Локальный бэкенд без JVM: потоковое чтение строк и пул процессов.
+# Повторяет токенизацию и задачи бэкенда Spark (wiki_spark.py) и дает те же результаты
+import multiprocessing as mp
+import os
+import queue
+import random
+import re
+import time
+from collections import Counter
+from functools import partial
+
+from sketches import TOPK_CAPACITY, TokenSketches, compare_with_exact
+from wiki_text import (ABBREV1_PATTERN, ABBREV_MIN_COUNT, CAPITALIZED_PATTERN, LATIN_PATTERN, NAME_MIN_COUNT,
+                       NAME_MIN_LENGTH, NAME_PATTERN, NON_LETTER_PATTERN, NON_RU_DOT_PATTERN, NON_RU_PATTERN,
+                       RU_WORD_PATTERN, SAMPLE_SEED, SPACE_PATTERN, TASK_NAMES, TOP_N, UPPERCASE_MIN_COUNT,
+                       NameDictionaries, assemble_articles)
+
+BATCH_CHARS = 4 * 1024 * 1024  # Символов текста в одной порции статей для процесса
+
+SPACE_RE = re.compile(SPACE_PATTERN)
+NON_LETTER_RE = re.compile(NON_LETTER_PATTERN)
+NON_RU_DOT_RE = re.compile(NON_RU_DOT_PATTERN)
+NON_RU_RE = re.compile(NON_RU_PATTERN)
+RU_WORD_RE = re.compile(RU_WORD_PATTERN)
+LATIN_RE = re.compile(LATIN_PATTERN)
+CAPITALIZED_RE = re.compile(CAPITALIZED_PATTERN)
+ABBREV1_RE = re.compile(ABBREV1_PATTERN)
+NAME_RE = re.compile(NAME_PATTERN)
+
+
+def read_lines(path):
+    """Потоковое чтение строк; разделители \\n, \\r\\n и \\r, как у textFile в Spark"""
+    with open(path, "r", encoding="utf-8", errors="replace", newline=None) as f:
+        for line in f:
+            yield line[:-1] if line.endswith("\n") else line
+
+
+def iter_batches(articles, batch_chars=BATCH_CHARS):
+    """Группировка текстов статей в порции примерно по batch_chars символов"""
+    batch = []
+    size = 0
+    for _, _, content in articles:
+        batch.append(content)
+        size += len(content)
+        if size >= batch_chars:
+            yield batch
+            batch = []
+            size = 0
+    if batch:
+        yield batch
+
+
+class ExactCounts:
+    """Точные счетчики задач 3-5 и 7"""
+
+    def __init__(self):
+        self.latin = Counter()  # Задача 3: нормализованное слово -> число вхождений
+        self.lower_total = Counter()  # Задача 4: слово в нижнем регистре -> число вхождений
+        self.lower_upper = Counter()  # Задача 4: ... -> число вхождений с заглавной буквы
+        self.abbrev = Counter()
+        self.names = Counter()
+
+    def add_latin(self, word):
+        self.latin[word] += 1
+
+    def add_russian(self, word, capitalized):
+        self.lower_total[word] += 1
+        if capitalized:
+            self.lower_upper[word] += 1
+
+    def add_abbrev(self, abbrev):
+        self.abbrev[abbrev] += 1
+
+    def add_name(self, name):
+        self.names[name] += 1
+
+    def merge(self, other):
+        for name in ("latin", "lower_total", "lower_upper", "abbrev", "names"):
+            getattr(self, name).update(getattr(other, name))
+        return self
+
+    def distinct(self):
+        """Число различных русских и латинских слов"""
+        return {"russian": len(self.lower_total), "latin": len(self.latin)}
+
+    def results(self):
+        latin = min(self.latin.items(), key=lambda item: (-item[1], item[0]), default=None)
+        uppercase = sorted(
+            ({"word": word, "uppercase_count": self.lower_upper[word], "total_count": total}
+             for word, total in self.lower_total.items()
+             if self.lower_upper[word] > UPPERCASE_MIN_COUNT and self.lower_upper[word] / total > 0.5),
+            key=lambda row: (-row["total_count"], row["word"]))
+        return {
+            "top_latin": {"word": latin[0], "count": latin[1]} if latin else None,
+            "uppercase": uppercase[:TOP_N],
+            "abbreviations": top_counts(self.abbrev, ABBREV_MIN_COUNT, "abbrev"),
+            "names": top_counts(self.names, NAME_MIN_COUNT, "name"),
+        }
+
+
+def top_counts(counter, min_count, key):
+    """Элементы с числом вхождений больше min_count: по убыванию частоты, затем по алфавиту"""
+    rows = sorted((item for item in counter.items() if item[1] > min_count), key=lambda item: (-item[1], item[0]))
+    return [{key: value, "count": count} for value, count in rows[:TOP_N]]
+
+
+class PartialResult:
+    """
+    Частичные агрегаты одного процесса; объединяются в главном процессе. counts -
+    точные счетчики (ExactCounts) или скетчи приближенного режима (TokenSketches)
+    """
+
+    def __init__(self, counts):
+        self.longest = None  # (-длина, слово) - минимум дает самое длинное слово
+        self.russian_count = 0
+        self.russian_length = 0
+        self.counts = counts
+
+    def add_article(self, content, dictionaries):
+        """Токены статьи - те же формы и признаки, что и в tokenize() бэкенда Spark"""
+        counts = self.counts
+        known, first_names, stopwords = dictionaries.known, dictionaries.first_names, dictionaries.stopwords
+        pending_first = None  # Имя из словаря в предыдущем фрагменте - начало пары "Имя Фамилия"
+        for chunk in SPACE_RE.split(content):
+            word = NON_LETTER_RE.sub("", chunk)
+            if not word:
+                pending_first = None
+                continue
+
+            if "." in chunk:
+                ru_dot = NON_RU_DOT_RE.sub("", chunk)
+                if len(ru_dot) <= 4 and ABBREV1_RE.search(ru_dot):
+                    counts.add_abbrev(ru_dot)
+
+            if RU_WORD_RE.search(word):
+                ru = word
+                length = len(word)
+                key = (-length, word)
+                if self.longest is None or key < self.longest:
+                    self.longest = key
+                self.russian_count += 1
+                self.russian_length += length
+                counts.add_russian(word.lower(), CAPITALIZED_RE.search(word) is not None)
+            else:
+                if len(word) > 1 and LATIN_RE.search(word):
+                    counts.add_latin(word.lower().replace("ё", "е"))
+                ru = NON_RU_RE.sub("", word)
+
+            # Имена: поиск в словарях и пары соседних фрагментов за один проход
+            if len(ru) >= NAME_MIN_LENGTH and ru not in stopwords and NAME_RE.search(ru):
+                if ru in known:
+                    counts.add_name(ru)
+                if pending_first is not None:
+                    counts.add_name(pending_first + " " + ru)
+                pending_first = ru if ru in first_names else None
+            else:
+                pending_first = None
+
+    def merge(self, other):
+        """Добавление агрегатов другого процесса"""
+        if other.longest is not None and (self.longest is None or other.longest < self.longest):
+            self.longest = other.longest
+        self.russian_count += other.russian_count
+        self.russian_length += other.russian_length
+        self.counts.merge(other.counts)
+
+    def results(self, articles):
+        """Итоговые результаты задач в том же виде, что и у бэкенда Spark"""
+        return {
+            "articles": articles,
+            "longest_word": {"word": self.longest[1], "length": -self.longest[0]} if self.longest else None,
+            "avg_length": self.russian_length / self.russian_count if self.russian_count else None,
+            **self.counts.results(),
+        }
+
+
+def worker(tasks, results, make_counts, dictionaries):
+    """Процесс-обработчик: агрегирует все полученные порции и отдает один частичный результат"""
+    aggregates = PartialResult(make_counts())
+    for batch in iter(tasks.get, None):
+        for content in batch:
+            aggregates.add_article(content, dictionaries)
+    results.put(aggregates)
+
+
+def check_workers(processes):
+    """Ошибка, если какой-то процесс-обработчик упал"""
+    failed = [p.exitcode for p in processes if p.exitcode not in (None, 0)]
+    if failed:
+        raise RuntimeError(f"Процесс-обработчик завершился с кодом {failed[0]}")
+
+
+def put_checked(tasks, item, processes):
+    """Отправка порции в очередь без зависания, если обработчики упали"""
+    while True:
+        try:
+            tasks.put(item, timeout=1)
+            return
+        except queue.Full:
+            check_workers(processes)
+
+
+def collect_partials(results, processes):
+    """Получение частичных результатов всех процессов"""
+    partials = []
+    while len(partials) < len(processes):
+        try:
+            partials.append(results.get(timeout=1))
+        except queue.Empty:
+            check_workers(processes)
+    return partials
+
+
+def run(path, dictionaries, workers=None, batch_chars=BATCH_CHARS, make_counts=ExactCounts, sample=None):
+    """
+    Проход по файлу: главный процесс читает его построчно и собирает статьи, порции
+    статей обрабатываются процессами пула, их агрегаты объединяются в конце.
+    sample - доля статей случайной (воспроизводимой) выборки.
+    Возвращает объединенный PartialResult и число статей
+    """
+    workers = workers or os.cpu_count() or 1
+    articles = assemble_articles(0, read_lines(path), {})
+    if sample is not None:
+        rng = random.Random(SAMPLE_SEED)
+        articles = (article for article in articles if rng.random() < sample)
+    batches = iter_batches(articles, batch_chars)
+    count = 0
+    total = PartialResult(make_counts())
+
+    if workers == 1:
+        # Без дочерних процессов - для небольших файлов и отладки
+        for batch in batches:
+            count += len(batch)
+            for content in batch:
+                total.add_article(content, dictionaries)
+        return total, count
+
+    tasks = mp.Queue(maxsize=2 * workers)  # Ограничение очереди - обратное давление на чтение
+    results = mp.Queue()
+    processes = [mp.Process(target=worker, args=(tasks, results, make_counts, dictionaries),
+                            daemon=True)
+                 for _ in range(workers)]
+    for p in processes:
+        p.start()
+    try:
+        for batch in batches:
+            count += len(batch)
+            put_checked(tasks, batch, processes)
+        for _ in processes:
+            put_checked(tasks, None, processes)
+        for result in collect_partials(results, processes):
+            total.merge(result)
+        for p in processes:
+            p.join()
+    finally:
+        for p in processes:
+            if p.is_alive():
+                p.terminate()
+    return total, count
+
+
+def analyze(path, workers=None, batch_chars=BATCH_CHARS, approx=False, capacity=TOPK_CAPACITY,
+            check_sample=None, dictionaries=None, tasks=None, metrics=None):
+    """
+    Все задачи без Spark. approx - частотные задачи по скетчам (TokenSketches);
+    check_sample - доля статей, на которой приближенные результаты сравниваются с точными;
+    dictionaries - словари имен (NameDictionaries, по умолчанию из директории dictionaries);
+    tasks - имена задач в результате (по умолчанию все). Задачи считаются за один проход
+    по файлу, поэтому выбор задач не ускоряет запуск, а в metrics (словарь) записывается
+    время прохода целиком
+    """
+    dictionaries = dictionaries or NameDictionaries.load()
+    make_counts = partial(TokenSketches, capacity) if approx else ExactCounts
+    metrics = {} if metrics is None else metrics
+    begin = time.perf_counter()
+    total, count = run(path, dictionaries, workers, batch_chars, make_counts)
+    results = total.results(count)
+    metrics["scan"] = {"wall_s": time.perf_counter() - begin}
+    if tasks is not None:
+        results = {key: value for key, value in results.items() if key not in TASK_NAMES or key in tasks}
+    if approx and check_sample:
+        begin = time.perf_counter()
+        exact, _ = run(path, dictionaries, workers, batch_chars, ExactCounts, check_sample)
+        sketched, sample_count = run(path, dictionaries, workers, batch_chars, make_counts, check_sample)
+        results["approx_check"] = {
+            "sample": check_sample,
+            "articles": sample_count,
+            **compare_with_exact(exact.results(sample_count), sketched.results(sample_count),
+                                 exact.counts.distinct()),
+        }
+        metrics["approx_check"] = {"wall_s": time.perf_counter() - begin}
+    return results
@@ -0,0 +1,454 @@
+# Бэкенд на PySpark
+from pyspark.sql import SparkSession
+from pyspark.sql.functions import *
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+import json
+import os
+import time
+import urllib.error
+import urllib.request
+
+from sketches import TOPK_CAPACITY, TokenSketches, compare_with_exact
+from wiki_text import (ABBREV1_PATTERN, ABBREV_MIN_COUNT, APPROX_TASKS, CAPITALIZED_PATTERN, LATIN_PATTERN, NAME_MIN_COUNT,
+                       NAME_MIN_LENGTH, NAME_PATTERN, NON_LETTER_PATTERN, NON_RU_DOT_PATTERN, NON_RU_PATTERN,
+                       RU_WORD_PATTERN, SAMPLE_SEED, SPACE_PATTERN, TOP_N, UPPERCASE_MIN_COUNT, NameDictionaries,
+                       assemble_articles, partition_head, stitch_tails)
+
+ARTICLE_SCHEMA = "url string, title string, content string"
+PARSED_PATH = "wiki_parsed.parquet"  # Кэш разобранных статей
+SOURCE_MARKER = "_wiki_source.json"  # Размер и время изменения исходного файла для кэша
+TOKENS_VIEW = "wiki_tokens"  # Имя закэшированной таблицы токенов
+DEFAULT_SHUFFLE_PARTITIONS = 200
+DEFAULT_EXECUTOR_MEMORY = "4g"
+# Модули с функциями, которые выполняются на исполнителях (сборка статей, скетчи)
+EXECUTOR_MODULES = ("wiki_text.py", "sketches.py", "wiki_spark.py")
+
+# Метрики этапов из REST API: поле API -> ключ отчета
+STAGE_METRICS = {
+    "inputBytes": "input_bytes",
+    "shuffleReadBytes": "shuffle_read_bytes",
+    "shuffleWriteBytes": "shuffle_write_bytes",
+    "memoryBytesSpilled": "memory_spilled_bytes",
+    "diskBytesSpilled": "disk_spilled_bytes",
+    "executorRunTime": "executor_run_time_ms",
+}
+STAGE_DONE = ("COMPLETE", "FAILED", "SKIPPED")
+
+
+def create_session(shuffle_partitions=DEFAULT_SHUFFLE_PARTITIONS, executor_memory=DEFAULT_EXECUTOR_MEMORY,
+                   conf=()):
+    """Инициализация Spark; conf - дополнительные пары (ключ, значение)"""
+    builder = SparkSession.builder \
+        .appName("RussianWikiAnalysis") \
+        .config("spark.sql.shuffle.partitions", str(shuffle_partitions)) \
+        .config("spark.executor.memory", executor_memory) \
+        .config("spark.sql.adaptive.enabled", "true")
+    for key, value in conf:
+        builder = builder.config(key, value)
+    spark = builder.getOrCreate()
+    # На кластере этих модулей нет в PYTHONPATH исполнителей: рассылаем их вместе с заданием
+    module_dir = os.path.dirname(os.path.abspath(__file__))
+    for name in EXECUTOR_MODULES:
+        spark.sparkContext.addPyFile(os.path.join(module_dir, name))
+    return spark
+
+
+class SparkMetrics:
+    """
+    Метрики задач: время, задания и этапы Spark (каждая задача выполняется в своей
+    группе заданий, состав группы берется из statusTracker), объемы чтения, shuffle и
+    spill этапов (REST API интерфейса Spark) и состояние кэша таблицы токенов
+    """
+
+    def __init__(self, spark, timeout=10.0):
+        self.sc = spark.sparkContext
+        self.tracker = self.sc.statusTracker()
+        ui = self.sc.uiWebUrl
+        self.api = f"{ui}/api/v1/applications/{self.sc.applicationId}" if ui else None
+        self.timeout = timeout
+        self.tasks = {}
+
+    def fetch(self, path):
+        """GET к REST API (None, если интерфейс отключен или ресурса нет)"""
+        if self.api is None:
+            return None
+        try:
+            with urllib.request.urlopen(self.api + path, timeout=self.timeout) as response:
+                return json.load(response)
+        except urllib.error.HTTPError as e:
+            if e.code == 404:
+                return None
+            raise
+
+    def cache_status(self, view):
+        """Сколько разделов закэшированной таблицы уже в памяти или на диске"""
+        rdds = self.fetch("/storage/rdd")
+        if rdds is None:
+            return None
+        for rdd in rdds:
+            if rdd["name"] == f"In-memory table {view}":
+                return {"cached_partitions": rdd["numCachedPartitions"], "partitions": rdd["numPartitions"],
+                        "memory_bytes": rdd["memoryUsed"], "disk_bytes": rdd["diskUsed"],
+                        "hit": 0 < rdd["numCachedPartitions"] == rdd["numPartitions"]}
+        return {"cached_partitions": 0, "hit": False}
+
+    def stage_metrics(self, stage_ids):
+        """Сумма метрик этапов; события этапов обрабатываются асинхронно, поэтому ждем их завершения"""
+        totals = dict.fromkeys(STAGE_METRICS.values(), 0)
+        statuses = {}
+        deadline = time.monotonic() + self.timeout
+        for stage_id in stage_ids:
+            attempts = self.fetch(f"/stages/{stage_id}") or []
+            while any(a["status"] not in STAGE_DONE for a in attempts) and time.monotonic() < deadline:
+                time.sleep(0.1)
+                attempts = self.fetch(f"/stages/{stage_id}") or []
+            statuses[str(stage_id)] = [a["status"] for a in attempts]
+            for attempt in attempts:
+                for field, key in STAGE_METRICS.items():
+                    totals[key] += attempt.get(field, 0)
+        return {"stage_status": statuses, **totals}
+
+    @contextmanager
+    def measure(self, name, view=None):
+        """Контекст задачи; в отдаваемый словарь можно добавить свои поля"""
+        entry = {}
+        if view is not None:
+            entry["cache"] = self.cache_status(view)
+        group = f"wiki_analyze.{name}"
+        self.sc.setJobGroup(group, f"wiki_analyze: {name}")
+        begin = time.perf_counter()
+        try:
+            yield entry
+        finally:
+            entry["wall_s"] = time.perf_counter() - begin
+            self.sc.setLocalProperty("spark.jobGroup.id", None)
+            self.sc.setLocalProperty("spark.job.description", None)
+            jobs = sorted(self.tracker.getJobIdsForGroup(group))
+            infos = [self.tracker.getJobInfo(job) for job in jobs]
+            entry["jobs"] = jobs
+            entry["stages"] = sorted({stage for info in infos if info for stage in info.stageIds})
+            if self.api is not None:
+                entry.update(self.stage_metrics(entry["stages"]))
+            self.tasks[name] = entry
+
+    def application(self):
+        """Сведения о приложении для отчета"""
+        return {"application_id": self.sc.applicationId, "ui": self.sc.uiWebUrl, "version": self.sc.version,
+                "master": self.sc.master}
+
+
+def measure(metrics, name, view=None):
+    """Контекст метрик задачи или пустой контекст, если метрики не собираются"""
+    return metrics.measure(name, view) if metrics is not None else nullcontext({})
+
+
+# 1. Загрузка и парсинг данных
+def source_signature(path):
+    """Размер и время изменения исходного файла (None для нелокальных путей)"""
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return {"path": os.path.abspath(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def parsed_cache_valid(path, parsed_path=PARSED_PATH):
+    """Есть ли parquet-кэш, разобранный из этого же файла"""
+    source = source_signature(path)
+    marker = os.path.join(parsed_path, SOURCE_MARKER)
+    if source is None or not os.path.exists(marker):
+        return False
+    with open(marker, "r") as f:
+        return json.load(f) == source
+
+
+def load_wiki_data(spark, path, parsed_path=PARSED_PATH):
+    """
+    Чтение файла wiki.txt и преобразование в структурированные данные (url, title, content).
+
+    Статьи собираются параллельно по разделам файла: сначала с каждого раздела
+    собираются строки до его первого заголовка (обычно их нет или немного), затем
+    они рассылаются через broadcast и дописываются к последней статье предыдущего
+    раздела. Результат сохраняется в parquet; повторный запуск на том же файле
+    читает parquet и не разбирает текст.
+    """
+    if parsed_cache_valid(path, parsed_path):
+        return spark.read.parquet(parsed_path)
+
+    lines = spark.sparkContext.textFile(path)
+    heads = lines.mapPartitionsWithIndex(partition_head).collect()
+    tails = spark.sparkContext.broadcast(stitch_tails(heads))
+    articles = lines.mapPartitionsWithIndex(lambda index, part: assemble_articles(index, part, tails.value))
+
+    spark.createDataFrame(articles, ARTICLE_SCHEMA).write.mode("overwrite").parquet(parsed_path)
+    tails.unpersist()
+    source = source_signature(path)
+    if source is not None:
+        with open(os.path.join(parsed_path, SOURCE_MARKER), "w") as f:
+            json.dump(source, f)
+    return spark.read.parquet(parsed_path)
+
+
+# 2. Токенизация (общая для всех задач)
+def dictionary_frame(spark, dictionaries):
+    """
+    Словари имен одной таблицей (слово и его роли) с подсказкой broadcast: при соединении
+    с токенами каждый исполнитель получает ее один раз как хэш-таблицу, поэтому поиск
+    стоит O(1) независимо от размера словарей и словари не попадают в план как литералы
+    """
+    words = sorted(dictionaries.known | dictionaries.stopwords)
+    rows = [(word, word in dictionaries.first_names, word in dictionaries.known, word in dictionaries.stopwords)
+            for word in words]
+    return broadcast(spark.createDataFrame(rows, "word string, is_first boolean, is_known boolean, is_stop boolean"))
+
+
+def with_names(tokens, dictionary_df):
+    """
+    Колонка names - имена, найденные в токене: само слово, если оно есть в словаре имен
+    или фамилий, и пара "Имя Фамилия", если слово - имя из словаря, а следующий фрагмент
+    похож на имя. Оба соседа ищутся в словарях в одном проходе по токенам
+    """
+    current = dictionary_df.select(col("word").alias("cur_key"), col("is_first").alias("cur_first"),
+                                   col("is_known").alias("cur_known"), col("is_stop").alias("cur_stop"))
+    following = dictionary_df.select(col("word").alias("next_key"), col("is_stop").alias("next_stop"))
+    is_name = lambda name, stop: (name.rlike(NAME_PATTERN) & (length(name) >= NAME_MIN_LENGTH)
+                                  & ~coalesce(stop, lit(False)))
+
+    # Следующий фрагмент ищется в словаре только после имени-кандидата (иначе ключ null)
+    tokens = tokens.withColumn("next_name", when(col("name").isNotNull(),
+                                                 regexp_replace(col("next_word"), "[A-Za-z]", "")))
+    joined = tokens.join(current, col("name") == col("cur_key"), "left") \
+        .join(following, col("next_name") == col("next_key"), "left")
+    is_current = is_name(col("name"), col("cur_stop"))
+    found = array(
+        when(is_current & coalesce(col("cur_known"), lit(False)), col("name")),
+        when(is_current & coalesce(col("cur_first"), lit(False)) & is_name(col("next_name"), col("next_stop")),
+             concat_ws(" ", col("name"), col("next_name"))),
+    )
+    return joined.withColumn("names", filter(found, lambda name: name.isNotNull())) \
+        .drop("next_name", "cur_key", "cur_first", "cur_known", "cur_stop", "next_key", "next_stop")
+
+
+def tokenize(df, dictionary_df):
+    """
+    Таблица токенов: текст статьи один раз разбивается по пробельным символам, и для
+    каждого фрагмента сразу вычисляются все формы и признаки, нужные задачам.
+
+    Колонки: pos - номер фрагмента в статье, word - только буквы, norm - нижний
+    регистр с заменой "ё" на "е", length, is_russian, is_latin, is_capitalized,
+    abbrev - кандидат в сокращения вида "пр." (только русские буквы и точки),
+    name - кандидат в имена (только русские буквы), next_word - word следующего
+    фрагмента (для биграмм), names - найденные имена и пары "Имя Фамилия"
+    """
+    chunks = df.select(split(col("content"), SPACE_PATTERN).alias("chunks"))
+    tokens = chunks.select(explode(transform(
+        col("chunks"),
+        lambda chunk, i: struct(i.alias("pos"), chunk.alias("chunk"), get(col("chunks"), i + 1).alias("next_chunk"))
+    )).alias("token")).select(
+        col("token.pos").alias("pos"),
+        regexp_replace(col("token.chunk"), NON_LETTER_PATTERN, "").alias("word"),  # Только буквы
+        regexp_replace(col("token.chunk"), NON_RU_DOT_PATTERN, "").alias("ru_dot"),  # Русские буквы и точки
+        regexp_replace(col("token.chunk"), NON_RU_PATTERN, "").alias("ru"),  # Только русские буквы
+        regexp_replace(col("token.next_chunk"), NON_LETTER_PATTERN, "").alias("next_word"),
+    ).filter(length(col("word")) > 0)  # Фрагменты без букв не нужны ни одной задаче
+
+    tokens = tokens.select(
+        "pos",
+        "word",
+        regexp_replace(lower(col("word")), "ё", "е").alias("norm"),  # Нормализация: замена "ё" на "е"
+        length(col("word")).alias("length"),
+        col("word").rlike(RU_WORD_PATTERN).alias("is_russian"),
+        col("word").rlike(LATIN_PATTERN).alias("is_latin"),
+        col("word").rlike(CAPITALIZED_PATTERN).alias("is_capitalized"),
+        when(col("ru_dot").rlike(ABBREV1_PATTERN) & (length(col("ru_dot")) <= 4), col("ru_dot")).alias("abbrev"),
+        when(col("ru").rlike(NAME_PATTERN), col("ru")).alias("name"),
+        "next_word",
+    )
+    return with_names(tokens, dictionary_df)
+
+
+# 3. Задачи - агрегации над таблицей токенов
+def rows_to_dicts(rows):
+    return [row.asDict() for row in rows]
+
+
+def longest_word(tokens_df):
+    """Задача 1: Самое длинное русское слово"""
+    row = tokens_df.filter(col("is_russian")) \
+        .orderBy(col("length").desc(), col("word")) \
+        .select("word", "length").first()
+    return row.asDict() if row else None
+
+
+def avg_length(tokens_df):
+    """Задача 2: Средняя длина слова"""
+    return tokens_df.filter(col("is_russian")) \
+        .agg(avg(col("length")).alias("avg_length")) \
+        .first()["avg_length"]
+
+
+def top_latin(tokens_df):
+    """Задача 3: Самое частое латинское слово"""
+    row = tokens_df.filter(col("is_latin") & (col("length") > 1)) \
+        .groupBy(col("norm").alias("word")).count() \
+        .orderBy(col("count").desc(), col("word")) \
+        .first()
+    return row.asDict() if row else None
+
+
+def uppercase_words(tokens_df):
+    """Задача 4: Слова с частым использованием заглавных букв (более чем в половине случаев, > 10 раз)"""
+    return rows_to_dicts(tokens_df.filter(col("is_russian"))
+                         .groupBy(lower(col("word")).alias("word"))
+                         .agg(sum(col("is_capitalized").cast("int")).alias("uppercase_count"),
+                              count("*").alias("total_count"))
+                         .filter((col("uppercase_count") > UPPERCASE_MIN_COUNT)
+                                 & (col("uppercase_count") / col("total_count") > 0.5))
+                         .orderBy(col("total_count").desc(), col("word"))
+                         .limit(TOP_N).collect())
+
+
+def abbreviations(tokens_df):
+    """Задача 5: Сокращения вида "пр.", "др." """
+    return rows_to_dicts(tokens_df.filter(col("abbrev").isNotNull())
+                         .groupBy("abbrev").count()
+                         .filter(col("count") > ABBREV_MIN_COUNT)
+                         .orderBy(col("count").desc(), col("abbrev"))
+                         .limit(TOP_N).collect())
+
+
+def names(tokens_df):
+    """Задача 7: Извлечение имен (слова из словарей и пары "Имя Фамилия")"""
+    return rows_to_dicts(tokens_df.select(explode(col("names")).alias("name"))
+                         .groupBy("name").count()
+                         .filter(col("count") > NAME_MIN_COUNT)
+                         .orderBy(col("count").desc(), col("name"))
+                         .limit(TOP_N).collect())
+
+
+TASKS = {
+    "longest_word": longest_word,
+    "avg_length": avg_length,
+    "top_latin": top_latin,
+    "uppercase": uppercase_words,
+    "abbreviations": abbreviations,
+    "names": names,
+}
+
+
+# 4. Приближенный режим: скетчи по разделам вместо groupBy по всему словарю
+def sketch_rows(rows, capacity):
+    """
+    Скетчи одного раздела таблицы токенов: токены сначала считаются локальными
+    счетчиками раздела, затем каждый ключ один раз добавляется в скетчи со своим счетчиком
+    """
+    latin, russian, uppercase, abbrev, names = Counter(), Counter(), Counter(), Counter(), Counter()
+    for row in rows:
+        if row.is_russian:
+            word = row.word.lower()
+            russian[word] += 1
+            if row.is_capitalized:
+                uppercase[word] += 1
+        elif row.is_latin and row.length > 1:
+            latin[row.norm] += 1
+        if row.abbrev is not None:
+            abbrev[row.abbrev] += 1
+        names.update(row.names)
+
+    sketches = TokenSketches(capacity)
+    for word, count in russian.items():
+        sketches.add_russian(word, uppercase[word], count)
+    for word, count in latin.items():
+        sketches.add_latin(word, count)
+    for value, count in abbrev.items():
+        sketches.add_abbrev(value, count)
+    for name, count in names.items():
+        sketches.add_name(name, count)
+    yield sketches
+
+
+def approx_tasks(tokens_df, capacity=TOPK_CAPACITY):
+    """
+    Задачи 3-5 и 7 по скетчам: каждый раздел строит скетчи фиксированного размера,
+    они объединяются деревом на драйвер - shuffle всего словаря не нужен
+    """
+    rows = tokens_df.select("word", "norm", "length", "is_russian", "is_latin", "is_capitalized", "abbrev", "names") \
+        .filter(col("is_russian") | (col("is_latin") & (col("length") > 1))
+                | col("abbrev").isNotNull() | (size(col("names")) > 0))
+    sketches = rows.rdd.mapPartitions(lambda part: sketch_rows(part, capacity)) \
+        .treeReduce(lambda left, right: left.merge(right))
+    return sketches.results()
+
+
+def exact_distinct(tokens_df):
+    """Точное число различных русских и латинских слов (для сравнения с HyperLogLog)"""
+    return tokens_df.agg(
+        countDistinct(when(col("is_russian"), lower(col("word")))).alias("russian"),
+        countDistinct(when(col("is_latin") & (col("length") > 1), col("norm"))).alias("latin"),
+    ).first().asDict()
+
+
+def run_tasks(tokens_df, approx=False, capacity=TOPK_CAPACITY):
+    """Задачи над таблицей токенов; в приближенном режиме задачи 3-5 и 7 - по скетчам"""
+    if not approx:
+        return {name: task(tokens_df) for name, task in TASKS.items()}
+    results = {name: TASKS[name](tokens_df) for name in ("longest_word", "avg_length")}
+    results.update(approx_tasks(tokens_df, capacity))
+    return results
+
+
+def cache_tokens(spark, tokens_df, view):
+    """Кэширование таблицы токенов под именем view (по нему кэш находится в метриках)"""
+    tokens_df.createOrReplaceTempView(view)
+    spark.catalog.cacheTable(view)
+    return spark.table(view)
+
+
+def uncache_tokens(spark, view):
+    spark.catalog.uncacheTable(view)
+    spark.catalog.dropTempView(view)
+
+
+def analyze(spark, path, parsed_path=PARSED_PATH, approx=False, capacity=TOPK_CAPACITY, check_sample=None,
+            dictionaries=None, tasks=None, metrics=None):
+    """
+    Задачи на Spark; результат в том же виде, что и у локального бэкенда.
+    check_sample - доля статей, на которой приближенные результаты сравниваются с точными;
+    dictionaries - словари имен (NameDictionaries, по умолчанию из директории dictionaries);
+    tasks - имена выполняемых задач (по умолчанию все); metrics - SparkMetrics для отчета
+    """
+    tasks = [name for name in TASKS if tasks is None or name in tasks]
+    dictionary_df = dictionary_frame(spark, dictionaries or NameDictionaries.load())
+    with measure(metrics, "load") as entry:
+        entry["parsed_cache_hit"] = parsed_cache_valid(path, parsed_path)
+        wiki_df = load_wiki_data(spark, path, parsed_path)
+        results = {"articles": wiki_df.count()}
+
+    # Таблица токенов кэшируется и материализуется заранее: все задачи - агрегации над ней
+    with measure(metrics, "tokenize") as entry:
+        tokens_df = cache_tokens(spark, tokenize(wiki_df, dictionary_df), TOKENS_VIEW)
+        entry["tokens"] = tokens_df.count()
+
+    for name in tasks:
+        if approx and name in APPROX_TASKS:
+            continue
+        with measure(metrics, name, TOKENS_VIEW):
+            results[name] = TASKS[name](tokens_df)
+    if approx and any(name in APPROX_TASKS for name in tasks):
+        with measure(metrics, "approx_sketches", TOKENS_VIEW):
+            sketched = approx_tasks(tokens_df, capacity)
+        results.update({key: value for key, value in sketched.items() if key not in APPROX_TASKS or key in tasks})
+    uncache_tokens(spark, TOKENS_VIEW)
+
+    if approx and check_sample:
+        with measure(metrics, "approx_check"):
+            sample_df = wiki_df.sample(fraction=check_sample, seed=SAMPLE_SEED)
+            sample_tokens = cache_tokens(spark, tokenize(sample_df, dictionary_df), TOKENS_VIEW + "_sample")
+            results["approx_check"] = {
+                "sample": check_sample,
+                "articles": sample_df.count(),
+                **compare_with_exact(run_tasks(sample_tokens), run_tasks(sample_tokens, True, capacity),
+                                     exact_distinct(sample_tokens)),
+            }
+            uncache_tokens(spark, TOKENS_VIEW + "_sample")
+    return results
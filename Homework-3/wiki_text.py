@@ -0,0 +1,117 @@
+# Общая часть бэкендов: регулярные выражения, словари и сборка статей из строк wiki.txt
+import os
+import re
+
+# Определение регулярных выражений.
+# Выражения применяются к уже очищенным токенам, поэтому границы слов заданы явно:
+# \b в Java начиная с версии 19 учитывает только ASCII-буквы, а в Python - все
+# буквы Unicode. Одни и те же строки используются и в rlike (Spark), и в re (local)
+RU_WORD_PATTERN = r"^[а-яёА-ЯЁ][а-яёА-ЯЁ\-]*[а-яёА-ЯЁ]$"  # Строгое соответствие русским словам
+LATIN_PATTERN = r"^[A-Za-z]+$"  # Строгое соответствие словам с латинскими буквами (без дефисов)
+ABBREV1_PATTERN = r"(?<![а-яёА-ЯЁ])[а-яё]{1,3}\."  # Сокращения вида "пр.", "др."
+NAME_PATTERN = r"^[А-ЯЁ][а-яё]{1,20}$"  # Имена и фамилии: слово с заглавной буквы
+NAME_MIN_LENGTH = 3
+CAPITALIZED_PATTERN = r"^[А-ЯЁ]"  # Начинается с заглавной русской буквы
+
+# Очистка фрагментов текста (классы символов одинаковы в Java и Python)
+NON_LETTER_PATTERN = r"[^а-яёА-ЯЁA-Za-z]"  # Все, кроме русских и латинских букв
+NON_RU_DOT_PATTERN = r"[^а-яёА-ЯЁ.]"  # Все, кроме русских букв и точек
+NON_RU_PATTERN = r"[^а-яёА-ЯЁ]"  # Все, кроме русских букв
+SPACE_PATTERN = r"[ \t\n\x0b\f\r]+"  # \s в Java - только ASCII-пробелы
+
+# Словари имен, фамилий и слов-исключений (по одному слову в строке)
+DICTIONARY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dictionaries")
+FIRST_NAMES_PATH = os.path.join(DICTIONARY_DIR, "first_names.txt")
+SURNAMES_PATH = os.path.join(DICTIONARY_DIR, "surnames.txt")
+STOPWORDS_PATH = os.path.join(DICTIONARY_DIR, "stopwords.txt")
+
+# Задачи (номера - как в условии) и задачи, которые в приближенном режиме считаются по скетчам
+TASK_NAMES = ("longest_word", "avg_length", "top_latin", "uppercase", "abbreviations", "names")
+TASK_NUMBERS = {"1": "longest_word", "2": "avg_length", "3": "top_latin", "4": "uppercase",
+                "5": "abbreviations", "7": "names"}
+APPROX_TASKS = ("top_latin", "uppercase", "abbreviations", "names")
+
+# Пороги и размер выдачи задач
+UPPERCASE_MIN_COUNT = 10
+ABBREV_MIN_COUNT = 10
+NAME_MIN_COUNT = 5
+TOP_N = 20
+SAMPLE_SEED = 42  # Зерно выборки статей для сравнения приближенных результатов с точными
+
+# Строка-заголовок статьи: URL, заголовок и начало содержимого через табуляцию.
+# Одно регулярное выражение и распознает заголовок, и извлекает все три поля
+HEADER_RE = re.compile(r"(https?://[^ \t\n\x0b\f\r]+)\t([^\t]+)\t(.*)", re.S)
+
+
+def load_dictionary(path):
+    """Слова из файла: по одному в строке, пустые строки и комментарии (#) пропускаются"""
+    with open(path, "r", encoding="utf-8") as f:
+        return frozenset(word for word in (line.strip() for line in f) if word and not word.startswith("#"))
+
+
+class NameDictionaries:
+    """
+    Словари для извлечения имен: имена, фамилии и слова-исключения. Токен засчитывается
+    как имя, если он есть в словаре имен или фамилий; пара "Имя Фамилия" - если токен
+    есть в словаре имен, а следующий фрагмент похож на имя (NAME_PATTERN). Слова-исключения
+    не засчитываются ни в одной из ролей
+    """
+
+    def __init__(self, first_names, surnames, stopwords):
+        self.first_names = frozenset(first_names)
+        self.surnames = frozenset(surnames)
+        self.stopwords = frozenset(stopwords)
+        self.known = self.first_names | self.surnames
+
+    @classmethod
+    def load(cls, first_names_path=FIRST_NAMES_PATH, surnames_path=SURNAMES_PATH, stopwords_path=STOPWORDS_PATH):
+        return cls(load_dictionary(first_names_path), load_dictionary(surnames_path),
+                   load_dictionary(stopwords_path))
+
+
+def partition_head(index, lines):
+    """Строки раздела до первого заголовка - продолжение статьи из предыдущих разделов"""
+    head = []
+    for line in lines:
+        if HEADER_RE.match(line):
+            yield index, True, head
+            return
+        head.append(line)
+    yield index, False, head
+
+
+def stitch_tails(heads):
+    """
+    Для каждого раздела - строки следующих разделов, которые продолжают его последнюю
+    статью (до первого заголовка; разделы без заголовков целиком)
+    """
+    tails = {}
+    pending = []
+    for index, has_header, head in sorted(heads, reverse=True):
+        if has_header:
+            if pending:
+                tails[index] = pending
+            pending = head
+        else:
+            pending = head + pending
+    # pending первого раздела - строки до первой статьи файла, они отбрасываются
+    return tails
+
+
+def assemble_articles(index, lines, tails):
+    """Сборка статей раздела: заголовок и строки продолжения до следующего заголовка"""
+    url = title = None
+    content = []
+    for line in lines:
+        match = HEADER_RE.match(line)
+        if match:
+            if url is not None:
+                yield url, title, "\n".join(content)
+            url, title, first = match.groups()
+            content = [first]
+        elif url is not None:
+            content.append(line)
+    if url is not None:
+        # Последняя статья раздела дополняется строками из следующих разделов
+        content.extend(tails.get(index, []))
+        yield url, title, "\n".join(content)
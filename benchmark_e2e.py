@@ -0,0 +1,234 @@
+# Сквозной бенчмарк Homework-2 и Homework-3 на синтетических данных без сети:
+# загрузка сделок с локального HTTP-зеркала, построение свечей и дискретных сделок, анализ wiki.txt
+import argparse
+import glob
+import importlib.util
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+HOMEWORK_2 = os.path.join(ROOT, "Homework-2")
+HOMEWORK_3 = os.path.join(ROOT, "Homework-3")
+STAGES = ("download", "candles", "discrete", "wiki")
+WIKI_BACKENDS = ("local", "spark")
+SYMBOL = "BTCUSDT"
+START_DATE = "2025-01-01"
+
+
+def parse_list(value, item_type=str):
+    return [item_type(item.strip()) for item in value.split(",") if item.strip()]
+
+
+def parse_args():
+    """Парсинг аргументов командной строки"""
+    parser = argparse.ArgumentParser(description="Сквозной бенчмарк загрузчика, построителей и wiki_analyze.py")
+    parser.add_argument("--stages", type=parse_list, default=",".join(STAGES),
+                        help=f"Этапы через запятую (по умолчанию {','.join(STAGES)})")
+    parser.add_argument("--trades-per-day", type=lambda v: parse_list(v, int), default="100000,1000000",
+                        help="Размеры данных сделок: сделок в день через запятую (по умолчанию 100000,1000000)")
+    parser.add_argument("--days", type=int, default=2, help="Дней сделок (по умолчанию 2)")
+    parser.add_argument("--interval", type=str, default="1m",
+                        help="Интервал свечей и дискретных сделок (по умолчанию 1m)")
+    parser.add_argument("--wiki-sizes", type=parse_list, default="20M,100M",
+                        help="Размеры корпусов wiki.txt через запятую (по умолчанию 20M,100M)")
+    parser.add_argument("--wiki-backends", type=parse_list, default=",".join(WIKI_BACKENDS),
+                        help="Бэкенды wiki_analyze.py (по умолчанию local,spark; spark пропускается без pyspark)")
+    parser.add_argument("--workers", type=int, help="Число процессов бэкенда local (по умолчанию число ядер)")
+    parser.add_argument("--seed", type=int, default=42, help="Зерно генераторов (по умолчанию 42)")
+    parser.add_argument("--data-dir", type=str, help="Директория для данных (по умолчанию временная)")
+    parser.add_argument("--keep", action="store_true", help="Не удалять сгенерированные данные")
+    parser.add_argument("--json", dest="json_path", default="benchmark_e2e.json",
+                        help="Путь JSON-отчета (по умолчанию benchmark_e2e.json)")
+    args = parser.parse_args()
+    unknown = set(args.stages) - set(STAGES) or set(args.wiki_backends) - set(WIKI_BACKENDS)
+    if unknown:
+        parser.error(f"Неизвестные этапы или бэкенды: {', '.join(sorted(unknown))}")
+    return args
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    """Раздача файлов зеркала без журнала запросов в stderr"""
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MirrorServer:
+    """Локальное зеркало data.binance.vision на свободном порту (в отдельном потоке)"""
+
+    def __init__(self, directory):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), partial(QuietHandler, directory=directory))
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}/"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def run_once(cmd, log_path):
+    """
+    Запуск команды с замером времени и памяти. rusage из wait4 включает завершенные
+    дочерние процессы: время CPU суммируется, пиковая память - максимум по процессам
+    """
+    with open(log_path, "a") as log:
+        log.write(f"$ {' '.join(cmd)}\n")
+        log.flush()
+        proc = subprocess.Popen(cmd, stdout=log, stderr=subprocess.STDOUT)
+        start = time.perf_counter()
+        _, status, usage = os.wait4(proc.pid, 0)
+        wall = time.perf_counter() - start
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{' '.join(cmd)} завершилась с кодом {proc.returncode}, см. {log_path}")
+    return {
+        "wall_s": wall,
+        "user_s": usage.ru_utime,
+        "sys_s": usage.ru_stime,
+        "cpu_s": usage.ru_utime + usage.ru_stime,
+        "peak_rss_mib": usage.ru_maxrss / 1024,
+    }
+
+
+def script(homework, name):
+    return [sys.executable, os.path.join(homework, name)]
+
+
+def total_bytes(pattern):
+    return sum(os.path.getsize(path) for path in glob.glob(pattern, recursive=True))
+
+
+def parquet_rows(directory):
+    import pyarrow.parquet as pq
+    return sum(pq.ParquetFile(path).metadata.num_rows
+               for path in glob.glob(os.path.join(directory, "**", "*.parquet"), recursive=True))
+
+
+def measure(rows, log_path, stage, size, cmd, input_bytes, records=None):
+    """Замер этапа; records - число записей или функция, вычисляющая его после запуска"""
+    row = {"stage": stage, "size": size, "input_bytes": input_bytes, **run_once(cmd, log_path)}
+    row["records"] = records() if callable(records) else records
+    row["mib_per_s"] = input_bytes / 1024 ** 2 / row["wall_s"] if row["wall_s"] else None
+    row["records_per_s"] = row["records"] / row["wall_s"] if row["records"] and row["wall_s"] else None
+    rows.append(row)
+    print(f"{stage:<14} {size:>10}  {input_bytes / 1024 ** 2:9.1f} MiB  {row['wall_s']:8.2f} s  "
+          f"{row['mib_per_s'] or 0:8.1f} MiB/s  {row['records_per_s'] or 0:12.0f} rec/s  "
+          f"rss={row['peak_rss_mib']:.0f} MiB")
+    return row
+
+
+def bench_trades(rows, args, trades_per_day, data_dir, log_path):
+    """Генерация зеркала, загрузка с него и построители на загруженных данных"""
+    base = os.path.join(data_dir, f"trades-{trades_per_day}")
+    mirror, downloaded, output = (os.path.join(base, name) for name in ("mirror", "data", "output"))
+    os.makedirs(output, exist_ok=True)
+    run_once(script(HOMEWORK_2, "generate_trades.py") + [
+        SYMBOL, "--output-dir", mirror, "--start-date", START_DATE, "--days", str(args.days),
+        "--trades-per-day", str(trades_per_day), "--seed", str(args.seed)], log_path)
+    end_date = (datetime.strptime(START_DATE, "%Y-%m-%d") + timedelta(days=args.days - 1)).strftime("%Y-%m-%d")
+    size = f"{trades_per_day}/d"
+
+    # Без этапа download загрузка все равно нужна как подготовка данных, но не замеряется
+    if "download" in args.stages or not os.path.exists(downloaded):
+        with MirrorServer(mirror) as server:
+            cmd = script(HOMEWORK_2, "download_binance_trades.py") + [
+                SYMBOL.lower(), "--start-date", START_DATE, "--end-date", end_date, "--output-dir", downloaded,
+                "--base-url", server.url, "--force"]
+            if "download" in args.stages:
+                measure(rows, log_path, "download", size, cmd, total_bytes(os.path.join(mirror, "**", "*.zip")),
+                        lambda: parquet_rows(downloaded))
+            else:
+                run_once(cmd, log_path)
+
+    # Загрузчик завершается успешно и тогда, когда отдельные дни не скачались
+    trades = parquet_rows(downloaded)
+    if not trades:
+        raise RuntimeError(f"Загрузчик не сохранил ни одной сделки, см. {log_path}")
+    input_bytes = total_bytes(os.path.join(downloaded, "**", "*.parquet"))
+    if "candles" in args.stages:
+        measure(rows, log_path, "candles", size, script(HOMEWORK_2, "build_candlesticks.py") + [
+            "--input", downloaded, "--output", os.path.join(output, "candles.parquet"),
+            "--interval", args.interval], input_bytes, trades)
+    if "discrete" in args.stages:
+        measure(rows, log_path, "discrete", size, script(HOMEWORK_2, "build_discrete_trades.py") + [
+            "--input", downloaded, "--output", os.path.join(output, "discrete.parquet"),
+            "--interval", args.interval], input_bytes, trades)
+
+
+def bench_wiki(rows, args, wiki_size, data_dir, log_path):
+    """Генерация корпуса и wiki_analyze.py на каждом бэкенде"""
+    base = os.path.join(data_dir, f"wiki-{wiki_size}")
+    os.makedirs(base, exist_ok=True)
+    wiki_path = os.path.join(base, "wiki.txt")
+    run_once(script(HOMEWORK_3, "generate_wiki.py") + [
+        "--output", wiki_path, "--size", wiki_size, "--seed", str(args.seed)], log_path)
+
+    for backend in args.wiki_backends:
+        if backend == "spark" and importlib.util.find_spec("pyspark") is None:
+            print("wiki-spark: пропущен (pyspark не установлен)")
+            continue
+        report_path = os.path.join(base, f"report-{backend}.json")
+        cmd = script(HOMEWORK_3, "wiki_analyze.py") + [
+            "--backend", backend, "--input", wiki_path, "--output", report_path]
+        if backend == "local" and args.workers:
+            cmd += ["--workers", str(args.workers)]
+        if backend == "spark":
+            cmd += ["--parsed-path", os.path.join(base, "wiki_parsed.parquet")]
+
+        def articles():
+            with open(report_path, encoding="utf-8") as f:
+                return json.load(f)["results"]["articles"]
+
+        row = measure(rows, log_path, f"wiki-{backend}", wiki_size, cmd, os.path.getsize(wiki_path), articles)
+        with open(report_path, encoding="utf-8") as f:
+            row["steps"] = json.load(f)["steps"]
+
+
+def main():
+    """Основная функция выполнения скрипта"""
+    args = parse_args()
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix="e2e-bench-")
+    os.makedirs(data_dir, exist_ok=True)
+    log_path = os.path.join(data_dir, "benchmark_e2e.log")
+
+    # При ошибке данные и журнал остаются в data_dir для разбора
+    rows = []
+    if {"download", "candles", "discrete"} & set(args.stages):
+        for trades_per_day in args.trades_per_day:
+            bench_trades(rows, args, trades_per_day, data_dir, log_path)
+    if "wiki" in args.stages:
+        for wiki_size in args.wiki_sizes:
+            bench_wiki(rows, args, wiki_size, data_dir, log_path)
+    if not args.keep and not args.data_dir:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    report = {
+        "machine": {"platform": platform.platform(), "python": platform.python_version(),
+                    "cpu_count": os.cpu_count()},
+        "config": {key: value for key, value in vars(args).items() if key not in ("json_path", "keep")},
+        "runs": rows,
+    }
+    with open(args.json_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"Отчет сохранен в {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()